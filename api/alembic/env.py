@@ -11,6 +11,7 @@ from app.db.tables.reference_dataset_table import *
 from app.db.tables.reference_dataset_metrics_table import *
 from app.db.tables.current_dataset_table import *
 from app.db.tables.current_dataset_metrics_table import *
+from app.db.tables.metrics_checkpoint_table import *
 from app.db.tables.commons.json_encoded_dict import JSONEncodedDict
 from app.db.database import Database, BaseTable
 
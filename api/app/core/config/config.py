@@ -56,6 +56,12 @@ class SparkConfig(BaseSettings):
     spark_image_pull_policy: str = 'IfNotPresent'
     spark_reference_app_path: str = 'local:///opt/spark/custom_jobs/reference_job.py'
     spark_current_app_path: str = 'local:///opt/spark/custom_jobs/current_job.py'
+    # Currents loaded while the reference is importing are computed by the reference job
+    spark_combined_jobs: bool = False
+    # Seconds between the submissions of the currents left awaiting a reference job
+    spark_awaiting_reference_sweep_seconds: int = 60
+    # Minutes after which the job of a reference still importing is presumed lost
+    spark_awaiting_reference_timeout_minutes: int = 360
     spark_namespace: str = 'spark'
     spark_service_account: str = 'spark'
 
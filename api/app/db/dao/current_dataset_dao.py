@@ -1,15 +1,19 @@
+import datetime
 import re
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from uuid import UUID
 
 from fastapi_pagination import Page, Params
 from fastapi_pagination.ext.sqlalchemy import paginate
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, desc, func, or_, select, update
 from sqlalchemy.future import select as future_select
 
 from app.db.database import Database
+from app.db.tables.current_dataset_metrics_table import CurrentDatasetMetrics
 from app.db.tables.current_dataset_table import CurrentDataset
+from app.db.tables.reference_dataset_table import ReferenceDataset
 from app.models.dataset_dto import OrderType
+from app.models.job_status import JobStatus
 
 
 class CurrentDatasetDAO:
@@ -22,6 +26,121 @@ class CurrentDatasetDAO:
             session.flush()
             return current_dataset
 
+    def insert_cloned_current_dataset(
+        self, current_dataset: CurrentDataset
+    ) -> CurrentDataset:
+        with self.db.begin_session() as session:
+            source_metrics = (
+                session.query(CurrentDatasetMetrics)
+                .where(
+                    CurrentDatasetMetrics.current_uuid == current_dataset.cloned_from
+                )
+                .one()
+            )
+            cloned_metrics = CurrentDatasetMetrics(
+                current_uuid=current_dataset.uuid,
+                sampling=source_metrics.sampling,
+                warnings=source_metrics.warnings,
+            )
+            sections = CurrentDatasetMetrics.compressed_sections
+            for section, compressed in sections.items():
+                # sections stored compressed are copied compressed
+                if getattr(source_metrics, compressed) is not None:
+                    setattr(
+                        cloned_metrics, compressed, getattr(source_metrics, compressed)
+                    )
+                else:
+                    setattr(cloned_metrics, section, getattr(source_metrics, section))
+            session.add(current_dataset)
+            # the metrics reference the dataset, that must be inserted first
+            session.flush()
+            session.add(cloned_metrics)
+            session.flush()
+            return current_dataset
+
+    def insert_current_dataset_awaiting_reference(
+        self, current_dataset: CurrentDataset, reference_uuid: UUID
+    ) -> Optional[CurrentDataset]:
+        """Insert a current awaiting the job of its reference, if still importing.
+
+        The reference row is locked while the current is inserted, so the job of the
+        reference, that marks it as completed before collecting the awaiting currents,
+        can not miss it. Returns None, without inserting, when the reference is not
+        importing anymore.
+        """
+        with self.db.begin_session() as session:
+            reference = (
+                session.query(ReferenceDataset)
+                .where(
+                    ReferenceDataset.uuid == reference_uuid,
+                    ReferenceDataset.status == JobStatus.IMPORTING,
+                )
+                .with_for_update()
+                .one_or_none()
+            )
+            if reference is None:
+                return None
+            current_dataset.awaiting_reference = True
+            session.add(current_dataset)
+            session.flush()
+            return current_dataset
+
+    def claim_stranded_awaiting_currents(
+        self, awaiting_since: datetime.datetime
+    ) -> List[CurrentDataset]:
+        """Claim the currents awaiting a reference job that won't compute them.
+
+        A current keeps awaiting when its reference is not importing anymore but its
+        job didn't claim it, e.g. when combined jobs were enabled after the reference
+        job was submitted, or when it was loaded before awaiting_since and the job of
+        the reference is presumed lost. They are claimed as the reference job does, so
+        each of them is computed once, and must be submitted on their own.
+        """
+        importing_models = select(ReferenceDataset.model_uuid).where(
+            ReferenceDataset.status == JobStatus.IMPORTING
+        )
+        with self.db.begin_session() as session:
+            return list(
+                session.scalars(
+                    update(CurrentDataset)
+                    .where(
+                        CurrentDataset.awaiting_reference,
+                        or_(
+                            CurrentDataset.model_uuid.not_in(importing_models),
+                            CurrentDataset.date < awaiting_since,
+                        ),
+                    )
+                    .values(awaiting_reference=False)
+                    .returning(CurrentDataset)
+                )
+            )
+
+    def update_current_dataset_status(
+        self, current_uuid: UUID, status: JobStatus
+    ) -> None:
+        with self.db.begin_session() as session:
+            session.execute(
+                update(CurrentDataset)
+                .where(CurrentDataset.uuid == current_uuid)
+                .values(status=status)
+            )
+
+    def get_current_dataset_by_content_hash(
+        self, model_uuid: UUID, content_hash: str
+    ) -> Optional[CurrentDataset]:
+        with self.db.begin_session() as session:
+            return (
+                session.query(CurrentDataset)
+                .order_by(desc(CurrentDataset.date))
+                .where(
+                    CurrentDataset.model_uuid == model_uuid,
+                    CurrentDataset.content_hash == content_hash,
+                    CurrentDataset.status == JobStatus.SUCCEEDED,
+                )
+                .limit(1)
+                .one_or_none()
+            )
+
     def get_current_dataset_by_model_uuid(
         self, model_uuid: UUID, current_uuid: UUID
     ) -> Optional[CurrentDataset]:
@@ -58,6 +177,16 @@ class CurrentDatasetDAO:
                 .where(CurrentDataset.model_uuid == model_uuid)
             )
 
+    def count_current_datasets_by_model_uuid(self, model_uuid: UUID) -> Tuple[int, int]:
+        """Count the current datasets of a model and the ones with cloned metrics."""
+        with self.db.begin_session() as session:
+            total, cloned = (
+                session.query(func.count(), func.count(CurrentDataset.cloned_from))
+                .where(CurrentDataset.model_uuid == model_uuid)
+                .one()
+            )
+            return total, cloned
+
     def get_all_current_datasets_by_model_uuid_paginated(
         self,
         model_uuid: UUID,
@@ -51,7 +51,7 @@ class ReferenceDatasetMetricsDAO:
             query = (
                 sqlalchemy.update(ReferenceDatasetMetrics)
                 .where(ReferenceDatasetMetrics.reference_uuid == reference_uuid)
-                .values(model_quality=model_quality)
+                .values(model_quality=model_quality, model_quality_compressed=None)
             )
             return session.execute(query).rowcount
 
@@ -62,7 +62,7 @@ class ReferenceDatasetMetricsDAO:
             query = (
                 sqlalchemy.update(ReferenceDatasetMetrics)
                 .where(ReferenceDatasetMetrics.reference_uuid == reference_uuid)
-                .values(data_quality=data_quality)
+                .values(data_quality=data_quality, data_quality_compressed=None)
             )
             return session.execute(query).rowcount
 
@@ -73,6 +73,6 @@ class ReferenceDatasetMetricsDAO:
             query = (
                 sqlalchemy.update(ReferenceDatasetMetrics)
                 .where(ReferenceDatasetMetrics.reference_uuid == reference_uuid)
-                .values(statistics=statistics)
+                .values(statistics=statistics, statistics_compressed=None)
             )
             return session.execute(query).rowcount
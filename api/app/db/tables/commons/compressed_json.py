@@ -0,0 +1,35 @@
+import json
+from typing import Dict
+import zlib
+
+from sqlalchemy import LargeBinary, TypeDecorator
+from sqlalchemy.orm.attributes import set_committed_value
+
+
+class CompressedJSON(TypeDecorator):
+    """Json document stored zlib compressed in a bytea column"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(json.dumps(value).encode('utf-8'))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return json.loads(zlib.decompress(value))
+
+
+def load_compressed_sections(instance, sections: Dict[str, str]):
+    """Set the sections of a loaded instance that are stored compressed.
+
+    sections maps the name of each section attribute to the one of its compressed attribute.
+    The values are committed, so the instance is not dirty and they are never written back.
+    """
+    for section, compressed_section in sections.items():
+        value = getattr(instance, compressed_section)
+        if value is not None:
+            set_committed_value(instance, section, value)
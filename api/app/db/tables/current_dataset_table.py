@@ -1,6 +1,6 @@
 from uuid import uuid4
 
-from sqlalchemy import TIMESTAMP, UUID, VARCHAR, Column, ForeignKey
+from sqlalchemy import BOOLEAN, TIMESTAMP, UUID, VARCHAR, Column, ForeignKey
 
 from app.db.dao.base_dao import BaseDAO
 from app.db.database import BaseTable, Reflected
@@ -25,3 +25,11 @@ class CurrentDataset(Reflected, BaseTable, BaseDAO):
     date = Column('DATE', TIMESTAMP(timezone=True), nullable=False)
     correlation_id_column = Column('CORRELATION_ID_COLUMN', VARCHAR, nullable=True)
     status = Column('STATUS', VARCHAR, nullable=False, default=JobStatus.IMPORTING)
+    # sha256 of the uploaded content or ETag of the bound object, to reuse the metrics of identical files
+    content_hash = Column('CONTENT_HASH', VARCHAR, nullable=True)
+    # Current dataset the metrics were cloned from instead of running the job
+    cloned_from = Column('CLONED_FROM', UUID(as_uuid=True), nullable=True)
+    # Metrics computed by the job of the reference, that was still importing when the current was loaded
+    awaiting_reference = Column(
+        'AWAITING_REFERENCE', BOOLEAN, nullable=False, default=False
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import TEXT, TIMESTAMP, UUID, VARCHAR, Column, func
+
+from app.db.dao.base_dao import BaseDAO
+from app.db.database import BaseTable, Reflected
+
+
+class MetricsCheckpoint(Reflected, BaseTable, BaseDAO):
+    """Output of a completed stage of a metrics job, written by the job to resume it"""
+
+    __tablename__ = 'metrics_checkpoint'
+
+    dataset_uuid = Column(
+        'DATASET_UUID', UUID(as_uuid=True), nullable=False, primary_key=True
+    )
+    stage = Column('STAGE', VARCHAR, nullable=False, primary_key=True)
+    output = Column('OUTPUT', TEXT, nullable=False)
+    # Json of the warnings of the job when the stage completed
+    warnings = Column('WARNINGS', TEXT, nullable=True)
+    created_at = Column(
+        'CREATED_AT',
+        TIMESTAMP(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+    )
@@ -25,6 +25,7 @@ class Model(Reflected, BaseTable, BaseDAO):
     timestamp = Column('TIMESTAMP', JSONEncodedDict, nullable=True)
     frameworks = Column('FRAMEWORKS', VARCHAR, nullable=True)
     algorithm = Column('ALGORITHM', VARCHAR, nullable=True)
+    category_top_k = Column('CATEGORY_TOP_K', INTEGER, nullable=True)
     created_at = Column('CREATED_AT', TIMESTAMP(timezone=True), nullable=False)
     updated_at = Column('UPDATED_AT', TIMESTAMP(timezone=True), nullable=False)
     deleted = Column('DELETED', BOOLEAN, nullable=False, default=False)
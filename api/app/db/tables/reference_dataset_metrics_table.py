@@ -1,9 +1,14 @@
 from uuid import uuid4
 
 from sqlalchemy import UUID, Column, ForeignKey
+from sqlalchemy.orm import reconstructor
 
 from app.db.dao.base_dao import BaseDAO
 from app.db.database import BaseTable, Reflected
+from app.db.tables.commons.compressed_json import (
+    CompressedJSON,
+    load_compressed_sections,
+)
 from app.db.tables.commons.json_encoded_dict import JSONEncodedDict
 
 
@@ -27,3 +32,25 @@ class ReferenceDatasetMetrics(Reflected, BaseTable, BaseDAO):
     model_quality = Column('MODEL_QUALITY', JSONEncodedDict, nullable=True)
     data_quality = Column('DATA_QUALITY', JSONEncodedDict, nullable=True)
     statistics = Column('STATISTICS', JSONEncodedDict, nullable=True)
+    # Limits the job applied to the data it collected, by section of the metrics
+    warnings = Column('WARNINGS', JSONEncodedDict, nullable=True)
+    # Sections above the compression threshold of the jobs, stored instead of the json ones
+    model_quality_compressed = Column(
+        'MODEL_QUALITY_COMPRESSED', CompressedJSON, nullable=True
+    )
+    data_quality_compressed = Column(
+        'DATA_QUALITY_COMPRESSED', CompressedJSON, nullable=True
+    )
+    statistics_compressed = Column(
+        'STATISTICS_COMPRESSED', CompressedJSON, nullable=True
+    )
+
+    compressed_sections = {
+        'model_quality': 'model_quality_compressed',
+        'data_quality': 'data_quality_compressed',
+        'statistics': 'statistics_compressed',
+    }
+
+    @reconstructor
+    def _load_compressed_sections(self):
+        load_compressed_sections(self, self.compressed_sections)
@@ -1,4 +1,5 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 import logging
 from logging.config import dictConfig
 
@@ -96,13 +97,29 @@ metrics_service = MetricsService(
 spark_k8s_service = SparkK8SService(spark_k8s_client)
 
 
+async def submit_stranded_awaiting_currents():
+    """Periodically submit the currents left awaiting a reference job."""
+    while True:
+        await asyncio.sleep(
+            get_config().spark_config.spark_awaiting_reference_sweep_seconds
+        )
+        try:
+            await asyncio.to_thread(file_service.submit_stranded_awaiting_currents)
+        except Exception:
+            logger.exception('Submission of the awaiting currents failed')
+
+
 @asynccontextmanager
 async def lifespan(fastapi: FastAPI):
     logger.info('Starting service ...')
     database.connect()
     database.init_mappings()
+    awaiting_currents_task = asyncio.create_task(submit_stranded_awaiting_currents())
     yield
     logger.info('Stopping service ...')
+    awaiting_currents_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await awaiting_currents_task
 
 
 app = FastAPI(title='Radicalbit Platform', lifespan=lifespan)
@@ -38,6 +38,7 @@ class CurrentDatasetDTO(BaseModel):
     date: str
     correlation_id_column: Optional[str]
     status: str
+    cloned_from: Optional[UUID] = None
 
     model_config = ConfigDict(
         populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
@@ -52,13 +53,43 @@ class CurrentDatasetDTO(BaseModel):
             date=cd.date.isoformat(),
             correlation_id_column=cd.correlation_id_column,
             status=cd.status,
+            cloned_from=cd.cloned_from,
         )
 
 
+class CurrentDatasetsCountDTO(BaseModel):
+    """Current datasets of a model, with the ones whose metrics were cloned."""
+
+    model_uuid: UUID
+    current_datasets: int
+    # currents whose metrics were cloned from a current with the same content, the
+    # job of each of them was skipped
+    skipped_jobs: int
+
+    model_config = ConfigDict(
+        populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
+    )
+
+
+class PartitionFilter(BaseModel):
+    """Range of the partitions to read of a partitioned current dataset."""
+
+    column: str
+    start: Optional[str] = None
+    end: Optional[str] = None
+
+    model_config = ConfigDict(
+        populate_by_name=True,
+        alias_generator=to_camel,
+    )
+
+
 class FileReference(BaseModel):
+    # a single object, a prefix ending with / or a glob of part files
     file_url: str
     separator: str = ','
     correlation_id_column: Optional[str] = None
+    partition_filter: Optional[PartitionFilter] = None
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -5,6 +5,8 @@ from pydantic.alias_generators import to_camel
 
 from app.models.exceptions import MetricsInternalError
 from app.models.job_status import JobStatus
+from app.models.metrics.metrics_warning_dto import MetricsWarning
+from app.models.metrics.sampling_dto import Sampling
 from app.models.model_dto import ModelType
 
 
@@ -12,6 +14,7 @@ class MedianMetrics(BaseModel):
     perc_25: Optional[float] = None
     median: Optional[float] = None
     perc_75: Optional[float] = None
+    relative_error: Optional[float] = None
 
     model_config = ConfigDict(
         populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
@@ -96,10 +99,22 @@ class CategoryFrequency(BaseModel):
     )
 
 
+class OtherCategories(BaseModel):
+    categories: int
+    count: int
+    frequency: Optional[float] = None
+
+    model_config = ConfigDict(
+        populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
+    )
+
+
 class CategoricalFeatureMetrics(FeatureMetrics):
     type: str = 'categorical'
     category_frequency: List[CategoryFrequency]
     distinct_value: int
+    new_categories: Optional[int] = None
+    other_categories: Optional[OtherCategories] = None
 
     model_config = ConfigDict(
         populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
@@ -146,6 +161,9 @@ class RegressionDataQuality(BaseModel):
 class DataQualityDTO(BaseModel):
     job_status: JobStatus
     data_quality: Optional[ClassificationDataQuality | RegressionDataQuality]
+    approximate: bool = False
+    sampling: Optional[Sampling] = None
+    warnings: List[MetricsWarning] = []
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -159,6 +177,8 @@ class DataQualityDTO(BaseModel):
         model_type: ModelType,
         job_status: JobStatus,
         data_quality_data: Optional[Dict],
+        sampling_data: Optional[Dict] = None,
+        warnings_data: Optional[List[Dict]] = None,
     ) -> 'DataQualityDTO':
         """Create a DataQualityDTO from a dictionary of data."""
         if not data_quality_data:
@@ -171,10 +191,14 @@ class DataQualityDTO(BaseModel):
             model_type=model_type,
             data_quality_data=data_quality_data,
         )
+        sampling = Sampling.from_dict(sampling_data)
 
         return DataQualityDTO(
             job_status=job_status,
             data_quality=data_quality,
+            approximate=sampling is not None,
+            sampling=sampling,
+            warnings=MetricsWarning.from_list(warnings_data, 'DATA_QUALITY'),
         )
 
     @staticmethod
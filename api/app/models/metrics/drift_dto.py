@@ -6,6 +6,7 @@ from pydantic.alias_generators import to_camel
 
 from app.models.inferred_schema_dto import FieldType
 from app.models.job_status import JobStatus
+from app.models.metrics.sampling_dto import Sampling
 
 
 class DriftAlgorithm(str, Enum):
@@ -39,6 +40,8 @@ class Drift(BaseModel):
 class DriftDTO(BaseModel):
     job_status: JobStatus
     drift: Optional[Drift]
+    approximate: bool = False
+    sampling: Optional[Sampling] = None
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -50,13 +53,17 @@ class DriftDTO(BaseModel):
     def from_dict(
         job_status: JobStatus,
         drift_data: Optional[Dict],
+        sampling_data: Optional[Dict] = None,
     ) -> 'DriftDTO':
         """Create a DriftDTO from a dictionary of data."""
         drift = DriftDTO._create_drift(drift_data=drift_data)
+        sampling = Sampling.from_dict(sampling_data)
 
         return DriftDTO(
             job_status=job_status,
             drift=drift,
+            approximate=sampling is not None,
+            sampling=sampling,
         )
 
     @staticmethod
@@ -0,0 +1,24 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict
+from pydantic.alias_generators import to_camel
+
+
+class MetricsWarning(BaseModel):
+    """Limit the metrics job applied to the data it collected for a section of the metrics."""
+
+    section: str
+    message: str
+
+    model_config = ConfigDict(populate_by_name=True, alias_generator=to_camel)
+
+    @staticmethod
+    def from_list(
+        warnings_data: Optional[List[Dict]], section: str
+    ) -> List['MetricsWarning']:
+        """Create the MetricsWarnings of a section from a list of data."""
+        return [
+            MetricsWarning(**warning)
+            for warning in warnings_data or []
+            if warning['section'] == section
+        ]
@@ -6,6 +6,8 @@ from pydantic.alias_generators import to_camel
 from app.models.dataset_type import DatasetType
 from app.models.exceptions import MetricsInternalError
 from app.models.job_status import JobStatus
+from app.models.metrics.metrics_warning_dto import MetricsWarning
+from app.models.metrics.sampling_dto import Sampling
 from app.models.model_dto import ModelType
 
 
@@ -66,6 +68,9 @@ class AdditionalGroupedMetrics(GroupedBaseClassificationMetrics):
     area_under_roc: Optional[List[Distribution]] = None
     area_under_pr: Optional[List[Distribution]] = None
     log_loss: Optional[List[Distribution]] = None
+    # score bins of the thresholds of area_under_roc and area_under_pr when they are
+    # approximate, as the ones rolled up to a coarser granularity; None when exact
+    score_bins: Optional[int] = None
 
     model_config = ConfigDict(
         populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
@@ -202,6 +207,9 @@ class ModelQualityDTO(BaseModel):
         | RegressionModelQuality
         | CurrentRegressionModelQuality
     ]
+    approximate: bool = False
+    sampling: Optional[Sampling] = None
+    warnings: List[MetricsWarning] = []
 
     model_config = ConfigDict(populate_by_name=True, alias_generator=to_camel)
 
@@ -211,6 +219,8 @@ class ModelQualityDTO(BaseModel):
         model_type: ModelType,
         job_status: JobStatus,
         model_quality_data: Optional[Dict],
+        sampling_data: Optional[Dict] = None,
+        warnings_data: Optional[List[Dict]] = None,
     ) -> 'ModelQualityDTO':
         """Create a ModelQualityDTO from a dictionary of data."""
         if not model_quality_data:
@@ -224,10 +234,14 @@ class ModelQualityDTO(BaseModel):
             dataset_type=dataset_type,
             model_quality_data=model_quality_data,
         )
+        sampling = Sampling.from_dict(sampling_data)
 
         return ModelQualityDTO(
             job_status=job_status,
             model_quality=model_quality,
+            approximate=sampling is not None,
+            sampling=sampling,
+            warnings=MetricsWarning.from_list(warnings_data, 'MODEL_QUALITY'),
         )
 
     @staticmethod
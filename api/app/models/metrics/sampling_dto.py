@@ -0,0 +1,30 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel, ConfigDict
+from pydantic.alias_generators import to_camel
+
+
+class ConfidenceInterval(BaseModel):
+    lower: Optional[float] = None
+    upper: Optional[float] = None
+
+    model_config = ConfigDict(populate_by_name=True, alias_generator=to_camel)
+
+
+class Sampling(BaseModel):
+    """Sample the metrics of a current dataset were computed on."""
+
+    population_size: int
+    sample_size: int
+    confidence_level: float
+    estimates: Dict[str, Optional[float]] = {}
+    confidence_intervals: Dict[str, ConfidenceInterval]
+
+    model_config = ConfigDict(populate_by_name=True, alias_generator=to_camel)
+
+    @staticmethod
+    def from_dict(sampling_data: Optional[Dict]) -> Optional['Sampling']:
+        """Create a Sampling from a dictionary of data, None without a sample."""
+        if not sampling_data:
+            return None
+        return Sampling(**sampling_data)
@@ -5,6 +5,7 @@ from pydantic import BaseModel, ConfigDict
 from pydantic.alias_generators import to_camel
 
 from app.models.job_status import JobStatus
+from app.models.metrics.sampling_dto import Sampling
 
 
 class Statistics(BaseModel):
@@ -27,6 +28,8 @@ class StatisticsDTO(BaseModel):
     job_status: JobStatus
     statistics: Optional[Statistics]
     date: str
+    approximate: bool = False
+    sampling: Optional[Sampling] = None
 
     model_config = ConfigDict(
         populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
@@ -34,14 +37,20 @@ class StatisticsDTO(BaseModel):
 
     @staticmethod
     def from_dict(
-        job_status: JobStatus, date: datetime, statistics_data: Optional[Dict]
+        job_status: JobStatus,
+        date: datetime,
+        statistics_data: Optional[Dict],
+        sampling_data: Optional[Dict] = None,
     ) -> 'StatisticsDTO':
         """Create a StatisticsDTO from a dictionary of data."""
         statistics = StatisticsDTO._create_statistics(statistics_data)
+        sampling = Sampling.from_dict(sampling_data)
         return StatisticsDTO(
             job_status=job_status,
             statistics=statistics,
             date=date.isoformat(),
+            approximate=sampling is not None,
+            sampling=sampling,
         )
 
     @staticmethod
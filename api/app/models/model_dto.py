@@ -3,7 +3,7 @@ from enum import Enum
 from typing import List, Optional, Self
 from uuid import UUID
 
-from pydantic import BaseModel, ConfigDict, model_validator
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 from pydantic.alias_generators import to_camel
 
 from app.db.dao.current_dataset_dao import CurrentDataset
@@ -97,6 +97,8 @@ class ModelIn(BaseModel, validate_assignment=True):
     timestamp: ColumnDefinition
     frameworks: Optional[str] = None
     algorithm: Optional[str] = None
+    # Number of most frequent categories listed in data quality, the others are aggregated
+    category_top_k: Optional[int] = Field(default=None, gt=0)
 
     model_config = ConfigDict(
         populate_by_name=True, alias_generator=to_camel, protected_namespaces=()
@@ -190,6 +192,7 @@ class ModelIn(BaseModel, validate_assignment=True):
             timestamp=self.timestamp.to_dict(),
             frameworks=self.frameworks,
             algorithm=self.algorithm,
+            category_top_k=self.category_top_k,
             created_at=now,
             updated_at=now,
         )
@@ -208,6 +211,7 @@ class ModelOut(BaseModel):
     timestamp: ColumnDefinition
     frameworks: Optional[str]
     algorithm: Optional[str]
+    category_top_k: Optional[int] = None
     created_at: str
     updated_at: str
     latest_reference_uuid: Optional[UUID]
@@ -256,6 +260,7 @@ class ModelOut(BaseModel):
             timestamp=model.timestamp,
             frameworks=model.frameworks,
             algorithm=model.algorithm,
+            category_top_k=model.category_top_k,
             created_at=str(model.created_at),
             updated_at=str(model.updated_at),
             latest_reference_uuid=latest_reference_uuid,
@@ -0,0 +1,102 @@
+from enum import Enum
+from math import ceil
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+from spark_on_k8s.client import ExecutorInstances, PodResources
+
+MEGA_BYTES = 1024 * 1024
+# Bytes of input processed by a single shuffle partition of large jobs
+PARTITION_BYTES = 128 * MEGA_BYTES
+
+
+class SparkProfileType(str, Enum):
+    SMALL = 'SMALL'
+    MEDIUM = 'MEDIUM'
+    LARGE = 'LARGE'
+
+
+class SparkProfile(BaseModel):
+    """Resources and Spark configuration of a metrics job, sized from its input."""
+
+    type: SparkProfileType
+    shuffle_partitions: int
+    executor_instances: int
+    executor_cores: int
+    executor_memory_mb: int
+    driver_memory_mb: int
+    broadcast_threshold_mb: int
+
+    @staticmethod
+    def from_input(file_size: Optional[int], n_features: int) -> 'SparkProfile':
+        """Profile of a job reading file_size bytes for a model with n_features features.
+
+        Wide models are sized as larger files, because most metrics are computed per
+        feature. When the size of the file is unknown the profile is medium.
+        """
+        if file_size is None:
+            return MEDIUM_PROFILE
+        work = file_size * max(1.0, n_features / 100)
+        if work < 64 * MEGA_BYTES:
+            return SMALL_PROFILE
+        if work < 1024 * MEGA_BYTES:
+            return MEDIUM_PROFILE
+        return LARGE_PROFILE.model_copy(
+            update={
+                'shuffle_partitions': max(
+                    LARGE_PROFILE.shuffle_partitions, ceil(work / PARTITION_BYTES)
+                )
+            }
+        )
+
+    def spark_conf(self) -> Dict[str, str]:
+        return {
+            'spark.sql.shuffle.partitions': str(self.shuffle_partitions),
+            # AQE coalesces the shuffle partitions left small and splits skewed ones
+            'spark.sql.adaptive.enabled': 'true',
+            'spark.sql.adaptive.coalescePartitions.enabled': 'true',
+            'spark.sql.adaptive.skewJoin.enabled': 'true',
+            'spark.sql.autoBroadcastJoinThreshold': f'{self.broadcast_threshold_mb}m',
+            'spark.sql.execution.arrow.pyspark.enabled': 'true',
+            'spark.sql.execution.arrow.pyspark.fallback.enabled': 'true',
+        }
+
+    def driver_resources(self) -> PodResources:
+        return PodResources(memory=self.driver_memory_mb)
+
+    def executor_resources(self) -> PodResources:
+        return PodResources(cpu=self.executor_cores, memory=self.executor_memory_mb)
+
+    def executor_instances_conf(self) -> ExecutorInstances:
+        return ExecutorInstances(initial=self.executor_instances)
+
+
+SMALL_PROFILE = SparkProfile(
+    type=SparkProfileType.SMALL,
+    shuffle_partitions=8,
+    executor_instances=1,
+    executor_cores=1,
+    executor_memory_mb=1024,
+    driver_memory_mb=1024,
+    broadcast_threshold_mb=10,
+)
+
+MEDIUM_PROFILE = SparkProfile(
+    type=SparkProfileType.MEDIUM,
+    shuffle_partitions=64,
+    executor_instances=2,
+    executor_cores=2,
+    executor_memory_mb=4096,
+    driver_memory_mb=2048,
+    broadcast_threshold_mb=32,
+)
+
+LARGE_PROFILE = SparkProfile(
+    type=SparkProfileType.LARGE,
+    shuffle_partitions=200,
+    executor_instances=4,
+    executor_cores=4,
+    executor_memory_mb=8192,
+    driver_memory_mb=4096,
+    broadcast_threshold_mb=64,
+)
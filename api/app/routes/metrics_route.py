@@ -1,13 +1,16 @@
 import logging
+from typing import Annotated, Optional
 from uuid import UUID
 
 from fastapi import APIRouter
+from fastapi.params import Query
 
 from app.core import get_config
 from app.models.metrics.data_quality_dto import DataQualityDTO
 from app.models.metrics.drift_dto import DriftDTO
 from app.models.metrics.model_quality_dto import ModelQualityDTO
 from app.models.metrics.statistics_dto import StatisticsDTO
+from app.models.model_dto import Granularity
 from app.services.metrics_service import MetricsService
 
 logger = logging.getLogger(get_config().log_config.logger_name)
@@ -73,9 +76,12 @@ class MetricsRoute:
             status_code=200,
             response_model=ModelQualityDTO,
         )
-        def get_latest_current_model_quality_by_model_by_uuid(model_uuid: UUID):
+        def get_latest_current_model_quality_by_model_by_uuid(
+            model_uuid: UUID,
+            granularity: Annotated[Optional[Granularity], Query()] = None,
+        ):
             return metrics_service.get_current_model_quality_by_model_by_uuid(
-                model_uuid, None
+                model_uuid, None, granularity=granularity
             )
 
         @router.get(
@@ -84,10 +90,12 @@ class MetricsRoute:
             response_model=ModelQualityDTO,
         )
         def get_current_model_quality_by_model_by_uuid(
-            model_uuid: UUID, current_uuid: UUID
+            model_uuid: UUID,
+            current_uuid: UUID,
+            granularity: Annotated[Optional[Granularity], Query()] = None,
         ):
             return metrics_service.get_current_model_quality_by_model_by_uuid(
-                model_uuid, current_uuid
+                model_uuid, current_uuid, granularity=granularity
             )
 
         @router.get(
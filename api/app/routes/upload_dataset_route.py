@@ -7,6 +7,7 @@ from fastapi_pagination import Page, Params
 
 from app.models.dataset_dto import (
     CurrentDatasetDTO,
+    CurrentDatasetsCountDTO,
     FileReference,
     OrderType,
     ReferenceDatasetDTO,
@@ -118,4 +119,14 @@ class UploadDatasetRoute:
         ):
             return file_service.get_all_current_datasets_by_model_uuid(model_uuid)
 
+        @router.get(
+            '/{model_uuid}/current/count',
+            status_code=200,
+            response_model=CurrentDatasetsCountDTO,
+        )
+        def count_current_datasets_by_model_uuid(
+            model_uuid: UUID,
+        ):
+            return file_service.count_current_datasets_by_model_uuid(model_uuid)
+
         return router
@@ -1,8 +1,10 @@
 from copy import deepcopy
 import datetime
+import hashlib
 import logging
 import pathlib
-from typing import List, Optional
+import re
+from typing import Dict, List, Optional
 from uuid import UUID, uuid4
 
 import boto3
@@ -21,6 +23,7 @@ from app.db.tables.reference_dataset_metrics_table import ReferenceDatasetMetric
 from app.db.tables.reference_dataset_table import ReferenceDataset
 from app.models.dataset_dto import (
     CurrentDatasetDTO,
+    CurrentDatasetsCountDTO,
     FileReference,
     OrderType,
     ReferenceDatasetDTO,
@@ -37,10 +40,15 @@ from app.models.inferred_schema_dto import (
     SupportedTypes,
 )
 from app.models.job_status import JobStatus
+from app.models.model_dto import ModelOut
+from app.models.spark_profile import SparkProfile
 from app.services.model_service import ModelService
 
 logger = logging.getLogger(get_config().log_config.logger_name)
 
+# Characters of a Hadoop glob, the same the jobs look for to read a path as a glob
+GLOB_CHARACTERS = '*?[{'
+
 
 class FileService:
     def __init__(
@@ -116,6 +124,7 @@ class FileService:
                     path.replace('s3://', 's3a://'),
                     str(inserted_file.uuid),
                     ReferenceDatasetMetrics.__tablename__,
+                    *self.__combined_job_arguments(),
                 ],
                 app_name=str(model_out.uuid),
                 namespace=spark_config.spark_namespace,
@@ -123,6 +132,7 @@ class FileService:
                 image_pull_policy=spark_config.spark_image_pull_policy,
                 app_waiter='no_wait',
                 secret_values=create_secrets(),
+                **self.__spark_profile_args(model_out, csv_file.size),
             )
 
             return ReferenceDatasetDTO.from_reference_dataset(inserted_file)
@@ -149,7 +159,9 @@ class FileService:
             url_parts = file_ref.file_url.replace('s3://', '').split('/')
             # check if file exists in S3 with a HEAD operation.
             # if exists then we could update DB otherwise an exception will be raised
-            self.s3_client.head_object(Bucket=url_parts[0], Key='/'.join(url_parts[1:]))
+            head = self.s3_client.head_object(
+                Bucket=url_parts[0], Key='/'.join(url_parts[1:])
+            )
 
             inserted_file = self.rd_dao.insert_reference_dataset(
                 ReferenceDataset(
@@ -171,6 +183,7 @@ class FileService:
                     file_ref.file_url.replace('s3://', 's3a://'),
                     str(inserted_file.uuid),
                     ReferenceDatasetMetrics.__tablename__,
+                    *self.__combined_job_arguments(),
                 ],
                 app_name=str(model_out.uuid),
                 namespace=spark_config.spark_namespace,
@@ -178,6 +191,7 @@ class FileService:
                 image_pull_policy=spark_config.spark_image_pull_policy,
                 app_waiter='no_wait',
                 secret_values=create_secrets(),
+                **self.__spark_profile_args(model_out, head.get('ContentLength')),
             )
 
             return ReferenceDatasetDTO.from_reference_dataset(inserted_file)
@@ -219,6 +233,12 @@ class FileService:
             columns = [model_column.name for model_column in model_columns]
 
         self.validate_file(csv_file, sep, columns)
+        content_hash = self.content_hash(csv_file)
+        cloned_file = self.__clone_current_dataset(
+            model_uuid, content_hash, correlation_id_column
+        )
+        if cloned_file is not None:
+            return CurrentDatasetDTO.from_current_dataset(cloned_file)
         _f_name = csv_file.filename
         _f_uuid = uuid4()
         try:
@@ -238,36 +258,26 @@ class FileService:
 
             path = f's3://{self.bucket_name}/{object_name}'
 
-            inserted_file = self.cd_dao.insert_current_dataset(
-                CurrentDataset(
-                    uuid=_f_uuid,
-                    model_uuid=model_uuid,
-                    path=path,
-                    date=datetime.datetime.now(tz=datetime.UTC),
-                    correlation_id_column=correlation_id_column,
-                    status=JobStatus.IMPORTING,
-                )
+            current_dataset = CurrentDataset(
+                uuid=_f_uuid,
+                model_uuid=model_uuid,
+                path=path,
+                date=datetime.datetime.now(tz=datetime.UTC),
+                correlation_id_column=correlation_id_column,
+                status=JobStatus.IMPORTING,
+                content_hash=content_hash,
+            )
+            awaiting_file = self.__insert_awaiting_reference(
+                current_dataset, reference_dataset
             )
+            if awaiting_file is not None:
+                return CurrentDatasetDTO.from_current_dataset(awaiting_file)
+            inserted_file = self.cd_dao.insert_current_dataset(current_dataset)
 
             logger.debug('File %s has been correctly stored in the db', inserted_file)
 
-            spark_config = get_config().spark_config
-            self.spark_k8s_client.submit_app(
-                image=spark_config.spark_image,
-                app_path=spark_config.spark_current_app_path,
-                app_arguments=[
-                    model_out.model_dump_json(),
-                    path.replace('s3://', 's3a://'),
-                    str(inserted_file.uuid),
-                    reference_dataset.path.replace('s3://', 's3a://'),
-                    CurrentDatasetMetrics.__tablename__,
-                ],
-                app_name=str(model_out.uuid),
-                namespace=spark_config.spark_namespace,
-                service_account=spark_config.spark_service_account,
-                image_pull_policy=spark_config.spark_image_pull_policy,
-                app_waiter='no_wait',
-                secret_values=create_secrets(),
+            self.__submit_current_job(
+                model_out, inserted_file, reference_dataset, csv_file.size
             )
 
             return CurrentDatasetDTO.from_current_dataset(inserted_file)
@@ -294,43 +304,65 @@ class FileService:
             )
         try:
             url_parts = file_ref.file_url.replace('s3://', '').split('/')
-            # check if file exists in S3 with a HEAD operation.
-            # if exists then we could update DB otherwise an exception will be raised
-            self.s3_client.head_object(Bucket=url_parts[0], Key='/'.join(url_parts[1:]))
-
-            inserted_file = self.cd_dao.insert_current_dataset(
-                CurrentDataset(
-                    uuid=uuid4(),
-                    model_uuid=model_uuid,
-                    path=file_ref.file_url,
-                    date=datetime.datetime.now(tz=datetime.UTC),
-                    correlation_id_column=file_ref.correlation_id_column,
-                    status=JobStatus.IMPORTING,
+            if self.is_multi_file(file_ref.file_url):
+                file_size = self.__multi_file_size(
+                    url_parts[0], '/'.join(url_parts[1:])
                 )
+                content_hash = None
+            else:
+                # check if file exists in S3 with a HEAD operation.
+                # if exists then we could update DB otherwise an exception will be raised
+                head = self.s3_client.head_object(
+                    Bucket=url_parts[0], Key='/'.join(url_parts[1:])
+                )
+                file_size = head.get('ContentLength')
+                # the ETag identifies the content of the object, not its key
+                etag = head.get('ETag')
+                content_hash = 'etag:' + etag.strip('"') if etag else None
+            cloned_file = self.__clone_current_dataset(
+                model_uuid,
+                content_hash,
+                file_ref.correlation_id_column,
+                path=file_ref.file_url,
+            )
+            if cloned_file is not None:
+                return CurrentDatasetDTO.from_current_dataset(cloned_file)
+
+            current_dataset = CurrentDataset(
+                uuid=uuid4(),
+                model_uuid=model_uuid,
+                path=file_ref.file_url,
+                date=datetime.datetime.now(tz=datetime.UTC),
+                correlation_id_column=file_ref.correlation_id_column,
+                status=JobStatus.IMPORTING,
+                content_hash=content_hash,
             )
+            # the partition filter is an argument of the current job, that is not stored
+            if file_ref.partition_filter is None:
+                awaiting_file = self.__insert_awaiting_reference(
+                    current_dataset, reference_dataset
+                )
+                if awaiting_file is not None:
+                    return CurrentDatasetDTO.from_current_dataset(awaiting_file)
+            inserted_file = self.cd_dao.insert_current_dataset(current_dataset)
             logger.debug('File %s has been correctly stored in the db', inserted_file)
 
-            spark_config = get_config().spark_config
-            self.spark_k8s_client.submit_app(
-                image=spark_config.spark_image,
-                app_path=spark_config.spark_current_app_path,
-                app_arguments=[
-                    model_out.model_dump_json(),
-                    file_ref.file_url.replace('s3://', 's3a://'),
-                    str(inserted_file.uuid),
-                    reference_dataset.path.replace('s3://', 's3a://'),
-                    CurrentDatasetMetrics.__tablename__,
-                ],
-                app_name=str(model_out.uuid),
-                namespace=spark_config.spark_namespace,
-                service_account=spark_config.spark_service_account,
-                image_pull_policy=spark_config.spark_image_pull_policy,
-                app_waiter='no_wait',
-                secret_values=create_secrets(),
+            self.__submit_current_job(
+                model_out,
+                inserted_file,
+                reference_dataset,
+                file_size,
+                *(
+                    [file_ref.partition_filter.model_dump_json()]
+                    if file_ref.partition_filter
+                    else []
+                ),
             )
 
             return CurrentDatasetDTO.from_current_dataset(inserted_file)
 
+        except HTTPException:
+            raise
         except NoCredentialsError as nce:
             raise HTTPException(
                 status_code=500, detail='S3 credentials not available'
@@ -344,6 +376,264 @@ class FileService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e)) from e
 
+    def submit_stranded_awaiting_currents(self) -> List[CurrentDatasetDTO]:
+        """Submit the jobs of the currents left awaiting a reference job.
+
+        The currents awaiting a reference that is not importing anymore, or that have
+        been awaiting for longer than spark_awaiting_reference_timeout_minutes, are
+        claimed and computed by their own jobs, as without combined jobs.
+        """
+        awaiting_since = datetime.datetime.now(tz=datetime.UTC) - datetime.timedelta(
+            minutes=get_config().spark_config.spark_awaiting_reference_timeout_minutes
+        )
+        submitted = []
+        for current_dataset in self.cd_dao.claim_stranded_awaiting_currents(
+            awaiting_since
+        ):
+            try:
+                model_out = self.model_svc.get_model_by_uuid(current_dataset.model_uuid)
+                reference_dataset = self.rd_dao.get_reference_dataset_by_model_uuid(
+                    current_dataset.model_uuid
+                )
+                self.__submit_current_job(
+                    model_out, current_dataset, reference_dataset, None
+                )
+            except Exception:
+                # the claimed current would be importing forever
+                logger.exception(
+                    'Submission of awaiting current %s failed', current_dataset.uuid
+                )
+                self.cd_dao.update_current_dataset_status(
+                    current_dataset.uuid, JobStatus.ERROR
+                )
+                continue
+            logger.info(
+                'Current %s was left awaiting its reference, job submitted',
+                current_dataset.uuid,
+            )
+            submitted.append(CurrentDatasetDTO.from_current_dataset(current_dataset))
+        return submitted
+
+    def __submit_current_job(
+        self,
+        model_out: ModelOut,
+        current_dataset: CurrentDataset,
+        reference_dataset: ReferenceDataset,
+        file_size: Optional[int],
+        *job_arguments: str,
+    ) -> None:
+        """Submit the job computing the metrics of a current against its reference."""
+        spark_config = get_config().spark_config
+        self.spark_k8s_client.submit_app(
+            image=spark_config.spark_image,
+            app_path=spark_config.spark_current_app_path,
+            app_arguments=[
+                model_out.model_dump_json(),
+                current_dataset.path.replace('s3://', 's3a://'),
+                str(current_dataset.uuid),
+                reference_dataset.path.replace('s3://', 's3a://'),
+                CurrentDatasetMetrics.__tablename__,
+                *job_arguments,
+            ],
+            app_name=str(model_out.uuid),
+            namespace=spark_config.spark_namespace,
+            service_account=spark_config.spark_service_account,
+            image_pull_policy=spark_config.spark_image_pull_policy,
+            app_waiter='no_wait',
+            secret_values=create_secrets(),
+            **self.__spark_profile_args(model_out, file_size),
+        )
+
+    def __clone_current_dataset(
+        self,
+        model_uuid: UUID,
+        content_hash: Optional[str],
+        correlation_id_column: Optional[str],
+        path: Optional[str] = None,
+    ) -> Optional[CurrentDataset]:
+        """Clone the metrics of a previous current dataset with the same content.
+
+        The metrics of a current only depend on its content and on the model and its
+        reference, that can't change once loaded. When a current with the same content
+        already has metrics they are copied, without submitting a job. Uploaded files
+        are not stored again and keep the path of the cloned dataset.
+        """
+        if content_hash is None:
+            return None
+        source = self.cd_dao.get_current_dataset_by_content_hash(
+            model_uuid, content_hash
+        )
+        if source is None:
+            return None
+        cloned_file = self.cd_dao.insert_cloned_current_dataset(
+            CurrentDataset(
+                uuid=uuid4(),
+                model_uuid=model_uuid,
+                path=path or source.path,
+                date=datetime.datetime.now(tz=datetime.UTC),
+                correlation_id_column=correlation_id_column,
+                status=JobStatus.SUCCEEDED,
+                content_hash=content_hash,
+                cloned_from=source.uuid,
+            )
+        )
+        logger.info(
+            'Metrics of current %s cloned from %s with the same content, job skipped',
+            cloned_file.uuid,
+            source.uuid,
+        )
+        return cloned_file
+
+    def __insert_awaiting_reference(
+        self, current_dataset: CurrentDataset, reference_dataset: ReferenceDataset
+    ) -> Optional[CurrentDataset]:
+        """Insert a current whose metrics are computed by the job of its reference.
+
+        With combined jobs, a current loaded while its reference is importing is not
+        submitted: the job of the reference computes its metrics too, in the same
+        application, so the reference is read and aggregated once. Returns None when
+        the current needs its own job.
+        """
+        if (
+            not get_config().spark_config.spark_combined_jobs
+            or reference_dataset.status != JobStatus.IMPORTING
+        ):
+            return None
+        awaiting_file = self.cd_dao.insert_current_dataset_awaiting_reference(
+            current_dataset, reference_dataset.uuid
+        )
+        if awaiting_file is not None:
+            logger.info(
+                'Metrics of current %s computed by the job of reference %s',
+                awaiting_file.uuid,
+                reference_dataset.uuid,
+            )
+        return awaiting_file
+
+    @staticmethod
+    def __combined_job_arguments() -> List[str]:
+        """Arguments of the reference job to compute the currents awaiting it."""
+        if get_config().spark_config.spark_combined_jobs:
+            return [CurrentDatasetMetrics.__tablename__]
+        return []
+
+    @staticmethod
+    def is_multi_file(file_url: str) -> bool:
+        """Whether file_url is a prefix or a glob of many objects."""
+        return file_url.endswith('/') or any(
+            character in file_url for character in GLOB_CHARACTERS
+        )
+
+    @staticmethod
+    def glob_segment_regex(segment: str) -> re.Pattern:
+        """Regex of a segment of a Hadoop glob.
+
+        * and ? don't match /, [...] is a character class, negated by a leading ^ or !,
+        {a,b} matches either of its comma separated alternatives and a backslash escapes
+        the next character.
+        """
+        regex = ''
+        alternatives = 0
+        index = 0
+        while index < len(segment):
+            character = segment[index]
+            if character == '\\' and index + 1 < len(segment):
+                index += 1
+                regex += re.escape(segment[index])
+            elif character == '*':
+                regex += '[^/]*'
+            elif character == '?':
+                regex += '[^/]'
+            elif character == '[' and ']' in segment[index + 2 :]:
+                end = segment.index(']', index + 2)
+                characters = segment[index + 1 : end].replace('\\', '\\\\')
+                if characters[0] in '^!':
+                    characters = '^' + characters[1:]
+                regex += f'[{characters}]'
+                index = end
+            elif character == '{':
+                alternatives += 1
+                regex += '(?:'
+            elif character == ',' and alternatives:
+                regex += '|'
+            elif character == '}' and alternatives:
+                alternatives -= 1
+                regex += ')'
+            else:
+                regex += re.escape(character)
+            index += 1
+        return re.compile(regex)
+
+    @staticmethod
+    def glob_matches(key: str, pattern: str) -> bool:
+        """Whether the job reads the object key from the glob pattern.
+
+        The glob is matched segment by segment against the leading segments of the
+        key, as Hadoop expands it. A match of the whole key is a file, a match of
+        fewer segments, or of a glob ending with /, is a directory that is read with
+        all the objects below it.
+        """
+        directory = pattern.endswith('/')
+        pattern_segments = pattern.rstrip('/').split('/')
+        key_segments = key.split('/')
+        if len(key_segments) < len(pattern_segments) + directory:
+            return False
+        return all(
+            FileService.glob_segment_regex(pattern_segment).fullmatch(key_segment)
+            for pattern_segment, key_segment in zip(pattern_segments, key_segments)
+        )
+
+    def __multi_file_size(self, bucket: str, pattern: str) -> int:
+        """Total size of the objects under a prefix or matching a glob.
+
+        Objects are listed from the prefix before the first glob character and matched
+        by glob_matches. Raises a 404 when no object matches.
+        """
+        glob_start = next(
+            (
+                index
+                for index, character in enumerate(pattern)
+                if character in GLOB_CHARACTERS
+            ),
+            len(pattern),
+        )
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        sizes = [
+            s3_object['Size']
+            for page in paginator.paginate(Bucket=bucket, Prefix=pattern[:glob_start])
+            for s3_object in page.get('Contents', [])
+            if glob_start == len(pattern)
+            or self.glob_matches(s3_object['Key'], pattern)
+        ]
+        if not sizes:
+            raise HTTPException(
+                status_code=404, detail=f'No file matches s3://{bucket}/{pattern}'
+            )
+        return sum(sizes)
+
+    @staticmethod
+    def content_hash(csv_file: UploadFile) -> str:
+        """sha256 of the content of the file, read in chunks."""
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: csv_file.file.read(1024 * 1024), b''):
+            digest.update(chunk)
+        csv_file.file.seek(0)
+        return f'sha256:{digest.hexdigest()}'
+
+    @staticmethod
+    def __spark_profile_args(model_out: ModelOut, file_size: Optional[int]) -> Dict:
+        """Spark configuration and resources of submit_app for a job on file_size bytes."""
+        profile = SparkProfile.from_input(file_size, len(model_out.features))
+        logger.debug(
+            'Submitting job of model %s with profile %s', model_out.uuid, profile
+        )
+        return {
+            'spark_conf': profile.spark_conf(),
+            'driver_resources': profile.driver_resources(),
+            'executor_resources': profile.executor_resources(),
+            'executor_instances': profile.executor_instances_conf(),
+        }
+
     def get_all_reference_datasets_by_model_uuid_paginated(
         self,
         model_uuid: UUID,
@@ -405,6 +695,20 @@ class FileService:
             for current_dataset in currents
         ]
 
+    def count_current_datasets_by_model_uuid(
+        self,
+        model_uuid: UUID,
+    ) -> CurrentDatasetsCountDTO:
+        """Count the current datasets of a model and the jobs skipped by cloning."""
+        current_datasets, skipped_jobs = (
+            self.cd_dao.count_current_datasets_by_model_uuid(model_uuid)
+        )
+        return CurrentDatasetsCountDTO(
+            model_uuid=model_uuid,
+            current_datasets=current_datasets,
+            skipped_jobs=skipped_jobs,
+        )
+
     @staticmethod
     def infer_schema(csv_file: UploadFile, sep: str = ',') -> InferredSchemaDTO:
         FileService.validate_file(csv_file, sep)
@@ -1,5 +1,5 @@
 import datetime
-from typing import Optional
+from typing import Dict, Optional
 from uuid import UUID
 
 from app.db.dao.current_dataset_dao import CurrentDatasetDAO
@@ -17,7 +17,7 @@ from app.models.metrics.data_quality_dto import DataQualityDTO
 from app.models.metrics.drift_dto import DriftDTO
 from app.models.metrics.model_quality_dto import ModelQualityDTO
 from app.models.metrics.statistics_dto import StatisticsDTO
-from app.models.model_dto import ModelType
+from app.models.model_dto import Granularity, ModelType
 from app.services.model_service import ModelService
 
 
@@ -70,9 +70,12 @@ class MetricsService:
         )
 
     def get_current_model_quality_by_model_by_uuid(
-        self, model_uuid: UUID, current_uuid: Optional[UUID]
+        self,
+        model_uuid: UUID,
+        current_uuid: Optional[UUID],
+        granularity: Optional[Granularity] = None,
     ) -> ModelQualityDTO:
-        """Retrieve current model quality for a model by its UUID and an optional current dataset UUID."""
+        """Retrieve current model quality for a model by its UUID, an optional current dataset UUID and an optional coarser granularity."""
         return self._get_model_quality_by_model_uuid(
             model_uuid=model_uuid,
             dataset_and_metrics_getter=lambda uuid: self.check_and_get_current_dataset_and_metrics(
@@ -80,6 +83,7 @@ class MetricsService:
             ),
             dataset_type=DatasetType.CURRENT,
             missing_status=JobStatus.MISSING_CURRENT,
+            granularity=granularity,
         )
 
     def get_reference_data_quality_by_model_by_uuid(
@@ -194,6 +198,7 @@ class MetricsService:
         dataset_and_metrics_getter,
         dataset_type: DatasetType,
         missing_status,
+        granularity: Optional[Granularity] = None,
     ) -> ModelQualityDTO:
         """Retrieve model quality for a model by its UUID."""
         model = self.model_service.get_model_by_uuid(model_uuid)
@@ -204,6 +209,7 @@ class MetricsService:
             dataset=dataset,
             metrics=metrics,
             missing_status=missing_status,
+            granularity=None if granularity == model.granularity else granularity,
         )
 
     def _get_data_quality_by_model_uuid(
@@ -236,6 +242,13 @@ class MetricsService:
             missing_status=missing_status,
         )
 
+    @staticmethod
+    def _sampling_data(
+        metrics: ReferenceDatasetMetrics | CurrentDatasetMetrics,
+    ) -> Optional[Dict]:
+        """Return the sample the metrics were computed on, only current ones are sampled."""
+        return getattr(metrics, 'sampling', None)
+
     @staticmethod
     def _create_statistics_dto(
         dataset: Optional[ReferenceDataset | CurrentDataset],
@@ -259,6 +272,7 @@ class MetricsService:
             job_status=dataset.status,
             date=dataset.date,
             statistics_data=metrics.statistics,
+            sampling_data=MetricsService._sampling_data(metrics),
         )
 
     @staticmethod
@@ -268,6 +282,7 @@ class MetricsService:
         dataset: Optional[ReferenceDataset | CurrentDataset],
         metrics: Optional[ReferenceDatasetMetrics | CurrentDatasetMetrics],
         missing_status,
+        granularity: Optional[Granularity] = None,
     ) -> ModelQualityDTO:
         """Create a ModelQualityDTO from the provided dataset and metrics."""
         if not dataset:
@@ -288,8 +303,44 @@ class MetricsService:
             dataset_type=dataset_type,
             model_type=model_type,
             job_status=dataset.status,
-            model_quality_data=metrics.model_quality,
+            model_quality_data=MetricsService._roll_up_model_quality(
+                model_type=model_type,
+                model_quality_data=metrics.model_quality,
+                granularity=granularity,
+            ),
+            sampling_data=MetricsService._sampling_data(metrics),
+            warnings_data=metrics.warnings,
+        )
+
+    @staticmethod
+    def _roll_up_model_quality(
+        model_type: ModelType,
+        model_quality_data: Dict,
+        granularity: Optional[Granularity],
+    ) -> Dict:
+        """Replace the grouped metrics with the ones rolled up to granularity by the metrics job."""
+        if not granularity or not model_quality_data:
+            return model_quality_data
+        grouped_metrics_by_granularity = model_quality_data.get(
+            'grouped_metrics_by_granularity', {}
         )
+        if granularity.value not in grouped_metrics_by_granularity:
+            raise MetricsBadRequestError(
+                f'Model quality is not available with granularity {granularity.value}'
+            )
+        grouped_metrics = grouped_metrics_by_granularity[granularity.value]
+        if model_type == ModelType.MULTI_CLASS:
+            return {
+                **model_quality_data,
+                'class_metrics': [
+                    {
+                        **class_metrics,
+                        'grouped_metrics': grouped_metrics[class_metrics['class_name']],
+                    }
+                    for class_metrics in model_quality_data['class_metrics']
+                ],
+            }
+        return {**model_quality_data, 'grouped_metrics': grouped_metrics}
 
     @staticmethod
     def _create_data_quality_dto(
@@ -315,6 +366,8 @@ class MetricsService:
             model_type=model_type,
             job_status=dataset.status,
             data_quality_data=metrics.data_quality,
+            sampling_data=MetricsService._sampling_data(metrics),
+            warnings_data=metrics.warnings,
         )
 
     @staticmethod
@@ -337,4 +390,5 @@ class MetricsService:
         return DriftDTO.from_dict(
             job_status=dataset.status,
             drift_data=metrics.drift,
+            sampling_data=MetricsService._sampling_data(metrics),
         )
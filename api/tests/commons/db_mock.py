@@ -53,6 +53,7 @@ def get_sample_model(
     },
     frameworks: Optional[str] = None,
     algorithm: Optional[str] = None,
+    category_top_k: Optional[int] = None,
 ) -> Model:
     return Model(
         id=id,
@@ -68,6 +69,7 @@ def get_sample_model(
         timestamp=timestamp,
         frameworks=frameworks,
         algorithm=algorithm,
+        category_top_k=category_top_k,
         created_at=datetime.datetime.now(tz=datetime.UTC),
         updated_at=datetime.datetime.now(tz=datetime.UTC),
     )
@@ -121,6 +123,7 @@ def get_sample_model_in(
     ),
     frameworks: Optional[str] = None,
     algorithm: Optional[str] = None,
+    category_top_k: Optional[int] = None,
 ):
     return ModelIn(
         name=name,
@@ -134,6 +137,7 @@ def get_sample_model_in(
         timestamp=timestamp,
         frameworks=frameworks,
         algorithm=algorithm,
+        category_top_k=category_top_k,
     )
 
 
@@ -165,6 +169,7 @@ def get_sample_current_dataset(
         date=datetime.datetime.now(tz=datetime.UTC),
         correlation_id_column='some_column',
         status=status,
+        cloned_from=None,
     )
 
 
@@ -308,6 +313,35 @@ multiclass_model_quality_dict = {
     },
 }
 
+monthly_grouped_metrics_dict = {
+    metric: values[:1] for metric, values in grouped_metrics_dict.items()
+}
+
+binary_current_model_quality_by_granularity_dict = {
+    'global_metrics': binary_model_quality_dict,
+    'grouped_metrics': grouped_metrics_dict,
+    'grouped_metrics_by_granularity': {
+        'WEEK': {**grouped_metrics_dict, 'score_bins': 1000},
+        'MONTH': {**monthly_grouped_metrics_dict, 'score_bins': 1000},
+    },
+}
+
+multiclass_model_quality_by_granularity_dict = {
+    **multiclass_model_quality_dict,
+    'grouped_metrics_by_granularity': {
+        'WEEK': {
+            'classA': grouped_metrics_dict,
+            'classB': grouped_metrics_dict,
+            'classC': grouped_metrics_dict,
+        },
+        'MONTH': {
+            'classA': monthly_grouped_metrics_dict,
+            'classB': monthly_grouped_metrics_dict,
+            'classC': monthly_grouped_metrics_dict,
+        },
+    },
+}
+
 classification_data_quality_dict = {
     'nObservations': 200,
     'classMetrics': [
@@ -510,21 +544,50 @@ def get_sample_reference_metrics(
     model_quality: Dict = binary_model_quality_dict,
     data_quality: Dict = classification_data_quality_dict,
     statistics: Dict = statistics_dict,
+    warnings: Optional[List[Dict]] = None,
 ) -> ReferenceDatasetMetrics:
     return ReferenceDatasetMetrics(
         reference_uuid=reference_uuid,
         model_quality=model_quality,
         statistics=statistics,
         data_quality=data_quality,
+        warnings=warnings,
     )
 
 
+sampling_dict = {
+    'population_size': 1000000,
+    'sample_size': 10012,
+    'confidence_level': 0.95,
+    'estimates': {'accuracy': 0.8973, 'area_under_roc': 0.9374},
+    'confidence_intervals': {
+        'accuracy': {'lower': 0.8912, 'upper': 0.9034},
+        'area_under_roc': {'lower': 0.9321, 'upper': 0.9427},
+    },
+}
+
+warnings_list = [
+    {
+        'section': 'DATA_QUALITY',
+        'message': 'merchant has more than 10000 categories, only the 10000 most frequent are listed '
+        'and the others are aggregated',
+    },
+    {
+        'section': 'MODEL_QUALITY',
+        'message': 'standardized_residuals, predictions and targets are collected from a sample of at '
+        'most 100000 of 2500000 rows',
+    },
+]
+
+
 def get_sample_current_metrics(
     current_uuid: uuid.UUID = CURRENT_UUID,
     model_quality: Dict = binary_current_model_quality_dict,
     data_quality: Dict = classification_data_quality_dict,
     statistics: Dict = statistics_dict,
     drift: Dict = drift_dict,
+    sampling: Optional[Dict] = None,
+    warnings: Optional[List[Dict]] = None,
 ) -> CurrentDatasetMetrics:
     return CurrentDatasetMetrics(
         current_uuid=current_uuid,
@@ -532,4 +595,6 @@ def get_sample_current_metrics(
         statistics=statistics,
         data_quality=data_quality,
         drift=drift,
+        sampling=sampling,
+        warnings=warnings,
     )
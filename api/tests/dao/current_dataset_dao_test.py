@@ -4,8 +4,12 @@ from uuid import uuid4
 from fastapi_pagination import Params
 
 from app.db.dao.current_dataset_dao import CurrentDatasetDAO
+from app.db.dao.current_dataset_metrics_dao import CurrentDatasetMetricsDAO
 from app.db.dao.model_dao import ModelDAO
+from app.db.dao.reference_dataset_dao import ReferenceDatasetDAO
 from app.db.tables.current_dataset_table import CurrentDataset
+from app.db.tables.reference_dataset_table import ReferenceDataset
+from app.models.job_status import JobStatus
 from tests.commons import db_mock
 from tests.commons.db_integration import DatabaseIntegration
 
@@ -16,6 +20,8 @@ class CurrentDatasetDAOTest(DatabaseIntegration):
         super().setUpClass()
         cls.current_dataset_dao = CurrentDatasetDAO(cls.db)
         cls.model_dao = ModelDAO(cls.db)
+        cls.metrics_dao = CurrentDatasetMetricsDAO(cls.db)
+        cls.reference_dataset_dao = ReferenceDatasetDAO(cls.db)
 
     def test_insert_current_dataset_upload_result(self):
         model = self.model_dao.insert(db_mock.get_sample_model())
@@ -123,3 +129,191 @@ class CurrentDatasetDAOTest(DatabaseIntegration):
         assert inserted_3.path == retrieved.items[2].path
 
         assert len(retrieved.items) == 3
+
+    def test_insert_cloned_current_dataset(self):
+        model = self.model_dao.insert(db_mock.get_sample_model())
+        source = db_mock.get_sample_current_dataset(status=JobStatus.SUCCEEDED.value)
+        source.content_hash = 'sha256:abc'
+        self.current_dataset_dao.insert_current_dataset(source)
+        source_metrics = db_mock.get_sample_current_metrics(
+            current_uuid=source.uuid, warnings=db_mock.warnings_list
+        )
+        source_metrics.drift_compressed = source_metrics.drift
+        source_metrics.drift = None
+        self.metrics_dao.insert_current_dataset_metrics(source_metrics)
+
+        assert (
+            self.current_dataset_dao.get_current_dataset_by_content_hash(
+                model.uuid, 'sha256:def'
+            )
+            is None
+        )
+        found = self.current_dataset_dao.get_current_dataset_by_content_hash(
+            model.uuid, 'sha256:abc'
+        )
+        assert found.uuid == source.uuid
+
+        cloned = self.current_dataset_dao.insert_cloned_current_dataset(
+            CurrentDataset(
+                uuid=uuid4(),
+                model_uuid=model.uuid,
+                path=source.path,
+                date=datetime.datetime.now(tz=datetime.UTC),
+                status=JobStatus.SUCCEEDED,
+                content_hash='sha256:abc',
+                cloned_from=source.uuid,
+            )
+        )
+        cloned_metrics = self.metrics_dao.get_current_metrics_by_model_uuid(
+            model.uuid, cloned.uuid
+        )
+        assert cloned_metrics.uuid != source_metrics.uuid
+        assert cloned_metrics.model_quality == source_metrics.model_quality
+        assert cloned_metrics.drift == source_metrics.drift_compressed
+        assert cloned_metrics.drift_compressed == source_metrics.drift_compressed
+        assert cloned_metrics.warnings == db_mock.warnings_list
+
+    def test_count_current_datasets_by_model_uuid(self):
+        model = self.model_dao.insert(db_mock.get_sample_model())
+        assert self.current_dataset_dao.count_current_datasets_by_model_uuid(
+            model.uuid
+        ) == (0, 0)
+
+        source = db_mock.get_sample_current_dataset(status=JobStatus.SUCCEEDED.value)
+        self.current_dataset_dao.insert_current_dataset(source)
+        self.metrics_dao.insert_current_dataset_metrics(
+            db_mock.get_sample_current_metrics(current_uuid=source.uuid)
+        )
+        for _ in range(2):
+            self.current_dataset_dao.insert_cloned_current_dataset(
+                CurrentDataset(
+                    uuid=uuid4(),
+                    model_uuid=model.uuid,
+                    path=source.path,
+                    date=datetime.datetime.now(tz=datetime.UTC),
+                    status=JobStatus.SUCCEEDED,
+                    cloned_from=source.uuid,
+                )
+            )
+
+        assert self.current_dataset_dao.count_current_datasets_by_model_uuid(
+            model.uuid
+        ) == (3, 2)
+        assert self.current_dataset_dao.count_current_datasets_by_model_uuid(
+            uuid4()
+        ) == (0, 0)
+
+    def test_insert_current_dataset_awaiting_reference(self):
+        model = self.model_dao.insert(db_mock.get_sample_model())
+        reference = self.reference_dataset_dao.insert_reference_dataset(
+            db_mock.get_sample_reference_dataset(model_uuid=model.uuid)
+        )
+
+        awaiting = self.current_dataset_dao.insert_current_dataset_awaiting_reference(
+            CurrentDataset(
+                uuid=uuid4(),
+                model_uuid=model.uuid,
+                path='frank_file.csv',
+                date=datetime.datetime.now(tz=datetime.UTC),
+            ),
+            reference.uuid,
+        )
+        retrieved = self.current_dataset_dao.get_current_dataset_by_model_uuid(
+            model.uuid, awaiting.uuid
+        )
+        assert retrieved.awaiting_reference
+
+        not_awaiting = self.current_dataset_dao.insert_current_dataset(
+            CurrentDataset(
+                uuid=uuid4(),
+                model_uuid=model.uuid,
+                path='frank_file.csv',
+                date=datetime.datetime.now(tz=datetime.UTC),
+            )
+        )
+        retrieved = self.current_dataset_dao.get_current_dataset_by_model_uuid(
+            model.uuid, not_awaiting.uuid
+        )
+        assert not retrieved.awaiting_reference
+
+    def test_insert_current_dataset_awaiting_completed_reference(self):
+        model = self.model_dao.insert(db_mock.get_sample_model())
+        reference = self.reference_dataset_dao.insert_reference_dataset(
+            db_mock.get_sample_reference_dataset(
+                model_uuid=model.uuid, status=JobStatus.SUCCEEDED.value
+            )
+        )
+
+        assert (
+            self.current_dataset_dao.insert_current_dataset_awaiting_reference(
+                CurrentDataset(
+                    uuid=uuid4(),
+                    model_uuid=model.uuid,
+                    path='frank_file.csv',
+                    date=datetime.datetime.now(tz=datetime.UTC),
+                ),
+                reference.uuid,
+            )
+            is None
+        )
+        assert (
+            self.current_dataset_dao.get_latest_current_dataset_by_model_uuid(
+                model.uuid
+            )
+            is None
+        )
+
+    def test_claim_stranded_awaiting_currents(self):
+        now = datetime.datetime.now(tz=datetime.UTC)
+        importing_model = self.model_dao.insert(db_mock.get_sample_model())
+        importing_reference = self.reference_dataset_dao.insert_reference_dataset(
+            db_mock.get_sample_reference_dataset(model_uuid=importing_model.uuid)
+        )
+        completed_model = self.model_dao.insert(
+            db_mock.get_sample_model(id=2, uuid=uuid4())
+        )
+        completed_reference = self.reference_dataset_dao.insert_reference_dataset(
+            db_mock.get_sample_reference_dataset(
+                uuid=uuid4(), model_uuid=completed_model.uuid
+            )
+        )
+
+        def insert_awaiting(model_uuid, reference_uuid, date):
+            return self.current_dataset_dao.insert_current_dataset_awaiting_reference(
+                CurrentDataset(
+                    uuid=uuid4(),
+                    model_uuid=model_uuid,
+                    path='frank_file.csv',
+                    date=date,
+                ),
+                reference_uuid,
+            )
+
+        awaiting = insert_awaiting(importing_model.uuid, importing_reference.uuid, now)
+        timed_out = insert_awaiting(
+            importing_model.uuid,
+            importing_reference.uuid,
+            now - datetime.timedelta(hours=12),
+        )
+        stranded = insert_awaiting(completed_model.uuid, completed_reference.uuid, now)
+        with self.db.begin_session() as session:
+            session.query(ReferenceDataset).where(
+                ReferenceDataset.uuid == completed_reference.uuid
+            ).update({ReferenceDataset.status: JobStatus.SUCCEEDED})
+
+        claimed = self.current_dataset_dao.claim_stranded_awaiting_currents(
+            now - datetime.timedelta(hours=6)
+        )
+
+        assert {current.uuid for current in claimed} == {timed_out.uuid, stranded.uuid}
+        assert not any(current.awaiting_reference for current in claimed)
+        assert self.current_dataset_dao.get_current_dataset_by_model_uuid(
+            importing_model.uuid, awaiting.uuid
+        ).awaiting_reference
+        # claimed once
+        assert (
+            self.current_dataset_dao.claim_stranded_awaiting_currents(
+                now - datetime.timedelta(hours=6)
+            )
+            == []
+        )
@@ -35,3 +35,18 @@ class CurrentDatasetMetricsDAOTest(DatabaseIntegration):
             model_uuid=current.model_uuid, current_uuid=current.uuid
         )
         assert retrieved.uuid == metrics.uuid
+
+    def test_get_current_metrics_compressed(self):
+        self.model_dao.insert(get_sample_model())
+        current = get_sample_current_dataset()
+        self.dataset_dao.insert_current_dataset(current)
+        metrics = get_sample_current_metrics(current_uuid=current.uuid)
+        model_quality = metrics.model_quality
+        metrics.model_quality = None
+        metrics.model_quality_compressed = model_quality
+        self.metrics_dao.insert_current_dataset_metrics(metrics)
+        retrieved = self.metrics_dao.get_current_metrics_by_model_uuid(
+            model_uuid=current.model_uuid, current_uuid=current.uuid
+        )
+        assert retrieved.model_quality == model_quality
+        assert retrieved.data_quality == metrics.data_quality
@@ -103,3 +103,23 @@ class ReferenceDatasetMetricsDAOTest(DatabaseIntegration):
             reference_uuid=reference_upload.uuid
         )
         assert retrieved.statistics == statistics
+
+    def test_update_reference_model_quality_compressed(self):
+        self.model_dao.insert(get_sample_model())
+        reference_upload = get_sample_reference_dataset()
+        self.f_reference_dataset_dao.insert_reference_dataset(reference_upload)
+        reference_metrics = get_sample_reference_metrics(
+            reference_uuid=reference_upload.uuid
+        )
+        reference_metrics.model_quality_compressed = reference_metrics.model_quality
+        reference_metrics.model_quality = None
+        self.metrics_dao.insert_reference_metrics(reference_metrics)
+        model_quality = {'accuracy': 0.1}
+        self.metrics_dao.update_reference_model_quality(
+            reference_metrics.reference_uuid, model_quality
+        )
+        retrieved = self.metrics_dao.get_reference_metrics_by_reference_uuid(
+            reference_uuid=reference_upload.uuid
+        )
+        assert retrieved.model_quality == model_quality
+        assert retrieved.model_quality_compressed is None
@@ -19,7 +19,7 @@ from app.models.metrics.data_quality_dto import DataQualityDTO
 from app.models.metrics.drift_dto import DriftDTO
 from app.models.metrics.model_quality_dto import ModelQualityDTO
 from app.models.metrics.statistics_dto import StatisticsDTO
-from app.models.model_dto import ModelType
+from app.models.model_dto import Granularity, ModelType
 from app.routes.metrics_route import MetricsRoute
 from app.services.metrics_service import MetricsService
 from tests.commons import db_mock
@@ -176,7 +176,32 @@ class MetricsRouteTest(unittest.TestCase):
         assert res.status_code == 200
         assert jsonable_encoder(model_quality) == res.json()
         self.metrics_service.get_current_model_quality_by_model_by_uuid.assert_called_once_with(
-            model_uuid, current_uuid
+            model_uuid, current_uuid, granularity=None
+        )
+
+    def test_get_current_model_quality_by_model_by_uuid_and_granularity(self):
+        model_uuid = uuid.uuid4()
+        current_uuid = uuid.uuid4()
+        current_metrics = db_mock.get_sample_current_metrics(
+            model_quality=db_mock.binary_current_model_quality_by_granularity_dict
+        )
+        model_quality = ModelQualityDTO.from_dict(
+            dataset_type=DatasetType.CURRENT,
+            model_type=ModelType.BINARY,
+            job_status=JobStatus.SUCCEEDED,
+            model_quality_data=current_metrics.model_quality,
+        )
+        self.metrics_service.get_current_model_quality_by_model_by_uuid = MagicMock(
+            return_value=model_quality
+        )
+
+        res = self.client.get(
+            f'{self.prefix}/{model_uuid}/current/{current_uuid}/model-quality?granularity=MONTH'
+        )
+        assert res.status_code == 200
+        assert jsonable_encoder(model_quality) == res.json()
+        self.metrics_service.get_current_model_quality_by_model_by_uuid.assert_called_once_with(
+            model_uuid, current_uuid, granularity=Granularity.MONTH
         )
 
     def test_get_current_data_quality_by_model_by_uuid(self):
@@ -10,6 +10,7 @@ from starlette.testclient import TestClient
 
 from app.models.dataset_dto import (
     CurrentDatasetDTO,
+    CurrentDatasetsCountDTO,
     FileReference,
     OrderType,
     ReferenceDatasetDTO,
@@ -236,3 +237,20 @@ class UploadDatasetRouteTest(unittest.TestCase):
         self.file_service.get_all_current_datasets_by_model_uuid.assert_called_once_with(
             test_model_uuid,
         )
+
+    def test_count_current_datasets_by_model_uuid(self):
+        test_model_uuid = uuid.uuid4()
+        count = CurrentDatasetsCountDTO(
+            model_uuid=test_model_uuid, current_datasets=5, skipped_jobs=2
+        )
+        self.file_service.count_current_datasets_by_model_uuid = MagicMock(
+            return_value=count
+        )
+
+        res = self.client.get(f'{self.prefix}/{test_model_uuid}/current/count')
+        assert res.status_code == 200
+        assert jsonable_encoder(count) == res.json()
+        assert res.json()['skippedJobs'] == 2
+        self.file_service.count_current_datasets_by_model_uuid.assert_called_once_with(
+            test_model_uuid,
+        )
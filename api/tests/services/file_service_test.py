@@ -1,6 +1,6 @@
 import datetime
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 import uuid
 from uuid import uuid4
 
@@ -8,14 +8,27 @@ from fastapi import HTTPException
 from fastapi_pagination import Page, Params
 import pytest
 
+from app.core.config.config import get_config
 from app.db.dao.current_dataset_dao import CurrentDatasetDAO
 from app.db.dao.reference_dataset_dao import ReferenceDatasetDAO
 from app.db.tables.current_dataset_table import CurrentDataset
 from app.db.tables.reference_dataset_table import ReferenceDataset
-from app.models.dataset_dto import CurrentDatasetDTO, FileReference, ReferenceDatasetDTO
+from app.models.dataset_dto import (
+    CurrentDatasetDTO,
+    CurrentDatasetsCountDTO,
+    FileReference,
+    PartitionFilter,
+    ReferenceDatasetDTO,
+)
 from app.models.exceptions import InvalidFileException, ModelNotFoundError
 from app.models.job_status import JobStatus
 from app.models.model_dto import ModelOut
+from app.models.spark_profile import (
+    LARGE_PROFILE,
+    MEDIUM_PROFILE,
+    SMALL_PROFILE,
+    SparkProfile,
+)
 from app.services.file_service import FileService
 from app.services.model_service import ModelService
 from tests.commons import csv_file_mock as csv, db_mock
@@ -155,15 +168,24 @@ class FileServiceTest(unittest.TestCase):
             return_value=ModelOut.from_model(model)
         )
 
-        self.s3_client.head_object = MagicMock()
+        self.s3_client.head_object = MagicMock(
+            return_value={'ContentLength': 2 * 1024 * 1024 * 1024}
+        )
         self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(return_value=None)
         self.rd_dao.insert_reference_dataset = MagicMock(return_value=inserted_file)
+        self.spark_k8s_client.submit_app = MagicMock()
 
         result = self.files_service.bind_reference_file(model_uuid, file)
 
         self.rd_dao.get_reference_dataset_by_model_uuid.assert_called_once()
         self.rd_dao.insert_reference_dataset.assert_called_once()
         self.s3_client.head_object.assert_called_once()
+        submit_args = self.spark_k8s_client.submit_app.call_args.kwargs
+        assert submit_args['spark_conf']['spark.sql.shuffle.partitions'] == '200'
+        assert submit_args['executor_resources'] == LARGE_PROFILE.executor_resources()
+        assert submit_args['executor_instances'] == (
+            LARGE_PROFILE.executor_instances_conf()
+        )
         assert result == ReferenceDatasetDTO.from_reference_dataset(inserted_file)
 
     def test_bind_reference_file_already_exists(self):
@@ -214,6 +236,7 @@ class FileServiceTest(unittest.TestCase):
             date=datetime.datetime.now(tz=datetime.UTC),
             correlation_id_column=None,
             status=JobStatus.IMPORTING,
+            cloned_from=None,
         )
         reference_file = get_sample_reference_dataset(model_uuid=model_uuid)
 
@@ -224,6 +247,7 @@ class FileServiceTest(unittest.TestCase):
             return_value=reference_file
         )
         self.s3_client.upload_fileobj = MagicMock()
+        self.cd_dao.get_current_dataset_by_content_hash = MagicMock(return_value=None)
         self.cd_dao.insert_current_dataset = MagicMock(return_value=inserted_file)
         self.spark_k8s_client.submit_app = MagicMock()
 
@@ -239,6 +263,340 @@ class FileServiceTest(unittest.TestCase):
         self.spark_k8s_client.submit_app.assert_called_once()
         assert result == CurrentDatasetDTO.from_current_dataset(inserted_file)
 
+    def test_upload_current_file_cloned(self):
+        file = csv.get_current_sample_csv_file()
+        model = db_mock.get_sample_model(
+            features=[{'name': 'num1', 'type': 'int', 'fieldType': 'numerical'}],
+            outputs={
+                'prediction': {
+                    'name': 'prediction',
+                    'type': 'int',
+                    'fieldType': 'numerical',
+                },
+                'output': [{'name': 'num2', 'type': 'int', 'fieldType': 'numerical'}],
+            },
+            target={'name': 'target', 'type': 'int', 'fieldType': 'numerical'},
+        )
+        source_file = db_mock.get_sample_current_dataset(
+            status=JobStatus.SUCCEEDED.value
+        )
+        cloned_file = CurrentDataset(
+            uuid=uuid4(),
+            model_uuid=model_uuid,
+            path=source_file.path,
+            date=datetime.datetime.now(tz=datetime.UTC),
+            correlation_id_column=None,
+            status=JobStatus.SUCCEEDED,
+            cloned_from=source_file.uuid,
+        )
+
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(model)
+        )
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=get_sample_reference_dataset(model_uuid=model_uuid)
+        )
+        self.s3_client.upload_fileobj = MagicMock()
+        self.cd_dao.get_current_dataset_by_content_hash = MagicMock(
+            return_value=source_file
+        )
+        self.cd_dao.insert_cloned_current_dataset = MagicMock(return_value=cloned_file)
+        self.spark_k8s_client.submit_app = MagicMock()
+
+        result = self.files_service.upload_current_file(model.uuid, file)
+
+        self.cd_dao.get_current_dataset_by_content_hash.assert_called_once_with(
+            model.uuid, FileService.content_hash(file)
+        )
+        inserted = self.cd_dao.insert_cloned_current_dataset.call_args.args[0]
+        assert inserted.cloned_from == source_file.uuid
+        assert inserted.path == source_file.path
+        self.s3_client.upload_fileobj.assert_not_called()
+        self.spark_k8s_client.submit_app.assert_not_called()
+        assert result.cloned_from == source_file.uuid
+
+    @patch.object(get_config().spark_config, 'spark_combined_jobs', True)
+    def test_upload_current_file_awaiting_reference(self):
+        file = csv.get_current_sample_csv_file()
+        model = db_mock.get_sample_model(
+            features=[{'name': 'num1', 'type': 'int', 'fieldType': 'numerical'}],
+            outputs={
+                'prediction': {
+                    'name': 'prediction',
+                    'type': 'int',
+                    'fieldType': 'numerical',
+                },
+                'output': [{'name': 'num2', 'type': 'int', 'fieldType': 'numerical'}],
+            },
+            target={'name': 'target', 'type': 'int', 'fieldType': 'numerical'},
+        )
+        reference_file = get_sample_reference_dataset(model_uuid=model_uuid)
+        inserted_file = db_mock.get_sample_current_dataset()
+
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(model)
+        )
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=reference_file
+        )
+        self.s3_client.upload_fileobj = MagicMock()
+        self.cd_dao.get_current_dataset_by_content_hash = MagicMock(return_value=None)
+        self.cd_dao.insert_current_dataset_awaiting_reference = MagicMock(
+            return_value=inserted_file
+        )
+        self.cd_dao.insert_current_dataset = MagicMock()
+        self.spark_k8s_client.submit_app = MagicMock()
+
+        result = self.files_service.upload_current_file(model.uuid, file)
+
+        awaiting, reference_uuid = (
+            self.cd_dao.insert_current_dataset_awaiting_reference.call_args.args
+        )
+        assert reference_uuid == reference_file.uuid
+        assert awaiting.model_uuid == model.uuid
+        assert awaiting.status == JobStatus.IMPORTING
+        assert result == CurrentDatasetDTO.from_current_dataset(inserted_file)
+        self.s3_client.upload_fileobj.assert_called_once()
+        self.cd_dao.insert_current_dataset.assert_not_called()
+        self.spark_k8s_client.submit_app.assert_not_called()
+
+    @patch.object(get_config().spark_config, 'spark_combined_jobs', True)
+    def test_upload_current_file_completed_reference(self):
+        file = csv.get_current_sample_csv_file()
+        model = db_mock.get_sample_model(
+            features=[{'name': 'num1', 'type': 'int', 'fieldType': 'numerical'}],
+            outputs={
+                'prediction': {
+                    'name': 'prediction',
+                    'type': 'int',
+                    'fieldType': 'numerical',
+                },
+                'output': [{'name': 'num2', 'type': 'int', 'fieldType': 'numerical'}],
+            },
+            target={'name': 'target', 'type': 'int', 'fieldType': 'numerical'},
+        )
+        inserted_file = db_mock.get_sample_current_dataset()
+
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(model)
+        )
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=get_sample_reference_dataset(
+                model_uuid=model_uuid, status=JobStatus.SUCCEEDED.value
+            )
+        )
+        self.s3_client.upload_fileobj = MagicMock()
+        self.cd_dao.get_current_dataset_by_content_hash = MagicMock(return_value=None)
+        self.cd_dao.insert_current_dataset_awaiting_reference = MagicMock()
+        self.cd_dao.insert_current_dataset = MagicMock(return_value=inserted_file)
+        self.spark_k8s_client.submit_app = MagicMock()
+
+        result = self.files_service.upload_current_file(model.uuid, file)
+
+        self.cd_dao.insert_current_dataset_awaiting_reference.assert_not_called()
+        self.cd_dao.insert_current_dataset.assert_called_once()
+        self.spark_k8s_client.submit_app.assert_called_once()
+        assert result == CurrentDatasetDTO.from_current_dataset(inserted_file)
+
+    @patch.object(get_config().spark_config, 'spark_combined_jobs', True)
+    def test_upload_reference_file_combined_jobs(self):
+        file = csv.get_correct_sample_csv_file()
+        model = db_mock.get_sample_model()
+        inserted_file = get_sample_reference_dataset(model_uuid=model.uuid)
+
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(model)
+        )
+        self.s3_client.upload_fileobj = MagicMock()
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(return_value=None)
+        self.rd_dao.insert_reference_dataset = MagicMock(return_value=inserted_file)
+        self.spark_k8s_client.submit_app = MagicMock()
+
+        self.files_service.upload_reference_file(model.uuid, file)
+
+        app_arguments = self.spark_k8s_client.submit_app.call_args.kwargs[
+            'app_arguments'
+        ]
+        assert app_arguments[-2:] == [
+            'reference_dataset_metrics',
+            'current_dataset_metrics',
+        ]
+
+    def test_submit_stranded_awaiting_currents(self):
+        model = db_mock.get_sample_model()
+        stranded_file = db_mock.get_sample_current_dataset(path='s3://bucket/c.csv')
+        failed_file = db_mock.get_sample_current_dataset(uuid=uuid4())
+        reference_file = get_sample_reference_dataset(
+            model_uuid=model_uuid, status=JobStatus.SUCCEEDED.value
+        )
+
+        self.cd_dao.claim_stranded_awaiting_currents = MagicMock(
+            return_value=[stranded_file, failed_file]
+        )
+        self.cd_dao.update_current_dataset_status = MagicMock()
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(model)
+        )
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=reference_file
+        )
+        self.spark_k8s_client.submit_app = MagicMock(
+            side_effect=[None, Exception('submission failed')]
+        )
+
+        result = self.files_service.submit_stranded_awaiting_currents()
+
+        assert result == [CurrentDatasetDTO.from_current_dataset(stranded_file)]
+        app_arguments = self.spark_k8s_client.submit_app.call_args_list[0].kwargs[
+            'app_arguments'
+        ]
+        assert app_arguments[1:] == [
+            's3a://bucket/c.csv',
+            str(stranded_file.uuid),
+            reference_file.path,
+            'current_dataset_metrics',
+        ]
+        self.cd_dao.update_current_dataset_status.assert_called_once_with(
+            failed_file.uuid, JobStatus.ERROR
+        )
+
+    def test_bind_current_file_partitioned(self):
+        file_url = 's3://test-bucket/current/date=*/*.csv'
+        file = FileReference(
+            file_url=file_url,
+            partition_filter=PartitionFilter(column='date', start='2024-06-16'),
+        )
+        model = db_mock.get_sample_model()
+        inserted_file = CurrentDataset(
+            uuid=uuid4(),
+            model_uuid=model_uuid,
+            path=file_url,
+            date=datetime.datetime.now(tz=datetime.UTC),
+            correlation_id_column=None,
+            status=JobStatus.IMPORTING,
+            cloned_from=None,
+        )
+
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(model)
+        )
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=get_sample_reference_dataset(model_uuid=model_uuid)
+        )
+        self.s3_client.head_object = MagicMock()
+        self.s3_client.get_paginator = MagicMock()
+        self.s3_client.get_paginator.return_value.paginate = MagicMock(
+            return_value=[
+                {
+                    'Contents': [
+                        {'Key': 'current/date=2024-06-15/part-0.csv', 'Size': 1024},
+                        {'Key': 'current/date=2024-06-16/part-0.csv', 'Size': 1024},
+                        {'Key': 'current/date=2024-06-16/_SUCCESS', 'Size': 0},
+                    ]
+                },
+                {'Contents': [{'Key': 'current/other.csv', 'Size': 1024}]},
+            ]
+        )
+        self.cd_dao.get_current_dataset_by_content_hash = MagicMock()
+        self.cd_dao.insert_current_dataset = MagicMock(return_value=inserted_file)
+        self.spark_k8s_client.submit_app = MagicMock()
+
+        result = self.files_service.bind_current_file(model_uuid, file)
+
+        self.s3_client.head_object.assert_not_called()
+        self.s3_client.get_paginator.return_value.paginate.assert_called_once_with(
+            Bucket='test-bucket', Prefix='current/date='
+        )
+        self.cd_dao.get_current_dataset_by_content_hash.assert_not_called()
+        submit_args = self.spark_k8s_client.submit_app.call_args.kwargs
+        assert (
+            submit_args['app_arguments'][1] == 's3a://test-bucket/current/date=*/*.csv'
+        )
+        assert PartitionFilter.model_validate_json(
+            submit_args['app_arguments'][5]
+        ) == PartitionFilter(column='date', start='2024-06-16')
+        assert submit_args['spark_conf'] == SMALL_PROFILE.spark_conf()
+        assert result == CurrentDatasetDTO.from_current_dataset(inserted_file)
+
+    def test_glob_matches(self):
+        key = 'events/date=2024-06-16/part-0.csv'
+        assert FileService.glob_matches(key, 'events/date=2024-06-*/')
+        assert FileService.glob_matches(key, 'events/date=2024-06-*')
+        assert FileService.glob_matches(key, 'events/date=2024-06-1?/*.csv')
+        assert FileService.glob_matches(key, 'events/date=2024-06-1[5-6]/*.csv')
+        assert FileService.glob_matches(key, 'events/date={2024-06-15,2024-06-16}/')
+        assert not FileService.glob_matches(key, 'events/date=2024-06-1[^6]/')
+        assert not FileService.glob_matches(key, 'events/date={2024-06-15}/')
+        # * doesn't match /, nested objects are read only below a matched directory
+        assert not FileService.glob_matches(key, 'events/*.csv')
+        assert not FileService.glob_matches(key, 'events/date=2024-06-16/part-0.csv/')
+        assert FileService.glob_matches(key, 'events/date=2024-06-16/part-0.csv')
+
+    def test_is_multi_file(self):
+        assert FileService.is_multi_file('s3://b/events/')
+        assert FileService.is_multi_file('s3://b/events/date={a,b}/part-0.csv')
+        assert not FileService.is_multi_file('s3://b/events/part-0.csv')
+
+    def test_bind_current_file_directory_glob(self):
+        file_url = 's3://test-bucket/current/date={2024-06-15,2024-06-16}/'
+        model = db_mock.get_sample_model()
+        inserted_file = db_mock.get_sample_current_dataset(path=file_url)
+
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(model)
+        )
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=get_sample_reference_dataset(
+                model_uuid=model_uuid, status=JobStatus.SUCCEEDED.value
+            )
+        )
+        self.s3_client.head_object = MagicMock()
+        self.s3_client.get_paginator = MagicMock()
+        self.s3_client.get_paginator.return_value.paginate = MagicMock(
+            return_value=[
+                {
+                    'Contents': [
+                        {'Key': 'current/date=2024-06-15/part-0.csv', 'Size': 1},
+                        {'Key': 'current/date=2024-06-16/part-0.csv', 'Size': 2},
+                        {'Key': 'current/date=2024-06-17/part-0.csv', 'Size': 4},
+                    ]
+                }
+            ]
+        )
+        self.cd_dao.insert_current_dataset = MagicMock(return_value=inserted_file)
+        self.spark_k8s_client.submit_app = MagicMock()
+
+        with patch.object(
+            SparkProfile, 'from_input', wraps=SparkProfile.from_input
+        ) as from_input:
+            result = self.files_service.bind_current_file(
+                model_uuid, FileReference(file_url=file_url)
+            )
+
+        self.s3_client.head_object.assert_not_called()
+        self.s3_client.get_paginator.return_value.paginate.assert_called_once_with(
+            Bucket='test-bucket', Prefix='current/date='
+        )
+        assert from_input.call_args.args[0] == 3
+        assert result == CurrentDatasetDTO.from_current_dataset(inserted_file)
+
+    def test_bind_current_file_no_match(self):
+        file = FileReference(file_url='s3://test-bucket/current/')
+        self.model_svc.get_model_by_uuid = MagicMock(
+            return_value=ModelOut.from_model(db_mock.get_sample_model())
+        )
+        self.rd_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=get_sample_reference_dataset(model_uuid=model_uuid)
+        )
+        self.s3_client.get_paginator = MagicMock()
+        self.s3_client.get_paginator.return_value.paginate = MagicMock(
+            return_value=[{'KeyCount': 0}]
+        )
+
+        with pytest.raises(HTTPException) as e:
+            self.files_service.bind_current_file(model_uuid, file)
+        assert e.value.status_code == 404
+
     def test_upload_current_file_reference_file_not_found(self):
         file = csv.get_correct_sample_csv_file()
         correlation_id_column = 'correlation_id'
@@ -357,5 +715,33 @@ class FileServiceTest(unittest.TestCase):
         assert result[1].model_uuid == model_uuid
         assert result[2].model_uuid == model_uuid
 
+    def test_count_current_datasets_by_model_uuid(self):
+        self.cd_dao.count_current_datasets_by_model_uuid = MagicMock(
+            return_value=(5, 2)
+        )
+
+        result = self.files_service.count_current_datasets_by_model_uuid(model_uuid)
+
+        self.cd_dao.count_current_datasets_by_model_uuid.assert_called_once_with(
+            model_uuid
+        )
+        assert result == CurrentDatasetsCountDTO(
+            model_uuid=model_uuid, current_datasets=5, skipped_jobs=2
+        )
+
+    def test_spark_profile_from_input(self):
+        mega_bytes = 1024 * 1024
+        assert SparkProfile.from_input(None, 10) == MEDIUM_PROFILE
+        assert SparkProfile.from_input(mega_bytes, 10) == SMALL_PROFILE
+        assert SparkProfile.from_input(100 * mega_bytes, 10) == MEDIUM_PROFILE
+        # wide models are sized as larger files
+        assert SparkProfile.from_input(mega_bytes, 2000) == SMALL_PROFILE
+        assert SparkProfile.from_input(10 * mega_bytes, 2000) == MEDIUM_PROFILE
+        assert SparkProfile.from_input(100 * mega_bytes, 2000) == LARGE_PROFILE
+        large = SparkProfile.from_input(100 * 1024 * mega_bytes, 10)
+        assert large.type == LARGE_PROFILE.type
+        assert large.shuffle_partitions == 800
+        assert large.spark_conf()['spark.sql.shuffle.partitions'] == '800'
+
 
 model_uuid = db_mock.MODEL_UUID
@@ -15,7 +15,7 @@ from app.models.metrics.data_quality_dto import DataQualityDTO
 from app.models.metrics.drift_dto import DriftDTO
 from app.models.metrics.model_quality_dto import ModelQualityDTO
 from app.models.metrics.statistics_dto import StatisticsDTO
-from app.models.model_dto import ModelType
+from app.models.model_dto import Granularity, ModelType
 from app.services.metrics_service import MetricsService
 from app.services.model_service import ModelService
 from tests.commons import db_mock
@@ -666,6 +666,175 @@ class MetricsServiceTest(unittest.TestCase):
             model_quality_data=current_metrics.model_quality,
         )
 
+    def test_get_current_binary_class_model_quality_by_granularity(self):
+        status = JobStatus.SUCCEEDED
+        current_dataset = db_mock.get_sample_current_dataset(status=status.value)
+        current_metrics = db_mock.get_sample_current_metrics(
+            model_quality=db_mock.binary_current_model_quality_by_granularity_dict
+        )
+        model = db_mock.get_sample_model()
+        self.model_service.get_model_by_uuid = MagicMock(return_value=model)
+        self.current_dataset_dao.get_current_dataset_by_model_uuid = MagicMock(
+            return_value=current_dataset
+        )
+        self.current_metrics_dao.get_current_metrics_by_model_uuid = MagicMock(
+            return_value=current_metrics
+        )
+        res = self.metrics_service.get_current_model_quality_by_model_by_uuid(
+            model_uuid, current_dataset.uuid, granularity=Granularity.MONTH
+        )
+
+        assert res == ModelQualityDTO.from_dict(
+            dataset_type=DatasetType.CURRENT,
+            model_type=model.model_type,
+            job_status=current_dataset.status,
+            model_quality_data={
+                **current_metrics.model_quality,
+                'grouped_metrics': {
+                    **db_mock.monthly_grouped_metrics_dict,
+                    'score_bins': 1000,
+                },
+            },
+        )
+        # the areas under the curves rolled up are approximate
+        assert res.model_quality.grouped_metrics.score_bins == 1000
+
+    def test_get_current_multiclass_model_quality_by_granularity(self):
+        status = JobStatus.SUCCEEDED
+        current_dataset = db_mock.get_sample_current_dataset(status=status.value)
+        current_metrics = db_mock.get_sample_current_metrics(
+            model_quality=db_mock.multiclass_model_quality_by_granularity_dict
+        )
+        model = db_mock.get_sample_model(model_type=ModelType.MULTI_CLASS)
+        self.model_service.get_model_by_uuid = MagicMock(return_value=model)
+        self.current_dataset_dao.get_current_dataset_by_model_uuid = MagicMock(
+            return_value=current_dataset
+        )
+        self.current_metrics_dao.get_current_metrics_by_model_uuid = MagicMock(
+            return_value=current_metrics
+        )
+        res = self.metrics_service.get_current_model_quality_by_model_by_uuid(
+            model_uuid, current_dataset.uuid, granularity=Granularity.MONTH
+        )
+
+        assert res == ModelQualityDTO.from_dict(
+            dataset_type=DatasetType.CURRENT,
+            model_type=model.model_type,
+            job_status=current_dataset.status,
+            model_quality_data={
+                **current_metrics.model_quality,
+                'class_metrics': [
+                    {
+                        **class_metrics,
+                        'grouped_metrics': db_mock.monthly_grouped_metrics_dict,
+                    }
+                    for class_metrics in current_metrics.model_quality['class_metrics']
+                ],
+            },
+        )
+
+    def test_get_current_model_quality_by_granularity_bad_request(self):
+        status = JobStatus.SUCCEEDED
+        current_dataset = db_mock.get_sample_current_dataset(status=status.value)
+        current_metrics = db_mock.get_sample_current_metrics(
+            model_quality=db_mock.binary_current_model_quality_by_granularity_dict
+        )
+        model = db_mock.get_sample_model()
+        self.model_service.get_model_by_uuid = MagicMock(return_value=model)
+        self.current_dataset_dao.get_current_dataset_by_model_uuid = MagicMock(
+            return_value=current_dataset
+        )
+        self.current_metrics_dao.get_current_metrics_by_model_uuid = MagicMock(
+            return_value=current_metrics
+        )
+        pytest.raises(
+            MetricsBadRequestError,
+            self.metrics_service.get_current_model_quality_by_model_by_uuid,
+            model_uuid,
+            current_dataset.uuid,
+            granularity=Granularity.HOUR,
+        )
+
+    def test_get_sampled_current_metrics(self):
+        status = JobStatus.SUCCEEDED
+        current_dataset = db_mock.get_sample_current_dataset(status=status.value)
+        current_metrics = db_mock.get_sample_current_metrics(
+            sampling=db_mock.sampling_dict
+        )
+        model = db_mock.get_sample_model()
+        self.model_service.get_model_by_uuid = MagicMock(return_value=model)
+        self.current_dataset_dao.get_current_dataset_by_model_uuid = MagicMock(
+            return_value=current_dataset
+        )
+        self.current_metrics_dao.get_current_metrics_by_model_uuid = MagicMock(
+            return_value=current_metrics
+        )
+
+        model_quality = self.metrics_service.get_current_model_quality_by_model_by_uuid(
+            model_uuid, current_dataset.uuid
+        )
+        drift = self.metrics_service.get_current_drift(model_uuid, current_dataset.uuid)
+        statistics = self.metrics_service.get_current_statistics_by_model_by_uuid(
+            model_uuid, current_dataset.uuid
+        )
+
+        assert model_quality.approximate
+        assert model_quality.sampling.sample_size == 10012
+        assert model_quality.sampling.estimates['accuracy'] == 0.8973
+        assert model_quality.sampling.confidence_intervals['accuracy'].lower == 0.8912
+        assert drift.approximate
+        assert drift.sampling == model_quality.sampling
+        assert statistics.approximate
+
+        self.current_metrics_dao.get_current_metrics_by_model_uuid = MagicMock(
+            return_value=db_mock.get_sample_current_metrics()
+        )
+        drift = self.metrics_service.get_current_drift(model_uuid, current_dataset.uuid)
+        assert not drift.approximate
+        assert drift.sampling is None
+
+    def test_get_reference_metrics_warnings(self):
+        status = JobStatus.SUCCEEDED
+        reference_dataset = db_mock.get_sample_reference_dataset(status=status.value)
+        reference_metrics = db_mock.get_sample_reference_metrics(
+            warnings=db_mock.warnings_list
+        )
+        model = db_mock.get_sample_model()
+        self.model_service.get_model_by_uuid = MagicMock(return_value=model)
+        self.reference_dataset_dao.get_reference_dataset_by_model_uuid = MagicMock(
+            return_value=reference_dataset
+        )
+        self.reference_metrics_dao.get_reference_metrics_by_model_uuid = MagicMock(
+            return_value=reference_metrics
+        )
+
+        data_quality = self.metrics_service.get_reference_data_quality_by_model_by_uuid(
+            model_uuid
+        )
+        model_quality = (
+            self.metrics_service.get_reference_model_quality_by_model_by_uuid(
+                model_uuid
+            )
+        )
+
+        assert [warning.message for warning in data_quality.warnings] == [
+            db_mock.warnings_list[0]['message']
+        ]
+        assert [warning.section for warning in model_quality.warnings] == [
+            'MODEL_QUALITY'
+        ]
+        assert model_quality.model_dump(by_alias=True)['warnings'] == [
+            db_mock.warnings_list[1]
+        ]
+
+        self.reference_metrics_dao.get_reference_metrics_by_model_uuid = MagicMock(
+            return_value=db_mock.get_sample_reference_metrics()
+        )
+        data_quality = self.metrics_service.get_reference_data_quality_by_model_by_uuid(
+            model_uuid
+        )
+        assert data_quality.warnings == []
+
 
 model_uuid = db_mock.MODEL_UUID
 current_uuid = db_mock.CURRENT_UUID
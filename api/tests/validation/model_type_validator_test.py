@@ -108,3 +108,11 @@ def test_prediction_proba_for_regression():
     assert 'prediction_proba must be None for a ModelType.REGRESSION' in str(
         excinfo.value
     )
+
+
+def test_category_top_k_positive():
+    """Tests that category_top_k must be positive."""
+    with pytest.raises(ValidationError) as excinfo:
+        model_data = get_model_sample_wrong([], ModelType.BINARY)
+        ModelIn.model_validate(ModelIn(**model_data, category_top_k=0))
+    assert 'greater than 0' in str(excinfo.value)
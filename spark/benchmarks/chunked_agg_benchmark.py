@@ -0,0 +1,58 @@
+"""
+Time of the global numerical metrics of a synthetic dataset of 2,000 double columns read from parquet, evaluated
+by chunked_agg with chunks of different sizes, to check MAX_AGGREGATIONS_PER_CHUNK. A chunk size of at least the
+number of aggregations is a single agg(), that on thousands of columns can take longer than the driver survives.
+
+    PYTHONPATH=jobs poetry run python benchmarks/chunked_agg_benchmark.py [n_columns] [n_rows] [chunk_sizes]
+
+chunk_sizes is a comma separated list, 128,256,512,1024 by default.
+"""
+
+import sys
+import tempfile
+import time
+from typing import List
+
+from pyspark.sql import SparkSession
+import pyspark.sql.functions as F
+
+from metrics.data_quality_calculator import DataQualityCalculator
+from utils.spark import aggregation_chunks, chunked_agg
+
+
+def main(n_columns: int, n_rows: int, chunk_sizes: List[int]):
+    spark_session = SparkSession.builder.appName("chunked_agg_benchmark").getOrCreate()
+    columns = [f"feature_{i}" for i in range(n_columns)]
+
+    with tempfile.TemporaryDirectory() as path:
+        spark_session.range(n_rows).select(
+            *[F.rand(seed=i).alias(column) for i, column in enumerate(columns)]
+        ).write.parquet(f"{path}/dataset")
+        dataframe = spark_session.read.parquet(f"{path}/dataset")
+        aggregations = DataQualityCalculator.numerical_aggregations(
+            columns, n_rows, relative_error=0.01
+        )
+
+        for chunk_size in chunk_sizes:
+            n_chunks = len(aggregation_chunks(aggregations, chunk_size))
+            start = time.perf_counter()
+            chunked_agg(dataframe, aggregations, chunk_size)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{n_columns} columns, {len(aggregations)} aggregations, chunk size {chunk_size:>6} "
+                f"({n_chunks:>3} chunks) {elapsed:9.1f}s"
+            )
+
+    spark_session.stop()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+        (
+            [int(size) for size in sys.argv[3].split(",")]
+            if len(sys.argv) > 3
+            else [128, 256, 512, 1024]
+        ),
+    )
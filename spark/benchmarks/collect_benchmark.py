@@ -0,0 +1,62 @@
+"""
+Throughput of collecting a column of 1M values to the driver: the Row round-trip of rdd.flatMap(...).collect()
+against collect_column, with and without Arrow.
+
+    PYTHONPATH=jobs poetry run python benchmarks/collect_benchmark.py [n_values] [repeats]
+"""
+
+import sys
+import time
+
+from pyspark.sql import SparkSession
+import pyspark.sql.functions as F
+
+from utils.spark import collect_column
+
+
+def best_time(collect, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        collect()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(n_values: int, repeats: int):
+    spark_session = (
+        SparkSession.builder.appName("collect_benchmark")
+        .config("spark.sql.execution.arrow.pyspark.fallback.enabled", "false")
+        .getOrCreate()
+    )
+    dataframe = (
+        spark_session.range(n_values).select(F.rand(seed=42).alias("value")).cache()
+    )
+    dataframe.count()
+
+    def with_arrow(enabled: bool):
+        def collect():
+            spark_session.conf.set(
+                "spark.sql.execution.arrow.pyspark.enabled", str(enabled).lower()
+            )
+            return collect_column(dataframe, "value")
+
+        return collect
+
+    candidates = {
+        "rdd.flatMap().collect()": lambda: dataframe.rdd.flatMap(lambda x: x).collect(),
+        "collect_column without Arrow": with_arrow(False),
+        "collect_column with Arrow": with_arrow(True),
+    }
+    for name, collect in candidates.items():
+        elapsed = best_time(collect, repeats)
+        print(f"{name:<32} {elapsed:8.3f}s {n_values / elapsed / 1e6:8.2f}M values/s")
+
+    spark_session.stop()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+    )
@@ -0,0 +1,85 @@
+"""
+Shuffle write and time of duplicate_rows in its EXACT, HASH and SKETCH modes, on a synthetic dataset of string
+columns with a quarter of duplicated rows. The shuffle write of the stages of every mode is read from the REST API
+of the Spark UI.
+
+    PYTHONPATH=jobs poetry run python benchmarks/duplicate_rows_benchmark.py [n_rows] [n_columns]
+"""
+
+import json
+import sys
+import time
+from urllib.request import urlopen
+
+from pyspark.sql import SparkSession
+import pyspark.sql.functions as F
+
+from metrics.statistics import duplicate_rows
+from utils.job_config import DuplicateRowsMode
+
+
+def shuffle_write_bytes(spark_session: SparkSession, job_group: str) -> int:
+    """Bytes written to the shuffle by the stages of the jobs of job_group"""
+    spark_context = spark_session.sparkContext
+    tracker = spark_context.statusTracker()
+    stage_ids = {
+        stage_id
+        for job_id in tracker.getJobIdsForGroup(job_group)
+        for stage_id in tracker.getJobInfo(job_id).stageIds
+    }
+    api = f"{spark_context.uiWebUrl}/api/v1/applications/{spark_context.applicationId}/stages"
+    return sum(
+        attempt["shuffleWriteBytes"]
+        for stage_id in stage_ids
+        for attempt in json.load(urlopen(f"{api}/{stage_id}"))
+    )
+
+
+def main(n_rows: int, n_columns: int):
+    spark_session = SparkSession.builder.appName(
+        "duplicate_rows_benchmark"
+    ).getOrCreate()
+    spark_context = spark_session.sparkContext
+    columns = [f"column_{i}" for i in range(n_columns)]
+    n_distinct = n_rows * 3 // 4
+
+    dataframe = (
+        # several partitions, as read from many files, or a single one would be aggregated without a shuffle
+        spark_session.range(0, n_rows, numPartitions=8)
+        .select(
+            *[
+                F.sha2(
+                    F.concat_ws(
+                        "-", F.lit(i), (F.col("id") % n_distinct).cast("string")
+                    ),
+                    256,
+                ).alias(column)
+                for i, column in enumerate(columns)
+            ]
+        )
+        .cache()
+    )
+    dataframe.count()
+
+    for mode in DuplicateRowsMode:
+        spark_context.setJobGroup(mode.value, f"duplicate rows {mode.value}")
+        start = time.perf_counter()
+        duplicates = duplicate_rows(dataframe, columns, n_rows, mode)
+        elapsed = time.perf_counter() - start
+        spark_context.setLocalProperty("spark.jobGroup.id", None)
+        # stage metrics reach the UI asynchronously after the job ends
+        time.sleep(2)
+        shuffle_mb = shuffle_write_bytes(spark_session, mode.value) / 1024 / 1024
+        print(
+            f"{mode.value:<7} {shuffle_mb:8.1f} MB {elapsed:7.1f}s {duplicates:>10} duplicates "
+            f"(exactly {n_rows - n_distinct})"
+        )
+
+    spark_session.stop()
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+    )
@@ -1,91 +1,131 @@
 import logging
 import sys
 import os
-import uuid
+from functools import partial
+from typing import Callable, Dict, Optional, Sequence, Tuple
 
 import orjson
-from pyspark.sql.types import StructType, StructField, StringType
 
 from metrics.statistics import calculate_statistics_current
 from models.current_dataset import CurrentDataset
 from models.reference_dataset import ReferenceDataset
+from models.sampling import SampleDesign
 
 from utils.current_binary import CurrentMetricsService
 from utils.current_multiclass import CurrentMetricsMulticlassService
 from utils.current_regression import CurrentMetricsRegressionService
-from utils.models import JobStatus, ModelOut, ModelType
-from utils.db import update_job_status, write_to_db
+from utils.models import JobStatus, ModelOut, ModelType, PartitionFilter
+from utils.db import (
+    compress_sections,
+    load_checkpoint_warnings,
+    load_checkpoints,
+    load_reference_data_quality,
+    metrics_uuid,
+    save_checkpoint,
+    update_job_status,
+    write_metrics,
+)
+from utils.job_config import JobConfig
+from utils.misc import log_cast_failures, log_time_partitions
+from utils.sampling import sampling, stratified_sample
+from utils.scheduler import run_in_pools, with_checkpoints
+from utils.spark import read_csv_dataset
 
 from pyspark.sql import SparkSession
 
 
-def compute_metrics(spark_session, current_dataset, reference_dataset, model):
-    complete_record = {}
+def compute_metrics(
+    spark_session,
+    current_dataset,
+    reference_dataset,
+    model,
+    job_config: Optional[JobConfig] = None,
+    completed_stages: Optional[Dict[str, str]] = None,
+    save_stage: Optional[Callable[[str, str, Optional[str]], None]] = None,
+    completed_warnings: Sequence[str] = (),
+):
+    job_config = job_config or JobConfig()
     match model.model_type:
         case ModelType.BINARY:
             metrics_service = CurrentMetricsService(
                 spark_session=spark_session,
                 current=current_dataset,
                 reference=reference_dataset,
+                job_config=job_config,
             )
-            statistics = calculate_statistics_current(current_dataset)
-            data_quality = metrics_service.calculate_data_quality()
-            model_quality = (
-                metrics_service.calculate_model_quality_with_group_by_timestamp()
-            )
-            drift = metrics_service.calculate_drift()
-            complete_record["MODEL_QUALITY"] = orjson.dumps(model_quality).decode(
-                "utf-8"
-            )
-            complete_record["STATISTICS"] = statistics.model_dump_json(
-                serialize_as_any=True
+            calculate_data_quality = metrics_service.calculate_data_quality
+            calculate_model_quality = (
+                metrics_service.calculate_model_quality_with_group_by_timestamp
             )
-            complete_record["DATA_QUALITY"] = data_quality.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["DRIFT"] = orjson.dumps(drift).decode("utf-8")
         case ModelType.MULTI_CLASS:
             metrics_service = CurrentMetricsMulticlassService(
                 spark_session=spark_session,
                 current=current_dataset,
                 reference=reference_dataset,
+                job_config=job_config,
             )
-            statistics = calculate_statistics_current(current_dataset)
-            data_quality = metrics_service.calculate_data_quality()
-            model_quality = metrics_service.calculate_model_quality()
-            drift = metrics_service.calculate_drift()
-            complete_record["STATISTICS"] = statistics.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["DATA_QUALITY"] = data_quality.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["MODEL_QUALITY"] = orjson.dumps(model_quality).decode(
-                "utf-8"
-            )
-            complete_record["DRIFT"] = orjson.dumps(drift).decode("utf-8")
+            calculate_data_quality = metrics_service.calculate_data_quality
+            calculate_model_quality = metrics_service.calculate_model_quality
         case ModelType.REGRESSION:
             metrics_service = CurrentMetricsRegressionService(
                 reference=reference_dataset,
                 current=current_dataset,
                 spark_session=spark_session,
+                job_config=job_config,
             )
-            statistics = calculate_statistics_current(current_dataset)
-            data_quality = metrics_service.calculate_data_quality(is_current=True)
-            model_quality = metrics_service.calculate_model_quality()
-            drift = metrics_service.calculate_drift()
-            complete_record["STATISTICS"] = statistics.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["DATA_QUALITY"] = data_quality.model_dump_json(
-                serialize_as_any=True
+            calculate_data_quality = partial(
+                metrics_service.calculate_data_quality, is_current=True
             )
-            complete_record["MODEL_QUALITY"] = orjson.dumps(model_quality).decode(
-                "utf-8"
-            )
-            complete_record["DRIFT"] = orjson.dumps(drift).decode("utf-8")
+            calculate_model_quality = metrics_service.calculate_model_quality
+
+    # the stages resumed from checkpoints don't hit their limits again, their warnings are saved with them
+    for warnings in completed_warnings:
+        metrics_service.guardrails.restore(warnings)
 
-    return complete_record
+    def save_stage_with_warnings(name: str, output: str):
+        save_stage(name, output, metrics_service.guardrails.warnings_json())
+
+    # Stages are independent of each other, when parallel_stages is enabled they are submitted
+    # together and every stage runs in its own FAIR scheduler pool
+    if job_config.parallel_stages:
+        max_parallel_stages = job_config.max_parallel_stages
+        max_parallel_features = job_config.max_parallel_features
+    else:
+        max_parallel_stages = 1
+        max_parallel_features = 1
+
+    stages = {
+        "STATISTICS": lambda: calculate_statistics_current(
+            current_dataset, job_config.duplicate_rows_mode
+        ).model_dump_json(serialize_as_any=True),
+        "DATA_QUALITY": lambda: calculate_data_quality().model_dump_json(
+            serialize_as_any=True
+        ),
+        # grouped metrics of the coarser granularities are stored too, so they can be served without a rerun
+        "MODEL_QUALITY": lambda: orjson.dumps(
+            {
+                **calculate_model_quality(),
+                "grouped_metrics_by_granularity": metrics_service.calculate_grouped_metrics_by_granularity(),
+            }
+        ).decode("utf-8"),
+        "DRIFT": lambda: orjson.dumps(
+            metrics_service.calculate_drift(max_workers=max_parallel_features)
+        ).decode("utf-8"),
+    }
+
+    record = run_in_pools(
+        spark_session=spark_session,
+        tasks=with_checkpoints(
+            stages,
+            completed_stages,
+            save_stage_with_warnings if save_stage is not None else None,
+        ),
+        max_workers=max_parallel_stages,
+    )
+    warnings = metrics_service.guardrails.warnings_json()
+    if warnings is not None:
+        record["WARNINGS"] = warnings
+    return record
 
 
 def main(
@@ -95,6 +135,8 @@ def main(
     current_uuid: str,
     reference_dataset_path: str,
     table_name: str,
+    job_config: Optional[JobConfig] = None,
+    partition_filter: Optional[PartitionFilter] = None,
 ):
     spark_context = spark_session.sparkContext
 
@@ -116,39 +158,136 @@ def main(
             "fs.s3a.connection.ssl.enabled", "false"
         )
 
-    raw_current = spark_session.read.csv(current_dataset_path, header=True)
-    current_dataset = CurrentDataset(model=model, raw_dataframe=raw_current)
-    raw_reference = spark_session.read.csv(reference_dataset_path, header=True)
-    reference_dataset = ReferenceDataset(model=model, raw_dataframe=raw_reference)
+    job_config = job_config or JobConfig()
 
+    current_dataset, sample_design = read_current_dataset(
+        spark_session, model, current_dataset_path, job_config, partition_filter
+    )
+    raw_reference = read_csv_dataset(spark_session, reference_dataset_path)
+    reference_dataset = ReferenceDataset(
+        model=model,
+        raw_dataframe=raw_reference,
+        cast_failures_report=job_config.cast_failures_report,
+    )
+    log_cast_failures(reference_dataset.cast_failures, reference_dataset_path)
+    if job_config.approx_distinct_min_cardinality is not None:
+        # the distinct values of the reference are merged from its sketches instead of sketching it again
+        reference_dataset.use_data_quality(load_reference_data_quality(str(model.uuid)))
+
+    write_current_metrics(
+        spark_session,
+        model,
+        current_dataset,
+        sample_design,
+        reference_dataset,
+        current_uuid,
+        table_name,
+        job_config,
+    )
+
+
+def read_current_dataset(
+    spark_session: SparkSession,
+    model: ModelOut,
+    current_dataset_path: str,
+    job_config: JobConfig,
+    partition_filter: Optional[PartitionFilter] = None,
+) -> Tuple[CurrentDataset, Optional[SampleDesign]]:
+    """Current dataset read from current_dataset_path and, when it is sampled, the design of the sample"""
+    raw_current = read_csv_dataset(
+        spark_session, current_dataset_path, partition_filter
+    )
+    current_dataset = CurrentDataset(
+        model=model,
+        raw_dataframe=raw_current,
+        cast_failures_report=job_config.cast_failures_report,
+    )
+    log_cast_failures(current_dataset.cast_failures, current_dataset_path)
+    sample_design = None
+    if job_config.sample_size is not None:
+        sample = stratified_sample(
+            current_dataset,
+            job_config.sample_size,
+            job_config.sample_seed,
+            job_config.sample_min_stratum_rows,
+        )
+        if sample is not None:
+            current_dataset, sample_design = sample
+    if job_config.partition_by_time_bucket:
+        log_time_partitions(current_dataset.partition_by_time_bucket())
+    return current_dataset, sample_design
+
+
+def write_current_metrics(
+    spark_session: SparkSession,
+    model: ModelOut,
+    current_dataset: CurrentDataset,
+    sample_design: Optional[SampleDesign],
+    reference_dataset: ReferenceDataset,
+    current_uuid: str,
+    table_name: str,
+    job_config: JobConfig,
+):
+    """Computes the metrics of the current compared with the reference and writes them in table_name"""
     complete_record = compute_metrics(
         spark_session=spark_session,
         current_dataset=current_dataset,
         reference_dataset=reference_dataset,
         model=model,
+        job_config=job_config,
+        completed_stages=(
+            load_checkpoints(current_uuid) if job_config.resume_stages else None
+        ),
+        completed_warnings=(
+            load_checkpoint_warnings(current_uuid) if job_config.resume_stages else ()
+        ),
+        save_stage=(
+            partial(save_checkpoint, current_uuid)
+            if job_config.checkpoint_stages
+            else None
+        ),
     )
-    complete_record.update({"UUID": str(uuid.uuid4()), "CURRENT_UUID": current_uuid})
-
-    schema = StructType(
-        [
-            StructField("UUID", StringType(), True),
-            StructField("CURRENT_UUID", StringType(), True),
-            StructField("STATISTICS", StringType(), True),
-            StructField("DATA_QUALITY", StringType(), True),
-            StructField("MODEL_QUALITY", StringType(), True),
-            StructField("DRIFT", StringType(), True),
-        ]
+    complete_record.update(
+        {"UUID": metrics_uuid(current_uuid), "CURRENT_UUID": current_uuid}
     )
+    if sample_design is not None:
+        complete_record["SAMPLING"] = sampling(
+            current_dataset,
+            sample_design,
+            job_config.sample_confidence_level,
+        ).model_dump_json()
 
-    write_to_db(spark_session, complete_record, schema, table_name)
+    sections = [
+        "STATISTICS",
+        "DATA_QUALITY",
+        "MODEL_QUALITY",
+        "DRIFT",
+    ]
     # FIXME table name should come from parameters
-    update_job_status(current_uuid, JobStatus.SUCCEEDED, "current_dataset")
+    write_metrics(
+        compress_sections(
+            {
+                column: complete_record.get(column)
+                for column in ["UUID", "CURRENT_UUID", "SAMPLING", "WARNINGS"]
+                + sections
+            },
+            sections,
+            job_config.compressed_metrics_min_bytes,
+        ),
+        table_name,
+        current_uuid,
+        "current_dataset",
+    )
 
 
 if __name__ == "__main__":
-    spark_session = SparkSession.builder.appName(
-        "radicalbit_reference_metrics"
-    ).getOrCreate()
+    job_config = JobConfig.from_env()
+
+    spark_builder = SparkSession.builder.appName("radicalbit_reference_metrics")
+    if job_config.parallel_stages:
+        # Concurrent stages share the executors fairly instead of queueing FIFO
+        spark_builder = spark_builder.config("spark.scheduler.mode", "FAIR")
+    spark_session = spark_builder.getOrCreate()
 
     # Json of ModelOut is first param
     model = ModelOut.model_validate_json(sys.argv[1])
@@ -160,6 +299,10 @@ if __name__ == "__main__":
     reference_dataset_path = sys.argv[4]
     # Table name fifth param
     table_name = sys.argv[5]
+    # Json of the PartitionFilter of a partitioned current dataset is the optional sixth param
+    partition_filter = (
+        PartitionFilter.model_validate_json(sys.argv[6]) if len(sys.argv) > 6 else None
+    )
 
     try:
         main(
@@ -169,6 +312,8 @@ if __name__ == "__main__":
             current_uuid,
             reference_dataset_path,
             table_name,
+            job_config,
+            partition_filter,
         )
     except Exception as e:
         logging.exception(e)
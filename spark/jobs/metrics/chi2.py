@@ -4,9 +4,10 @@ from pyspark.ml.stat import ChiSquareTest
 from pyspark.ml.feature import VectorAssembler, StringIndexer
 from pyspark.ml import Pipeline
 import pyspark.sql.functions as F
-import numpy as np
 from scipy.stats import chisquare
 
+from utils.spark import collect_columns
+
 
 class Chi2Test:
     """Class for performing a chi-square test of independence using Pyspark."""
@@ -63,13 +64,15 @@ class Chi2Test:
             max_size = max(self.reference_size, self.current_size)
 
             if self.reference_size == max_size:
-                # create a reference subsample with a size equal to the current
+                # create a reference subsample of at most the size of the current, drawn without collecting it
+                # to the driver
                 subsample_reference = (
-                    self.spark_session.createDataFrame(
-                        self.reference.rdd.takeSample(
-                            withReplacement=True, num=self.current_size, seed=1990
-                        )
+                    self.reference.sample(
+                        withReplacement=True,
+                        fraction=self.current_size / self.reference_size,
+                        seed=1990,
                     )
+                    .limit(self.current_size)
                     .rdd.flatMap(lambda x: x)
                     .zipWithIndex()
                     .toDF(tuple(self.reference.columns + ["id"]))
@@ -83,13 +86,15 @@ class Chi2Test:
                     self.current, subsample_reference.id == self.current.id, how="inner"
                 )
             else:
-                # create a current subsample with a size equal to the reference
+                # create a current subsample of at most the size of the reference, drawn without collecting it
+                # to the driver
                 subsample_current = (
-                    self.spark_session.createDataFrame(
-                        self.current.rdd.takeSample(
-                            withReplacement=True, num=self.reference_size, seed=1990
-                        )
+                    self.current.sample(
+                        withReplacement=True,
+                        fraction=self.reference_size / self.current_size,
+                        seed=1990,
                     )
+                    .limit(self.reference_size)
                     .rdd.flatMap(lambda x: x)
                     .zipWithIndex()
                     .toDF(tuple(self.current.columns + ["id"]))
@@ -236,8 +241,6 @@ class Chi2Test:
             .withColumnRenamed(current_column, "value")
             .na.drop()
         )
-        self.reference_size = self.reference.count()
-        self.current_size = self.current.count()
 
         self.current = self.current.withColumn("type", F.lit("current"))
         self.reference = self.reference.withColumn("type", F.lit("reference"))
@@ -247,20 +250,16 @@ class Chi2Test:
         def cnt_cond(cond):
             return F.sum(F.when(cond, 1).otherwise(0))
 
-        ref_fr = np.array(
-            concatenated_data.groupBy("value")
-            .agg(cnt_cond(F.col("type") == "reference").alias("count"))
-            .select("count")
-            .rdd.flatMap(lambda x: x)
-            .collect()
-        )
-        cur_fr = np.array(
-            concatenated_data.groupBy("value")
-            .agg(cnt_cond(F.col("type") == "current").alias("count"))
-            .select("count")
-            .rdd.flatMap(lambda x: x)
-            .collect()
+        # both frequencies come from the same aggregation, so they are aligned by value
+        frequencies = collect_columns(
+            concatenated_data.groupBy("value").agg(
+                cnt_cond(F.col("type") == "reference").alias("ref_count"),
+                cnt_cond(F.col("type") == "current").alias("cur_count"),
+            ),
+            ["ref_count", "cur_count"],
         )
+        ref_fr = frequencies["ref_count"]
+        cur_fr = frequencies["cur_count"]
         proportion = sum(cur_fr) / sum(ref_fr)
         ref_fr = ref_fr * proportion
         res = chisquare(cur_fr, ref_fr)
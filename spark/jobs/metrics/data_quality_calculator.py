@@ -1,12 +1,19 @@
-from math import inf
-from typing import List, Dict
+import base64
+from math import ceil, inf, log2
+from typing import Any, List, Dict, Optional, Tuple
 
 import numpy as np
 import pyspark.sql.functions as F
 from pandas import DataFrame
 from pyspark.ml.feature import Bucketizer
-from pyspark.sql import SparkSession
-from pyspark.sql.types import IntegerType
+from pyspark.sql import Column, SparkSession, Window
+from pyspark.sql.types import (
+    DataType,
+    DoubleType,
+    FloatType,
+    IntegerType,
+    NumericType,
+)
 
 from models.data_quality import (
     NumericalFeatureMetrics,
@@ -14,111 +21,304 @@ from models.data_quality import (
     CategoricalFeatureMetrics,
     ClassMetrics,
     NumericalTargetMetrics,
+    OtherCategories,
+    ClassMedianMetrics,
+    MedianMetrics,
 )
+from utils.guardrails import Guardrails
 from utils.misc import split_dict, rbit_prefix
 from utils.models import ModelOut
-from utils.spark import check_not_null
+from utils.spark import (
+    check_not_null,
+    chunked_agg,
+    collect_columns,
+    histograms,
+    merge_bounds,
+    numerical_bounds,
+)
 
 
 class DataQualityCalculator:
     @staticmethod
-    def numerical_metrics(
-        model: ModelOut, dataframe: DataFrame, dataframe_count: int
-    ) -> List[NumericalFeatureMetrics]:
-        numerical_features = [
-            numerical.name for numerical in model.get_numerical_features()
-        ]
-
-        mean_agg = [
-            (F.mean(check_not_null(x))).alias(f"{x}-mean") for x in numerical_features
-        ]
-
-        max_agg = [
-            (F.max(check_not_null(x))).alias(f"{x}-max") for x in numerical_features
-        ]
-
-        min_agg = [
-            (F.min(check_not_null(x))).alias(f"{x}-min") for x in numerical_features
-        ]
-
-        median_agg = [
-            (F.median(check_not_null(x))).alias(f"{x}-median")
-            for x in numerical_features
-        ]
+    def percentile(
+        column: Column, percentage: float, relative_error: Optional[float] = None
+    ) -> Column:
+        """
+        Exact percentile of column, or with relative_error the one of percentile_approx, that is computed from a
+        bounded sketch instead of sorting all the values of the column
+        """
+        if relative_error is not None:
+            return F.percentile_approx(
+                column, percentage, accuracy=int(1 / relative_error)
+            )
+        if percentage == 0.5:
+            return F.median(column)
+        return F.percentile(column, percentage)
 
-        perc_25_agg = [
-            (F.percentile(check_not_null(x), 0.25)).alias(f"{x}-perc_25")
-            for x in numerical_features
+    @staticmethod
+    def class_median_metrics(
+        class_column: str,
+        numerical_features: List[str],
+        dataframe: DataFrame,
+        relative_error: float,
+    ) -> Dict[str, List[ClassMedianMetrics]]:
+        """
+        Mean and quartiles of each numerical feature by class, computed with a single groupBy of class_column and
+        percentile_approx, so that they cost about one more scan whatever the number of classes and features.
+        Rows without class are left out, classes are ordered as in class_metrics.
+        """
+        class_key = f"{rbit_prefix}_class"
+        aggregations = []
+        for feature in numerical_features:
+            aggregations += [
+                F.mean(check_not_null(feature)).alias(f"{feature}-mean"),
+                F.percentile_approx(
+                    check_not_null(feature),
+                    [0.25, 0.5, 0.75],
+                    accuracy=int(1 / relative_error),
+                ).alias(f"{feature}-quartiles"),
+            ]
+        rows = [
+            row
+            for row in dataframe.groupBy(
+                check_not_null(class_column).cast("string").alias(class_key)
+            )
+            .agg(*aggregations)
+            .collect()
+            if row[class_key] is not None
         ]
+        is_numeric = isinstance(dataframe.schema[class_column].dataType, NumericType)
+        rows.sort(
+            key=lambda row: float(row[class_key]) if is_numeric else row[class_key]
+        )
 
-        perc_75_agg = [
-            (F.percentile(check_not_null(x), 0.75)).alias(f"{x}-perc_75")
-            for x in numerical_features
-        ]
+        def nan_if_none(value: Optional[float]) -> float:
+            return float("nan") if value is None else value
+
+        class_median_metrics = dict()
+        for feature in numerical_features:
+            class_median_metrics[feature] = []
+            for row in rows:
+                perc_25, median, perc_75 = row[f"{feature}-quartiles"] or [None] * 3
+                class_median_metrics[feature].append(
+                    ClassMedianMetrics(
+                        name=DataQualityCalculator.category_label(
+                            row[class_key], dataframe.schema[class_column].dataType
+                        ),
+                        mean=nan_if_none(row[f"{feature}-mean"]),
+                        median_metrics=MedianMetrics(
+                            perc_25=nan_if_none(perc_25),
+                            median=nan_if_none(median),
+                            perc_75=nan_if_none(perc_75),
+                            relative_error=relative_error,
+                        ),
+                    )
+                )
+        return class_median_metrics
 
-        std_agg = [
-            (F.std(check_not_null(x))).alias(f"{x}-std") for x in numerical_features
-        ]
+    @staticmethod
+    def numerical_aggregations(
+        numerical_features: List[str],
+        dataframe_count: int,
+        relative_error: Optional[float] = None,
+    ) -> List[Column]:
+        """Aggregations of the global metrics of numerical features, grouped by feature"""
+
+        def feature_aggregations(x: str) -> List[Column]:
+            missing_values = F.count(F.when(F.col(x).isNull() | F.isnan(x), x))
+            return [
+                F.mean(check_not_null(x)).alias(f"{x}-mean"),
+                F.max(check_not_null(x)).alias(f"{x}-max"),
+                F.min(check_not_null(x)).alias(f"{x}-min"),
+                DataQualityCalculator.percentile(
+                    check_not_null(x), 0.5, relative_error
+                ).alias(f"{x}-median"),
+                DataQualityCalculator.percentile(
+                    check_not_null(x), 0.25, relative_error
+                ).alias(f"{x}-perc_25"),
+                DataQualityCalculator.percentile(
+                    check_not_null(x), 0.75, relative_error
+                ).alias(f"{x}-perc_75"),
+                F.std(check_not_null(x)).alias(f"{x}-std"),
+                missing_values.alias(f"{x}-missing_values"),
+                ((missing_values / dataframe_count) * 100).alias(
+                    f"{x}-missing_values_perc"
+                ),
+            ]
 
-        missing_values_agg = [
-            (F.count(F.when(F.col(x).isNull() | F.isnan(x), x))).alias(
-                f"{x}-missing_values"
-            )
+        return [
+            aggregation
             for x in numerical_features
+            for aggregation in feature_aggregations(x)
         ]
 
-        missing_values_perc_agg = [
-            (
-                (F.count(F.when(F.col(x).isNull() | F.isnan(x), x)) / dataframe_count)
-                * 100
-            ).alias(f"{x}-missing_values_perc")
-            for x in numerical_features
+    @staticmethod
+    def numerical_metrics(
+        model: ModelOut,
+        dataframe: DataFrame,
+        dataframe_count: int,
+        relative_error: Optional[float] = None,
+        class_relative_error: Optional[float] = None,
+        bounds: Optional[Dict[str, Tuple[Any, Any]]] = None,
+    ) -> List[NumericalFeatureMetrics]:
+        """bounds are the numerical_bounds of the features, when already computed"""
+        numerical_features = [
+            numerical.name for numerical in model.get_numerical_features()
         ]
 
-        # Global
-        global_stat = dataframe.select(numerical_features).agg(
-            *(
-                mean_agg
-                + max_agg
-                + min_agg
-                + median_agg
-                + perc_25_agg
-                + perc_75_agg
-                + std_agg
-                + missing_values_agg
-                + missing_values_perc_agg
-            )
+        global_dict = chunked_agg(
+            dataframe.select(numerical_features),
+            DataQualityCalculator.numerical_aggregations(
+                numerical_features, dataframe_count, relative_error
+            ),
         )
-
-        global_dict = global_stat.toPandas().iloc[0].to_dict()
         global_data_quality = split_dict(global_dict)
 
-        # TODO probably not so efficient but I haven't found another way
-        histograms = {
-            column: dataframe.select(column).rdd.flatMap(lambda x: x).histogram(10)
-            for column in numerical_features
-        }
-
         dict_of_hist = {
             k: Histogram(buckets=v[0], reference_values=v[1])
-            for k, v in histograms.items()
+            for k, v in histograms(dataframe, numerical_features, bounds=bounds).items()
         }
 
+        # per class metrics of the target, only when asked for as they need a shuffle
+        class_median_metrics = (
+            DataQualityCalculator.class_median_metrics(
+                model.target.name, numerical_features, dataframe, class_relative_error
+            )
+            if class_relative_error is not None
+            else dict()
+        )
+
         numerical_features_metrics = [
             NumericalFeatureMetrics.from_dict(
                 feature_name,
                 metrics,
                 histogram=dict_of_hist.get(feature_name),
+                relative_error=relative_error,
+                class_median_metrics=class_median_metrics.get(feature_name),
             )
             for feature_name, metrics in global_data_quality.items()
         ]
 
         return numerical_features_metrics
 
+    @staticmethod
+    def hll_lg_config_k(rsd: float) -> int:
+        """Log2 of the buckets of a HLL sketch with relative standard deviation rsd, as accepted by hll_sketch_agg"""
+        return min(max(ceil(2 * log2(1.04 / rsd)), 4), 21)
+
+    @staticmethod
+    def distinct_sketch_agg(column: str, rsd: float) -> Column:
+        # values are sketched as strings, so sketches of columns read with different types can be merged
+        return F.hll_sketch_agg(
+            check_not_null(column).cast("string"),
+            DataQualityCalculator.hll_lg_config_k(rsd),
+        )
+
+    @staticmethod
+    def distinct_sketches(
+        dataframe: DataFrame, columns: List[str], rsd: float
+    ) -> Dict[str, str]:
+        """Base64 HLL sketches of the distinct values of columns, computed in one aggregation"""
+        row = dataframe.agg(
+            *[
+                DataQualityCalculator.distinct_sketch_agg(column, rsd).alias(column)
+                for column in columns
+            ]
+        ).collect()[0]
+        return {
+            column: base64.b64encode(row[column]).decode("ascii") for column in columns
+        }
+
+    @staticmethod
+    def category_label(category: str, data_type: DataType) -> str:
+        """
+        Label of a category cast to string by Spark, formatted as the labels collected to pandas always were, e.g.
+        1e-05 instead of 1.0E-5, so the categories of the metrics already stored keep their names
+        """
+        if isinstance(data_type, DoubleType):
+            return str(float(category))
+        if isinstance(data_type, FloatType):
+            return str(np.float32(category))
+        return category
+
+    @staticmethod
+    def category_counts(
+        dataframe: DataFrame, columns: List[str], top_k: Optional[int] = None
+    ) -> Dict[str, Dict[Optional[str], Tuple[int, int]]]:
+        """
+        Counts the rows of every category of columns in a single aggregation, with the columns stacked in
+        (column, category) rows. Categories are compared as strings and null or NaN values are not counted.
+        With top_k, only the top_k most frequent categories of each column are kept and the others are
+        aggregated under the None category.
+        Returns, for every column, the number of rows and of distinct categories of every category, by its
+        category_label.
+        """
+        stacked = (
+            dataframe.select(
+                F.explode(
+                    F.array(
+                        *[
+                            F.struct(
+                                F.lit(column).alias("column"),
+                                check_not_null(column).cast("string").alias("category"),
+                            )
+                            for column in columns
+                        ]
+                    )
+                ).alias("stacked")
+            )
+            .select("stacked.*")
+            .filter(F.col("category").isNotNull())
+        )
+        counts = stacked.groupBy("column", "category").agg(
+            F.count(F.lit(1)).alias("count"), F.lit(1).alias("categories")
+        )
+        if top_k is not None:
+            rank = F.row_number().over(
+                Window.partitionBy("column").orderBy(F.desc("count"), F.asc("category"))
+            )
+            counts = (
+                counts.withColumn("category", F.when(rank <= top_k, F.col("category")))
+                .groupBy("column", "category")
+                .agg(
+                    F.sum("count").alias("count"),
+                    F.sum("categories").alias("categories"),
+                )
+            )
+
+        category_counts = {column: dict() for column in columns}
+        for row in counts.collect():
+            category = row["category"]
+            if category is not None:
+                category = DataQualityCalculator.category_label(
+                    category, dataframe.schema[row["column"]].dataType
+                )
+            category_counts[row["column"]][category] = (
+                row["count"],
+                row["categories"],
+            )
+        return category_counts
+
     @staticmethod
     def categorical_metrics(
-        model: ModelOut, dataframe: DataFrame, dataframe_count: int
+        model: ModelOut,
+        dataframe: DataFrame,
+        dataframe_count: int,
+        approx_distinct_min_cardinality: Optional[int] = None,
+        distinct_rsd: float = 0.05,
+        reference_sketches: Optional[Dict[str, str]] = None,
+        guardrails: Optional[Guardrails] = None,
     ) -> List[CategoricalFeatureMetrics]:
+        """
+        The distinct values are those of the category counts, so they are exact. With
+        approx_distinct_min_cardinality they are estimated from a HLL sketch first: the categories of the columns
+        estimated at or over that cardinality are not counted, only estimated, and are all aggregated in the other
+        categories; the others are counted, and their distinct values are exact. The sketches are kept in the
+        output and, given the sketches of the reference, the categories not in the reference are estimated by
+        merging them.
+        With the category_top_k of the model only the most frequent categories are listed, the others are
+        aggregated. So are the ones over the max_collected_categories of guardrails, with a warning.
+        """
         categorical_features = [
             categorical.name for categorical in model.get_categorical_features()
         ]
@@ -135,75 +335,159 @@ class DataQualityCalculator:
             for x in categorical_features
         ]
 
-        distinct_values = [
-            (F.countDistinct(check_not_null(x))).alias(f"{x}-distinct_values")
-            for x in categorical_features
-        ]
+        # exact distinct values come from the category counts
+        distinct_values = (
+            [
+                DataQualityCalculator.distinct_sketch_agg(x, distinct_rsd).alias(
+                    f"{x}-distinct_sketch"
+                )
+                for x in categorical_features
+            ]
+            if approx_distinct_min_cardinality is not None
+            else []
+        )
 
         global_stat = dataframe.select(categorical_features).agg(
             *(missing_values_agg + missing_values_perc_agg + distinct_values)
         )
 
+        if approx_distinct_min_cardinality is not None:
+            reference_sketches = reference_sketches or dict()
+            global_stat = global_stat.select(
+                "*",
+                *[
+                    F.hll_sketch_estimate(F.col(f"`{x}-distinct_sketch`")).alias(
+                        f"{x}-distinct_values"
+                    )
+                    for x in categorical_features
+                ],
+                *[
+                    F.greatest(
+                        F.hll_sketch_estimate(
+                            F.hll_union(
+                                F.col(f"`{x}-distinct_sketch`"),
+                                F.lit(base64.b64decode(reference_sketches[x])),
+                                True,
+                            )
+                        )
+                        - F.hll_sketch_estimate(
+                            F.lit(base64.b64decode(reference_sketches[x]))
+                        ),
+                        F.lit(0),
+                    ).alias(f"{x}-new_categories")
+                    for x in categorical_features
+                    if x in reference_sketches
+                ],
+            )
+
         global_dict = global_stat.toPandas().iloc[0].to_dict()
         global_data_quality = split_dict(global_dict)
 
-        # FIXME by design this is not efficient
-        # FIXME understand if we want to divide by whole or by number of not null
-
-        count_distinct_categories = {
-            column: dict(
-                dataframe.select(column)
-                .filter(F.isnotnull(column))
-                .groupBy(column)
-                .agg(*[F.count(check_not_null(column)).alias("count")])
-                .withColumn(
-                    "freq",
-                    F.col("count") / dataframe_count,
+        top_k = (
+            guardrails.categories_top_k(model.category_top_k)
+            if guardrails is not None
+            else model.category_top_k
+        )
+        counted_features = [
+            x
+            for x in categorical_features
+            if approx_distinct_min_cardinality is None
+            or global_data_quality[x]["distinct_values"]
+            < approx_distinct_min_cardinality
+        ]
+        category_counts = (
+            DataQualityCalculator.category_counts(dataframe, counted_features, top_k)
+            if counted_features
+            else dict()
+        )
+
+        categorical_features_metrics = []
+        for feature_name, metrics in global_data_quality.items():
+            if feature_name in category_counts:
+                counts = category_counts[feature_name]
+                if top_k != model.category_top_k and None in counts:
+                    guardrails.warn(
+                        "DATA_QUALITY",
+                        f"{feature_name} has more than {top_k} categories, only the {top_k} most frequent are "
+                        "listed and the others are aggregated",
+                    )
+                metrics["distinct_values"] = sum(
+                    categories for _, categories in counts.values()
                 )
-                .toPandas()
-                .set_index(column)
-                .to_dict()
+            else:
+                # the rows and the estimated categories of a column not counted are all other categories
+                distinct_values = int(metrics["distinct_values"])
+                not_null = dataframe_count - int(metrics["missing_values"])
+                counts = {None: (not_null, distinct_values)} if not_null else dict()
+            if approx_distinct_min_cardinality is not None:
+                metrics["distinct_sketch"] = base64.b64encode(
+                    metrics["distinct_sketch"]
+                ).decode("ascii")
+
+            # FIXME understand if we want to divide by whole or by number of not null
+            top_categories = sorted(
+                (
+                    (category, count)
+                    for category, (count, _) in counts.items()
+                    if category is not None
+                ),
+                key=lambda item: (-item[1], item[0]),
             )
-            for column in categorical_features
-        }
-
-        categorical_features_metrics = [
-            CategoricalFeatureMetrics.from_dict(
-                feature_name=feature_name,
-                global_metrics=metrics,
-                categories_metrics=count_distinct_categories.get(feature_name),
+            other_count, other_categories = counts.get(None, (0, 0))
+            categorical_features_metrics.append(
+                CategoricalFeatureMetrics.from_dict(
+                    feature_name=feature_name,
+                    global_metrics=metrics,
+                    categories_metrics={
+                        "count": dict(top_categories),
+                        "freq": {
+                            category: count / dataframe_count
+                            for category, count in top_categories
+                        },
+                    },
+                    other_categories=OtherCategories(
+                        categories=other_categories,
+                        count=other_count,
+                        frequency=other_count / dataframe_count,
+                    )
+                    if other_categories
+                    else None,
+                )
             )
-            for feature_name, metrics in global_data_quality.items()
-        ]
 
         return categorical_features_metrics
 
     @staticmethod
     def class_metrics(
-        class_column: str, dataframe: DataFrame, dataframe_count: int
+        class_column: str,
+        dataframe: DataFrame,
+        dataframe_count: int,
+        guardrails: Optional[Guardrails] = None,
     ) -> List[ClassMetrics]:
-        class_metrics_dict = (
-            dataframe.select(class_column)
-            .filter(F.isnotnull(class_column))
-            .groupBy(class_column)
-            .agg(*[F.count(check_not_null(class_column)).alias("count")])
-            .orderBy(class_column)
-            .withColumn(
-                "percentage",
-                (F.col("count") / dataframe_count) * 100,
+        """With guardrails, only the classes within its max_collected_categories most frequent are listed"""
+        top_k = guardrails.categories_top_k(None) if guardrails is not None else None
+        counts = DataQualityCalculator.category_counts(
+            dataframe, [class_column], top_k
+        )[class_column]
+        if None in counts:
+            del counts[None]
+            guardrails.warn(
+                "DATA_QUALITY",
+                f"{class_column} has more than {top_k} classes, only the {top_k} most frequent are listed",
             )
-            .toPandas()
-            .set_index(class_column)
-            .to_dict(orient="index")
-        )
+        # classes are ordered by value, numerically for numerical columns
+        is_numeric = isinstance(dataframe.schema[class_column].dataType, NumericType)
 
         return [
             ClassMetrics(
-                name=str(label),
-                count=metrics["count"],
-                percentage=metrics["percentage"],
+                name=label,
+                count=count,
+                percentage=(count / dataframe_count) * 100,
+            )
+            for label, (count, _) in sorted(
+                counts.items(),
+                key=lambda item: float(item[0]) if is_numeric else item[0],
             )
-            for label, metrics in class_metrics_dict.items()
         ]
 
     @staticmethod
@@ -212,7 +496,17 @@ class DataQualityCalculator:
         reference_dataframe: DataFrame,
         spark_session: SparkSession,
         columns: List[str],
+        reference_bounds: Optional[Dict[str, Tuple[Any, Any]]] = None,
     ) -> Dict[str, Histogram]:
+        """
+        Histograms of the reference and of the current over the same buckets, evenly spaced between the min and the
+        max of both. The bounds of all the columns are merged from one aggregation of each dataset, the one of the
+        reference skipped when its numerical_bounds are given.
+        """
+        bounds = merge_bounds(
+            reference_bounds or numerical_bounds(reference_dataframe, columns),
+            numerical_bounds(current_dataframe, columns),
+        )
         current = current_dataframe.withColumn(f"{rbit_prefix}_type", F.lit("current"))
         reference = reference_dataframe.withColumn(
             f"{rbit_prefix}_type", F.lit("reference")
@@ -223,22 +517,7 @@ class DataQualityCalculator:
                 [feature, f"{rbit_prefix}_type"]
             ).unionByName(reference.select([feature, f"{rbit_prefix}_type"]))
 
-            max_value = reference_and_current.agg(
-                F.max(
-                    F.when(
-                        F.col(feature).isNotNull() & ~F.isnan(feature),
-                        F.col(feature),
-                    )
-                )
-            ).collect()[0][0]
-            min_value = reference_and_current.agg(
-                F.min(
-                    F.when(
-                        F.col(feature).isNotNull() & ~F.isnan(feature),
-                        F.col(feature),
-                    )
-                )
-            ).collect()[0][0]
+            min_value, max_value = bounds[feature]
 
             buckets_spacing = np.linspace(min_value, max_value, 11).tolist()
             lookup = set()
@@ -283,10 +562,11 @@ class DataQualityCalculator:
             # workaround if all values are the same to not have errors
             if len(generated_buckets) == 1:
                 tot_df = tot_df.filter(F.col("bucket") == 1)
-            cur = tot_df.select("curr_count").rdd.flatMap(lambda x: x).collect()
-            ref = tot_df.select("ref_count").rdd.flatMap(lambda x: x).collect()
+            counts = collect_columns(tot_df, ["curr_count", "ref_count"])
             return Histogram(
-                buckets=buckets_spacing, reference_values=ref, current_values=cur
+                buckets=buckets_spacing,
+                reference_values=counts["ref_count"].tolist(),
+                current_values=counts["curr_count"].tolist(),
             )
 
         return {feature: create_histogram(feature) for feature in columns}
@@ -298,73 +578,20 @@ class DataQualityCalculator:
         current_count: int,
         reference_dataframe: DataFrame,
         spark_session: SparkSession,
+        relative_error: Optional[float] = None,
+        class_relative_error: Optional[float] = None,
+        reference_bounds: Optional[Dict[str, Tuple[Any, Any]]] = None,
     ) -> List[NumericalFeatureMetrics]:
         numerical_features = [
             numerical.name for numerical in model.get_numerical_features()
         ]
 
-        mean_agg = [
-            (F.mean(check_not_null(x))).alias(f"{x}-mean") for x in numerical_features
-        ]
-
-        max_agg = [
-            (F.max(check_not_null(x))).alias(f"{x}-max") for x in numerical_features
-        ]
-
-        min_agg = [
-            (F.min(check_not_null(x))).alias(f"{x}-min") for x in numerical_features
-        ]
-
-        median_agg = [
-            (F.median(check_not_null(x))).alias(f"{x}-median")
-            for x in numerical_features
-        ]
-
-        perc_25_agg = [
-            (F.percentile(check_not_null(x), 0.25)).alias(f"{x}-perc_25")
-            for x in numerical_features
-        ]
-
-        perc_75_agg = [
-            (F.percentile(check_not_null(x), 0.75)).alias(f"{x}-perc_75")
-            for x in numerical_features
-        ]
-
-        std_agg = [
-            (F.std(check_not_null(x))).alias(f"{x}-std") for x in numerical_features
-        ]
-
-        missing_values_agg = [
-            (F.count(F.when(F.col(x).isNull() | F.isnan(x), x))).alias(
-                f"{x}-missing_values"
-            )
-            for x in numerical_features
-        ]
-
-        missing_values_perc_agg = [
-            (
-                (F.count(F.when(F.col(x).isNull() | F.isnan(x), x)) / current_count)
-                * 100
-            ).alias(f"{x}-missing_values_perc")
-            for x in numerical_features
-        ]
-
-        # Global
-        global_stat = current_dataframe.select(numerical_features).agg(
-            *(
-                mean_agg
-                + max_agg
-                + min_agg
-                + median_agg
-                + perc_25_agg
-                + perc_75_agg
-                + std_agg
-                + missing_values_agg
-                + missing_values_perc_agg
-            )
+        global_dict = chunked_agg(
+            current_dataframe.select(numerical_features),
+            DataQualityCalculator.numerical_aggregations(
+                numerical_features, current_count, relative_error
+            ),
         )
-
-        global_dict = global_stat.toPandas().iloc[0].to_dict()
         global_data_quality = split_dict(global_dict)
 
         numerical_features_histogram = (
@@ -373,7 +600,20 @@ class DataQualityCalculator:
                 reference_dataframe,
                 spark_session,
                 numerical_features,
+                reference_bounds,
+            )
+        )
+
+        # per class metrics of the target, only when asked for as they need a shuffle
+        class_median_metrics = (
+            DataQualityCalculator.class_median_metrics(
+                model.target.name,
+                numerical_features,
+                current_dataframe,
+                class_relative_error,
             )
+            if class_relative_error is not None
+            else dict()
         )
 
         numerical_features_metrics = [
@@ -381,26 +621,69 @@ class DataQualityCalculator:
                 feature_name,
                 metrics,
                 histogram=numerical_features_histogram.get(feature_name),
+                relative_error=relative_error,
+                class_median_metrics=class_median_metrics.get(feature_name),
             )
             for feature_name, metrics in global_data_quality.items()
         ]
 
         return numerical_features_metrics
 
+    @staticmethod
+    def calculate_combined_data_quality_categorical(
+        model: ModelOut,
+        current_dataframe: DataFrame,
+        current_count: int,
+        reference_dataframe: DataFrame,
+        approx_distinct_min_cardinality: Optional[int] = None,
+        distinct_rsd: float = 0.05,
+        guardrails: Optional[Guardrails] = None,
+        reference_sketches: Optional[Dict[str, str]] = None,
+    ) -> List[CategoricalFeatureMetrics]:
+        """
+        reference_sketches are the sketches persisted with the metrics of the reference, only the features
+        without one, e.g. of references computed without approx_distinct_min_cardinality, are sketched again.
+        """
+        if approx_distinct_min_cardinality is not None:
+            reference_sketches = dict(reference_sketches or dict())
+            unsketched_features = [
+                categorical.name
+                for categorical in model.get_categorical_features()
+                if categorical.name not in reference_sketches
+            ]
+            if unsketched_features:
+                reference_sketches.update(
+                    DataQualityCalculator.distinct_sketches(
+                        reference_dataframe, unsketched_features, distinct_rsd
+                    )
+                )
+        else:
+            reference_sketches = None
+        return DataQualityCalculator.categorical_metrics(
+            model=model,
+            dataframe=current_dataframe,
+            dataframe_count=current_count,
+            approx_distinct_min_cardinality=approx_distinct_min_cardinality,
+            distinct_rsd=distinct_rsd,
+            reference_sketches=reference_sketches,
+            guardrails=guardrails,
+        )
+
     def regression_target_metrics(
-        target_column: str, dataframe: DataFrame, dataframe_count: int
+        target_column: str,
+        dataframe: DataFrame,
+        dataframe_count: int,
+        relative_error: Optional[float] = None,
     ) -> NumericalTargetMetrics:
         target_metrics = DataQualityCalculator.regression_target_metrics_for_dataframe(
-            target_column, dataframe, dataframe_count
+            target_column, dataframe, dataframe_count, relative_error
         )
 
-        _histogram = (
-            dataframe.select(target_column).rdd.flatMap(lambda x: x).histogram(10)
-        )
+        _histogram = histograms(dataframe, [target_column])[target_column]
         histogram = Histogram(buckets=_histogram[0], reference_values=_histogram[1])
 
         return NumericalTargetMetrics.from_dict(
-            target_column, target_metrics, histogram
+            target_column, target_metrics, histogram, relative_error
         )
 
     @staticmethod
@@ -410,9 +693,10 @@ class DataQualityCalculator:
         curr_count: int,
         ref_df: DataFrame,
         spark_session: SparkSession,
+        relative_error: Optional[float] = None,
     ):
         target_metrics = DataQualityCalculator.regression_target_metrics_for_dataframe(
-            target_column, curr_df, curr_count
+            target_column, curr_df, curr_count, relative_error
         )
         _histogram = DataQualityCalculator.calculate_combined_histogram(
             curr_df, ref_df, spark_session, [target_column]
@@ -420,13 +704,33 @@ class DataQualityCalculator:
         histogram = _histogram[target_column]
 
         return NumericalTargetMetrics.from_dict(
-            target_column, target_metrics, histogram
+            target_column, target_metrics, histogram, relative_error
         )
 
     @staticmethod
     def regression_target_metrics_for_dataframe(
-        target_column: str, dataframe: DataFrame, dataframe_count: int
+        target_column: str,
+        dataframe: DataFrame,
+        dataframe_count: int,
+        relative_error: Optional[float] = None,
     ) -> dict:
+        if relative_error is not None:
+            median_metrics = [
+                DataQualityCalculator.percentile(
+                    F.col(target_column), percentage, relative_error
+                ).alias(name)
+                for name, percentage in [
+                    ("median", 0.5),
+                    ("perc_25", 0.25),
+                    ("perc_75", 0.75),
+                ]
+            ]
+        else:
+            median_metrics = [
+                F.median(target_column).alias("median"),
+                F.percentile_approx(target_column, 0.25).alias("perc_25"),
+                F.percentile_approx(target_column, 0.75).alias("perc_75"),
+            ]
         return (
             dataframe.select(target_column)
             .filter(F.isnotnull(target_column))
@@ -435,9 +739,7 @@ class DataQualityCalculator:
                 F.stddev(target_column).alias("std"),
                 F.max(target_column).alias("max"),
                 F.min(target_column).alias("min"),
-                F.median(target_column).alias("median"),
-                F.percentile_approx(target_column, 0.25).alias("perc_25"),
-                F.percentile_approx(target_column, 0.75).alias("perc_75"),
+                *median_metrics,
                 F.count(F.when(F.col(target_column).isNull(), target_column)).alias(
                     "missing_values"
                 ),
@@ -6,6 +6,7 @@ from metrics.psi import PSI
 from models.current_dataset import CurrentDataset
 from models.reference_dataset import ReferenceDataset
 from utils.models import FieldTypes
+from utils.scheduler import run_in_pools
 
 
 class DriftCalculator:
@@ -14,21 +15,27 @@ class DriftCalculator:
         spark_session: SparkSession,
         reference_dataset: ReferenceDataset,
         current_dataset: CurrentDataset,
+        max_workers: int = 1,
     ):
+        """
+        Computes the drift of every feature. With max_workers > 1 the per-feature tests are submitted
+        concurrently, feature_metrics keeps the same order in both cases.
+        """
         drift_result = dict()
-        drift_result["feature_metrics"] = []
+        feature_tasks = dict()
 
         categorical_features = [
             categorical.name
             for categorical in reference_dataset.model.get_categorical_features()
         ]
-        chi2 = Chi2Test(
-            spark_session=spark_session,
-            reference_data=reference_dataset.reference,
-            current_data=current_dataset.current,
-        )
 
-        for column in categorical_features:
+        def chi2_drift(column):
+            # Chi2Test keeps per-column state, so every feature gets its own instance
+            chi2 = Chi2Test(
+                spark_session=spark_session,
+                reference_data=reference_dataset.reference,
+                current_data=current_dataset.current,
+            )
             feature_dict_to_append = {
                 "feature_name": column,
                 "field_type": FieldTypes.categorical.value,
@@ -42,7 +49,10 @@ class DriftCalculator:
             feature_dict_to_append["drift_calc"]["has_drift"] = bool(
                 result_tmp["pValue"] <= 0.05
             )
-            drift_result["feature_metrics"].append(feature_dict_to_append)
+            return feature_dict_to_append
+
+        for column in categorical_features:
+            feature_tasks[column] = lambda column=column: chi2_drift(column)
 
         float_features = [
             float_f.name for float_f in reference_dataset.model.get_float_features()
@@ -52,9 +62,11 @@ class DriftCalculator:
             current_data=current_dataset.current,
             alpha=0.05,
             phi=0.004,
+            reference_size=reference_dataset.reference_count,
+            current_size=current_dataset.current_count,
         )
 
-        for column in float_features:
+        def ks_drift(column):
             feature_dict_to_append = {
                 "feature_name": column,
                 "field_type": FieldTypes.numerical.value,
@@ -69,7 +81,10 @@ class DriftCalculator:
             feature_dict_to_append["drift_calc"]["has_drift"] = bool(
                 result_tmp["ks_statistic"] > result_tmp["critical_value"]
             )
-            drift_result["feature_metrics"].append(feature_dict_to_append)
+            return feature_dict_to_append
+
+        for column in float_features:
+            feature_tasks[column] = lambda column=column: ks_drift(column)
 
         int_features = [
             int_f.name for int_f in reference_dataset.model.get_int_features()
@@ -79,7 +94,8 @@ class DriftCalculator:
             reference_data=reference_dataset.reference,
             current_data=current_dataset.current,
         )
-        for column in int_features:
+
+        def psi_drift(column):
             feature_dict_to_append = {
                 "feature_name": column,
                 "field_type": FieldTypes.numerical.value,
@@ -94,6 +110,18 @@ class DriftCalculator:
             feature_dict_to_append["drift_calc"]["has_drift"] = bool(
                 result_tmp["psi_value"] >= 0.1
             )
-            drift_result["feature_metrics"].append(feature_dict_to_append)
+            return feature_dict_to_append
+
+        for column in int_features:
+            feature_tasks[column] = lambda column=column: psi_drift(column)
+
+        drift_result["feature_metrics"] = list(
+            run_in_pools(
+                spark_session=spark_session,
+                tasks=feature_tasks,
+                max_workers=max_workers,
+                pool="drift",
+            ).values()
+        )
 
         return drift_result
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import numpy as np
 from math import ceil, sqrt
 from numpy import linspace, interp
@@ -9,7 +11,15 @@ class KolmogorovSmirnovTest:
     It is designed to compare two sample distributions and determine if they differ significantly.
     """
 
-    def __init__(self, reference_data, current_data, alpha, phi) -> None:
+    def __init__(
+        self,
+        reference_data,
+        current_data,
+        alpha,
+        phi,
+        reference_size: Optional[int] = None,
+        current_size: Optional[int] = None,
+    ) -> None:
         """
         Initializes the KolmogorovSmirnovTest with the provided data and parameters.
 
@@ -18,13 +28,19 @@ class KolmogorovSmirnovTest:
         - current_data (DataFrame): The current data as a Spark DataFrame.
         - alpha (float): The significance level for the hypothesis test.
         - phi (float): ϕ defines the precision of the KS test statistic.
+        - reference_size (int): The number of rows of reference_data, counted when not given.
+        - current_size (int): The number of rows of current_data, counted when not given.
         """
         self.reference_data = reference_data
         self.current_data = current_data
         self.alpha = alpha
         self.phi = phi
-        self.reference_size = self.reference_data.count()
-        self.current_size = self.current_data.count()
+        self.reference_size = (
+            reference_size if reference_size is not None else reference_data.count()
+        )
+        self.current_size = (
+            current_size if current_size is not None else current_data.count()
+        )
 
     @staticmethod
     def __eps45(n, delta) -> float:
@@ -0,0 +1,242 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from pyspark.sql import Column, DataFrame
+import pyspark.sql.functions as F
+
+from metrics.model_quality_multiclass_calculator import (
+    Confusions,
+    ModelQualityMulticlassCalculator,
+)
+from utils.models import ModelOut
+from utils.spark import is_not_null
+
+
+class BinaryState(BaseModel):
+    """Mergeable state of the binary grouped metrics of a time group"""
+
+    confusions: Confusions = dict()
+    # (score bin, label) -> number of rows
+    scores: Dict[Tuple[int, float], float] = dict()
+    log_loss_sum: float = 0.0
+    log_loss_count: int = 0
+
+    def log_loss(self) -> Optional[float]:
+        return self.log_loss_sum / self.log_loss_count if self.log_loss_count else None
+
+
+class ModelQualityBinaryCalculator:
+    """
+    Binary model quality metrics expressed as DataFrame aggregations, so that they can be computed
+    in a single job, globally or by time group.
+    """
+
+    confusion_matrix_metrics = [
+        "true_positive_count",
+        "false_positive_count",
+        "true_negative_count",
+        "false_negative_count",
+    ]
+
+    # Thresholds of the areas under the curves computed from mergeable state, as numBins of
+    # BinaryClassificationEvaluator
+    score_bins = 1000
+
+    @staticmethod
+    def log_loss(model: ModelOut, eps: float = 1e-15) -> Column:
+        """
+        Per-row log loss with the same definition of pyspark MulticlassMetrics.logLoss: the probability of the true
+        class is derived from prediction_proba, probabilities outside [eps, 1 - eps] are clipped.
+        The value is null for rows with a missing prediction, target or probability, so it can be averaged.
+        """
+        prediction = F.col(model.outputs.prediction.name)
+        target = F.col(model.target.name)
+        prediction_proba = F.col(model.outputs.prediction_proba.name)
+
+        proba_class0 = F.when(prediction == 0, prediction_proba).otherwise(
+            1 - prediction_proba
+        )
+        proba_class1 = F.when(prediction == 1, prediction_proba).otherwise(
+            1 - prediction_proba
+        )
+        proba_target = F.when(target == 1, proba_class1).otherwise(proba_class0)
+
+        return F.when(
+            is_not_null(model.outputs.prediction.name)
+            & is_not_null(model.target.name)
+            & is_not_null(model.outputs.prediction_proba.name),
+            F.when(proba_target < eps, -F.log(F.lit(eps)))
+            .when(proba_target > 1 - eps, -F.log1p(F.lit(-eps)))
+            .otherwise(-F.log(proba_target)),
+        )
+
+    @staticmethod
+    def confusion_matrix_agg(model: ModelOut) -> List[Column]:
+        prediction = F.col(model.outputs.prediction.name)
+        target = F.col(model.target.name)
+        not_null = is_not_null(model.outputs.prediction.name) & is_not_null(
+            model.target.name
+        )
+
+        def count_when(cond):
+            return F.count(F.when(not_null & cond, 1))
+
+        return [
+            count_when((prediction == 1) & (target == 1)).alias("true_positive_count"),
+            count_when((prediction == 1) & (target == 0)).alias("false_positive_count"),
+            count_when((prediction == 0) & (target == 0)).alias("true_negative_count"),
+            count_when((prediction == 0) & (target == 1)).alias("false_negative_count"),
+        ]
+
+    @staticmethod
+    def aggregated_metrics(model: ModelOut, dataframe: DataFrame) -> Dict:
+        """Confusion matrix counts and, when the model has prediction_proba, log_loss in one aggregation"""
+        aggregations = ModelQualityBinaryCalculator.confusion_matrix_agg(model)
+        if model.outputs.prediction_proba is not None:
+            aggregations.append(
+                F.avg(ModelQualityBinaryCalculator.log_loss(model)).alias("log_loss")
+            )
+        return dataframe.agg(*aggregations).collect()[0].asDict()
+
+    @staticmethod
+    def grouped_metric_names(model: ModelOut) -> List[str]:
+        names = [
+            "f1",
+            "accuracy",
+            "weighted_precision",
+            "weighted_recall",
+            "weighted_true_positive_rate",
+            "weighted_false_positive_rate",
+            "weighted_f_measure",
+        ] + ModelQualityMulticlassCalculator.by_label_metrics
+        if model.outputs.prediction_proba is not None:
+            names += ["area_under_roc", "area_under_pr", "log_loss"]
+        return names
+
+    @staticmethod
+    def state_by_group(
+        model: ModelOut, dataframe: DataFrame, group_column: str
+    ) -> Dict[Optional[int], BinaryState]:
+        """
+        Mergeable state of the grouped metrics of each group, computed in one aggregation: the confusion counts,
+        the counts of prediction_proba binned in score_bins by target, and sum and count of log loss.
+        """
+        target = model.target.name
+        prediction = model.outputs.prediction.name
+        has_proba = model.outputs.prediction_proba is not None
+        columns = [
+            F.col(group_column),
+            F.col(target),
+            F.when(is_not_null(prediction), F.col(prediction)).alias(prediction),
+        ]
+        aggregations = [F.count(F.lit(1)).alias("count")]
+        if has_proba:
+            score_bins = ModelQualityBinaryCalculator.score_bins
+            proba = F.col(model.outputs.prediction_proba.name)
+            columns.append(
+                F.when(
+                    is_not_null(model.outputs.prediction_proba.name),
+                    F.least(F.floor(proba * score_bins), F.lit(score_bins - 1)),
+                ).alias("score_bin")
+            )
+            columns.append(
+                ModelQualityBinaryCalculator.log_loss(model).alias("log_loss")
+            )
+            aggregations += [
+                F.sum("log_loss").alias("log_loss_sum"),
+                F.count("log_loss").alias("log_loss_count"),
+            ]
+        group_by = [group_column, target, prediction] + (
+            ["score_bin"] if has_proba else []
+        )
+        rows = (
+            dataframe.filter(is_not_null(target))
+            .select(*columns)
+            .groupBy(*group_by)
+            .agg(*aggregations)
+            .collect()
+        )
+
+        state_by_group = dict()
+        for row in rows:
+            state = state_by_group.setdefault(row[group_column], BinaryState())
+            if row[prediction] is not None:
+                key = (row[target], row[prediction])
+                state.confusions[key] = state.confusions.get(key, 0.0) + row["count"]
+            if has_proba and row["score_bin"] is not None:
+                key = (row["score_bin"], row[target])
+                state.scores[key] = state.scores.get(key, 0.0) + row["count"]
+                state.log_loss_sum += row["log_loss_sum"] or 0.0
+                state.log_loss_count += row["log_loss_count"]
+        return state_by_group
+
+    @staticmethod
+    def merge_states(states: List[BinaryState]) -> BinaryState:
+        scores = dict()
+        for state in states:
+            for key, count in state.scores.items():
+                scores[key] = scores.get(key, 0.0) + count
+        return BinaryState(
+            confusions=ModelQualityMulticlassCalculator.merge_confusions(
+                [state.confusions for state in states]
+            ),
+            scores=scores,
+            log_loss_sum=sum(state.log_loss_sum for state in states),
+            log_loss_count=sum(state.log_loss_count for state in states),
+        )
+
+    @staticmethod
+    def __areas_under_curves(
+        scores: Dict[Tuple[int, float], float],
+    ) -> Tuple[float, float]:
+        """
+        Areas under ROC and PR curves with the thresholds at the score bins, with the same curves of
+        BinaryClassificationMetrics: ROC from (0, 0) to (1, 1), PR starting from recall 0 with the first precision.
+        """
+        positives = sum(count for (_, label), count in scores.items() if label == 1.0)
+        negatives = sum(count for (_, label), count in scores.items() if label != 1.0)
+        if positives + negatives == 0:
+            return float("nan"), float("nan")
+
+        # as in BinaryClassificationMetrics, rates of a missing class are 0
+        true_positives = false_positives = 0.0
+        roc = [(0.0, 0.0)]
+        pr = []
+        for score_bin in sorted({score_bin for score_bin, _ in scores}, reverse=True):
+            true_positives += scores.get((score_bin, 1.0), 0.0)
+            false_positives += scores.get((score_bin, 0.0), 0.0)
+            recall = true_positives / positives if positives else 0.0
+            roc.append((false_positives / negatives if negatives else 0.0, recall))
+            pr.append((recall, true_positives / (true_positives + false_positives)))
+        roc.append((1.0, 1.0))
+        pr.insert(0, (0.0, pr[0][1]))
+
+        def trapezoid(points: List[Tuple[float, float]]) -> float:
+            return math.fsum(
+                (x2 - x1) * (y1 + y2) / 2.0
+                for (x1, y1), (x2, y2) in zip(points, points[1:])
+            )
+
+        return trapezoid(roc), trapezoid(pr)
+
+    @staticmethod
+    def grouped_metrics(model: ModelOut, state: BinaryState) -> Dict[str, float]:
+        """Grouped metrics of a state, with the definitions of the evaluators used on each group"""
+        if state.confusions:
+            metrics = ModelQualityMulticlassCalculator.global_metrics(state.confusions)
+            metrics.update(
+                ModelQualityMulticlassCalculator.label_metrics(state.confusions, 1.0)
+            )
+        else:
+            metrics = {
+                name: float("nan")
+                for name in ModelQualityBinaryCalculator.grouped_metric_names(model)
+            }
+        if model.outputs.prediction_proba is not None:
+            (
+                metrics["area_under_roc"],
+                metrics["area_under_pr"],
+            ) = ModelQualityBinaryCalculator.__areas_under_curves(state.scores)
+            metrics["log_loss"] = state.log_loss()
+        return metrics
@@ -0,0 +1,155 @@
+import math
+from typing import Dict, List, Optional, Tuple
+
+from pyspark.sql import DataFrame
+import pyspark.sql.functions as F
+
+# (label, prediction) -> number of rows
+Confusions = Dict[Tuple[float, float], float]
+
+
+class ModelQualityMulticlassCalculator:
+    """
+    Derives the multiclass model quality metrics from confusion counts, following the same definitions of
+    pyspark MulticlassMetrics, so that a single aggregation replaces one evaluator job per metric and class.
+    """
+
+    by_label_metrics = [
+        "true_positive_rate",
+        "false_positive_rate",
+        "precision",
+        "recall",
+        "f_measure",
+    ]
+
+    @staticmethod
+    def confusion_counts_by_group(
+        dataframe: DataFrame,
+        prediction_column: str,
+        target_column: str,
+        group_column: Optional[str] = None,
+    ) -> Dict[Optional[str], Confusions]:
+        """
+        Counts the rows of each (group, label, prediction) in one aggregation.
+        Without group_column all counts are under the None key.
+        """
+        group_by = [group_column] if group_column else []
+        rows = (
+            dataframe.groupBy(*group_by, target_column, prediction_column)
+            .agg(F.count(F.lit(1)).alias("count"))
+            .collect()
+        )
+        confusions_by_group = dict()
+        for row in rows:
+            group = row[group_column] if group_column else None
+            confusions_by_group.setdefault(group, dict())[
+                (row[target_column], row[prediction_column])
+            ] = float(row["count"])
+        return confusions_by_group
+
+    @staticmethod
+    def merge_confusions(confusions_list: List[Confusions]) -> Confusions:
+        merged = dict()
+        for confusions in confusions_list:
+            for key, count in confusions.items():
+                merged[key] = merged.get(key, 0.0) + count
+        return merged
+
+    @staticmethod
+    def __counts(
+        confusions: Confusions,
+    ) -> Tuple[Dict[float, float], Dict[float, float], Dict[float, float], float]:
+        label_count_by_class = dict()
+        tp_by_class = dict()
+        fp_by_class = dict()
+        for (label, prediction), count in confusions.items():
+            label_count_by_class[label] = label_count_by_class.get(label, 0.0) + count
+            tp_by_class[label] = tp_by_class.get(label, 0.0) + (
+                count if label == prediction else 0.0
+            )
+            fp_by_class[prediction] = fp_by_class.get(prediction, 0.0) + (
+                count if label != prediction else 0.0
+            )
+        label_count = sum(label_count_by_class.values())
+        return label_count_by_class, tp_by_class, fp_by_class, label_count
+
+    @staticmethod
+    def __divide(numerator: float, denominator: float) -> float:
+        return numerator / denominator if denominator != 0 else float("nan")
+
+    @staticmethod
+    def __label_metrics(
+        label: float,
+        label_count_by_class: Dict[float, float],
+        tp_by_class: Dict[float, float],
+        fp_by_class: Dict[float, float],
+        label_count: float,
+    ) -> Dict[str, float]:
+        # As in MulticlassMetrics, metrics of a class that is never a true label are undefined
+        if label not in label_count_by_class:
+            return {
+                metric: float("nan")
+                for metric in ModelQualityMulticlassCalculator.by_label_metrics
+            }
+        tp = tp_by_class[label]
+        fp = fp_by_class.get(label, 0.0)
+        precision = 0.0 if tp + fp == 0 else tp / (tp + fp)
+        recall = tp / label_count_by_class[label]
+        f_measure = (
+            0.0
+            if precision + recall == 0
+            else 2.0 * precision * recall / (precision + recall)
+        )
+        return {
+            "true_positive_rate": recall,
+            "false_positive_rate": ModelQualityMulticlassCalculator.__divide(
+                fp, label_count - label_count_by_class[label]
+            ),
+            "precision": precision,
+            "recall": recall,
+            "f_measure": f_measure,
+        }
+
+    @staticmethod
+    def label_metrics(confusions: Confusions, label: float) -> Dict[str, float]:
+        return ModelQualityMulticlassCalculator.__label_metrics(
+            label, *ModelQualityMulticlassCalculator.__counts(confusions)
+        )
+
+    @staticmethod
+    def global_metrics(confusions: Confusions) -> Dict[str, float]:
+        counts = ModelQualityMulticlassCalculator.__counts(confusions)
+        label_count_by_class, tp_by_class, _, label_count = counts
+        metrics_by_class = {
+            label: ModelQualityMulticlassCalculator.__label_metrics(label, *counts)
+            for label in label_count_by_class
+        }
+
+        # fsum is exactly rounded, so results do not depend on the order rows are collected
+        def weighted(metric: str) -> float:
+            return math.fsum(
+                metrics_by_class[label][metric] * count / label_count
+                for label, count in label_count_by_class.items()
+            )
+
+        weighted_f_measure = weighted("f_measure")
+        return {
+            "f1": weighted_f_measure,
+            "accuracy": ModelQualityMulticlassCalculator.__divide(
+                sum(tp_by_class.values()), label_count
+            ),
+            "weighted_precision": weighted("precision"),
+            "weighted_recall": weighted("recall"),
+            "weighted_true_positive_rate": weighted("true_positive_rate"),
+            "weighted_false_positive_rate": weighted("false_positive_rate"),
+            "weighted_f_measure": weighted_f_measure,
+        }
+
+    @staticmethod
+    def confusion_matrix(confusions: Confusions) -> List[List[float]]:
+        """Rows are true labels and columns predictions, over the sorted labels seen as true labels"""
+        labels = sorted({label for label, _ in confusions})
+        return [
+            [confusions.get((label, prediction), 0.0) for prediction in labels]
+            for label in labels
+        ]
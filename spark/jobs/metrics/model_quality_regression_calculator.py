@@ -1,3 +1,6 @@
+import math
+from typing import Dict, List, Optional
+
 import numpy as np
 from math import inf
 
@@ -13,9 +16,10 @@ from models.regression_model_quality import (
     ModelQualityRegression,
     Histogram,
 )
+from utils.guardrails import Guardrails
 from utils.models import ModelOut
 from pyspark.ml.evaluation import RegressionEvaluator
-from utils.spark import is_not_null
+from utils.spark import collect_column, collect_columns, is_not_null
 from utils.misc import rbit_prefix
 
 
@@ -101,13 +105,17 @@ class ModelQualityRegressionCalculator:
 
     @staticmethod
     def numerical_metrics(
-        model: ModelOut, dataframe: DataFrame, dataframe_count: int
+        model: ModelOut,
+        dataframe: DataFrame,
+        dataframe_count: int,
+        dataframe_clean_count: Optional[int] = None,
     ) -> ModelQualityRegression:
         # # drop row where prediction or ground_truth is null
         dataframe_clean = dataframe.filter(
             is_not_null(model.outputs.prediction.name) & is_not_null(model.target.name)
         )
-        dataframe_clean_count = dataframe_clean.count()
+        if dataframe_clean_count is None:
+            dataframe_clean_count = dataframe_clean.count()
         return ModelQualityRegressionCalculator.__calc_mq_metrics(
             model, dataframe_clean, dataframe_clean_count
         )
@@ -186,7 +194,7 @@ class ModelQualityRegressionCalculator:
         # workaround if all values are the same to not have errors
         if len(generated_buckets) == 1:
             result_df = result_df.filter(F.col("bucket") == 1)
-        res = result_df.select("value_count").rdd.flatMap(lambda x: x).collect()
+        res = collect_column(result_df, "value_count").tolist()
         return Histogram(buckets=buckets_spacing, values=res)
 
     @staticmethod
@@ -218,13 +226,39 @@ class ModelQualityRegressionCalculator:
         return {"coefficient": float(c), "intercept": float(i)}
 
     @staticmethod
-    def residual_metrics(model: ModelOut, dataframe: DataFrame):
+    def residual_metrics(
+        model: ModelOut,
+        dataframe: DataFrame,
+        dataframe_clean_count: Optional[int] = None,
+        guardrails: Optional[Guardrails] = None,
+    ):
+        """
+        With guardrails, the per-row series of the dataframe_clean_count rows with prediction and target are
+        collected from a sample of at most its max_collected_rows, the other metrics being computed on all of them
+        """
         residual_df_norm = ModelQualityRegressionCalculator.residual_calculation(
             model, dataframe
         )
         ks_result = KolmogorovSmirnovTest.test(
             residual_df_norm, f"{rbit_prefix}_residual", "norm", 0.0, 1.0
         ).first()
+        series_df = residual_df_norm
+        if guardrails is not None and dataframe_clean_count is not None:
+            series_df = guardrails.sample_rows(
+                residual_df_norm,
+                dataframe_clean_count,
+                "MODEL_QUALITY",
+                "standardized_residuals, predictions and targets",
+            )
+        # the series are collected together, aligned by row
+        series = collect_columns(
+            series_df,
+            [
+                f"{rbit_prefix}_std_residual",
+                model.outputs.prediction.name,
+                model.target.name,
+            ],
+        )
         return {
             "ks": {
                 "p_value": ks_result.pValue,
@@ -236,18 +270,96 @@ class ModelQualityRegressionCalculator:
             "histogram": ModelQualityRegressionCalculator.create_histogram(
                 residual_df_norm, f"{rbit_prefix}_residual"
             ).model_dump(serialize_as_any=True),
-            "standardized_residuals": residual_df_norm.select(
-                f"{rbit_prefix}_std_residual"
-            )
-            .rdd.flatMap(lambda x: x)
-            .collect(),
-            "predictions": residual_df_norm.select(model.outputs.prediction.name)
-            .rdd.flatMap(lambda x: x)
-            .collect(),
-            "targets": residual_df_norm.select(model.target.name)
-            .rdd.flatMap(lambda x: x)
-            .collect(),
+            "standardized_residuals": series[f"{rbit_prefix}_std_residual"].tolist(),
+            "predictions": series[model.outputs.prediction.name].tolist(),
+            "targets": series[model.target.name].tolist(),
             "regression_line": ModelQualityRegressionCalculator.get_regression_line(
                 model, dataframe
             ),
         }
+
+    @staticmethod
+    def state_by_group(
+        model: ModelOut, dataframe: DataFrame, group_column: str
+    ) -> Dict[Optional[int], Dict[str, float]]:
+        """
+        Mergeable state of the model quality metrics of each group, computed in one aggregation:
+        the sums every metric is derived from
+        """
+        # prediction is cast to float as in eval_model_quality_metric
+        prediction = F.col(model.outputs.prediction.name).cast("float")
+        target = F.col(model.target.name).cast("double")
+        error = target - prediction
+        absolute_percentage_error = F.abs((prediction - target) / target)
+        rows = (
+            dataframe.filter(
+                is_not_null(model.outputs.prediction.name)
+                & is_not_null(model.target.name)
+            )
+            .groupBy(group_column)
+            .agg(
+                F.count(F.lit(1)).alias("count"),
+                F.sum(target).alias("target_sum"),
+                F.sum(target * target).alias("target_squared_sum"),
+                F.sum(prediction).alias("prediction_sum"),
+                F.sum(prediction * prediction).alias("prediction_squared_sum"),
+                F.sum(F.abs(error)).alias("absolute_error_sum"),
+                F.sum(error * error).alias("squared_error_sum"),
+                F.sum(absolute_percentage_error).alias("percentage_error_sum"),
+                F.count(absolute_percentage_error).alias("percentage_error_count"),
+            )
+            .collect()
+        )
+        return {
+            row[group_column]: {
+                name: float(value or 0.0)
+                for name, value in row.asDict().items()
+                if name != group_column
+            }
+            for row in rows
+        }
+
+    @staticmethod
+    def merge_states(states: List[Dict[str, float]]) -> Dict[str, float]:
+        merged = dict()
+        for state in states:
+            for name, value in state.items():
+                merged[name] = merged.get(name, 0.0) + value
+        return merged
+
+    @staticmethod
+    def grouped_metrics(model: ModelOut, state: Dict[str, float]) -> Dict[str, float]:
+        """Model quality metrics of a state, with the definitions of eval_model_quality_metric"""
+
+        def divide(numerator: float, denominator: float) -> float:
+            return numerator / denominator if denominator != 0 else float("nan")
+
+        n = state.get("count", 0.0)
+        target_mean = divide(state.get("target_sum", 0.0), n)
+        mse = divide(state.get("squared_error_sum", 0.0), n)
+        r2 = 1 - divide(
+            state.get("squared_error_sum", 0.0),
+            state.get("target_squared_sum", 0.0) - n * target_mean * target_mean,
+        )
+        p = len(model.features)
+        return {
+            RegressionMetricType.MAE.value: divide(
+                state.get("absolute_error_sum", 0.0), n
+            ),
+            RegressionMetricType.MAPE.value: divide(
+                state.get("percentage_error_sum", 0.0),
+                state.get("percentage_error_count", 0.0),
+            )
+            * 100,
+            RegressionMetricType.MSE.value: mse,
+            RegressionMetricType.RMSE.value: math.sqrt(mse),
+            RegressionMetricType.R2.value: r2,
+            RegressionMetricType.ADJ_R2.value: 1 - (1 - r2) * divide(n - 1, n - p - 1),
+            # explained variance: sum of (prediction - target mean)^2 over n
+            RegressionMetricType.VAR.value: divide(
+                state.get("prediction_squared_sum", 0.0)
+                - 2 * target_mean * state.get("prediction_sum", 0.0)
+                + n * target_mean * target_mean,
+                n,
+            ),
+        }
@@ -4,6 +4,7 @@ import pyspark.sql.functions as F
 from pyspark.ml.feature import Bucketizer
 from pyspark.sql.types import IntegerType
 from utils.misc import rbit_prefix
+from utils.spark import collect_column, collect_columns
 
 
 class PSI:
@@ -70,12 +71,12 @@ class PSI:
             )
         ).collect()[0][0]
 
-        distinct_features = (
-            reference_and_current.select(feature).distinct().orderBy(feature)
-        )
-        dist_cnt = distinct_features.count()
-        if dist_cnt < 10:
-            buckets_spacing = distinct_features.rdd.flatMap(lambda x: x).collect()
+        # at most 10 distinct values are collected, the buckets are the values when there are fewer
+        distinct_values = collect_column(
+            reference_and_current.select(feature).distinct().orderBy(feature).limit(10)
+        ).tolist()
+        if len(distinct_values) < 10:
+            buckets_spacing = distinct_values
             buckets_spacing.append(buckets_spacing[-1] + 1)
         else:
             buckets_spacing = np.linspace(min_value, max_value, 11).tolist()
@@ -118,8 +119,9 @@ class PSI:
         # workaround if all values are the same to not have errors
         if len(generated_buckets) == 1:
             tot_df = tot_df.filter(F.col("bucket") == 1)
-        current_hist = tot_df.select("curr_count").rdd.flatMap(lambda x: x).collect()
-        reference_hist = tot_df.select("ref_count").rdd.flatMap(lambda x: x).collect()
+        hists = collect_columns(tot_df, ["curr_count", "ref_count"])
+        current_hist = hists["curr_count"].tolist()
+        reference_hist = hists["ref_count"].tolist()
         current_fractions = [x / sum(current_hist) for x in current_hist]
         reference_fractions = [x / sum(reference_hist) for x in reference_hist]
 
@@ -1,8 +1,12 @@
+from typing import List, Optional
+
 from models.current_dataset import CurrentDataset
 from models.reference_dataset import ReferenceDataset
+from pyspark.sql import DataFrame
 import pyspark.sql.functions as F
 
 from models.statistics import Statistics
+from utils.job_config import DuplicateRowsMode
 
 N_VARIABLES = "n_variables"
 N_OBSERVATION = "n_observations"
@@ -14,11 +18,45 @@ NUMERIC = "numeric"
 CATEGORICAL = "categorical"
 DATETIME = "datetime"
 
+# Largest HLL sketch (2^21 registers), its error is relative to the distinct rows and not to the duplicates
+DUPLICATE_ROWS_LG_CONFIG_K = 21
+
+
+def duplicate_rows(
+    dataframe: DataFrame,
+    columns: List[str],
+    dataframe_count: int,
+    mode: DuplicateRowsMode = DuplicateRowsMode.EXACT,
+) -> int:
+    """
+    Number of rows that duplicate another one on columns.
+    HASH and SKETCH modes count the distinct xxhash64 of the rows, so only a 64 bit key per row is shuffled, or
+    none at all when the distinct keys are estimated by a HLL sketch.
+    """
+    if mode == DuplicateRowsMode.EXACT:
+        return dataframe_count - dataframe.dropDuplicates(columns).count()
+
+    # xxhash64 skips null values, null flags keep rows with nulls in different columns apart
+    row_hash = F.xxhash64(*columns, *[F.col(c).isNull() for c in columns])
+    distinct_rows = (
+        F.count_distinct(row_hash)
+        if mode == DuplicateRowsMode.HASH
+        else F.hll_sketch_estimate(
+            F.hll_sketch_agg(row_hash, DUPLICATE_ROWS_LG_CONFIG_K)
+        )
+    )
+    return max(dataframe_count - dataframe.agg(distinct_rows).collect()[0][0], 0)
+
+
+def percentage(count: int, total: int) -> Optional[float]:
+    return count / total * 100 if total else None
+
 
 # FIXME use pydantic struct like data quality
 # FIXME generalize to one method
 def calculate_statistics_reference(
     reference_dataset: ReferenceDataset,
+    duplicate_rows_mode: DuplicateRowsMode = DuplicateRowsMode.EXACT,
 ) -> Statistics:
     number_of_variables = len(reference_dataset.get_all_variables())
     number_of_observations = reference_dataset.reference_count
@@ -27,65 +65,34 @@ def calculate_statistics_reference(
     number_of_datetime = len(reference_dataset.get_datetime_variables())
     reference_columns = reference_dataset.reference.columns
 
-    stats = (
-        reference_dataset.reference.select(
-            [
-                F.count(F.when(F.isnan(c) | F.col(c).isNull(), c)).alias(c)
-                if t not in ("datetime", "date", "timestamp", "bool", "boolean")
-                else F.count(F.when(F.col(c).isNull(), c)).alias(c)
-                for c, t in reference_dataset.reference.dtypes
-            ]
-        )
-        .withColumn(MISSING_CELLS, sum([F.col(c) for c in reference_columns]))
-        .withColumn(
-            MISSING_CELLS_PERC,
-            (F.col(MISSING_CELLS) / (number_of_variables * number_of_observations))
-            * 100,
-        )
-        .withColumn(
-            DUPLICATE_ROWS,
-            F.lit(
-                number_of_observations
-                - reference_dataset.reference.dropDuplicates(
-                    [
-                        c
-                        for c in reference_columns
-                        if c != reference_dataset.model.timestamp.name
-                    ]
-                ).count()
-            ),
-        )
-        .withColumn(
-            DUPLICATE_ROWS_PERC,
-            (F.col(DUPLICATE_ROWS) / number_of_observations) * 100,
-        )
-        .withColumn(N_VARIABLES, F.lit(number_of_variables))
-        .withColumn(N_OBSERVATION, F.lit(number_of_observations))
-        .withColumn(NUMERIC, F.lit(number_of_numerical))
-        .withColumn(CATEGORICAL, F.lit(number_of_categorical))
-        .withColumn(DATETIME, F.lit(number_of_datetime))
-        .select(
-            *[
-                MISSING_CELLS,
-                MISSING_CELLS_PERC,
-                DUPLICATE_ROWS,
-                DUPLICATE_ROWS_PERC,
-                N_VARIABLES,
-                N_OBSERVATION,
-                NUMERIC,
-                CATEGORICAL,
-                DATETIME,
-            ]
-        )
-        .toPandas()
-        .to_dict(orient="records")[0]
+    missing_cells = sum(reference_dataset.counts.missing(c) for c in reference_columns)
+    number_of_duplicate_rows = duplicate_rows(
+        reference_dataset.reference,
+        [c for c in reference_columns if c != reference_dataset.model.timestamp.name],
+        number_of_observations,
+        duplicate_rows_mode,
     )
 
-    return Statistics(**stats)
+    return Statistics(
+        n_variables=number_of_variables,
+        n_observations=number_of_observations,
+        missing_cells=missing_cells,
+        missing_cells_perc=percentage(
+            missing_cells, number_of_variables * number_of_observations
+        ),
+        duplicate_rows=number_of_duplicate_rows,
+        duplicate_rows_perc=percentage(
+            number_of_duplicate_rows, number_of_observations
+        ),
+        numeric=number_of_numerical,
+        categorical=number_of_categorical,
+        datetime=number_of_datetime,
+    )
 
 
 def calculate_statistics_current(
     current_dataset: CurrentDataset,
+    duplicate_rows_mode: DuplicateRowsMode = DuplicateRowsMode.EXACT,
 ) -> Statistics:
     number_of_variables = len(current_dataset.get_all_variables())
     number_of_observations = current_dataset.current_count
@@ -94,58 +101,26 @@ def calculate_statistics_current(
     number_of_datetime = len(current_dataset.get_datetime_variables())
     reference_columns = current_dataset.current.columns
 
-    stats = (
-        current_dataset.current.select(
-            [
-                F.count(F.when(F.isnan(c) | F.col(c).isNull(), c)).alias(c)
-                if t not in ("datetime", "date", "timestamp", "bool", "boolean")
-                else F.count(F.when(F.col(c).isNull(), c)).alias(c)
-                for c, t in current_dataset.current.dtypes
-            ]
-        )
-        .withColumn(MISSING_CELLS, sum([F.col(c) for c in reference_columns]))
-        .withColumn(
-            MISSING_CELLS_PERC,
-            (F.col(MISSING_CELLS) / (number_of_variables * number_of_observations))
-            * 100,
-        )
-        .withColumn(
-            DUPLICATE_ROWS,
-            F.lit(
-                number_of_observations
-                - current_dataset.current.dropDuplicates(
-                    [
-                        c
-                        for c in reference_columns
-                        if c != current_dataset.model.timestamp.name
-                    ]
-                ).count()
-            ),
-        )
-        .withColumn(
-            DUPLICATE_ROWS_PERC,
-            (F.col(DUPLICATE_ROWS) / number_of_observations) * 100,
-        )
-        .withColumn(N_VARIABLES, F.lit(number_of_variables))
-        .withColumn(N_OBSERVATION, F.lit(number_of_observations))
-        .withColumn(NUMERIC, F.lit(number_of_numerical))
-        .withColumn(CATEGORICAL, F.lit(number_of_categorical))
-        .withColumn(DATETIME, F.lit(number_of_datetime))
-        .select(
-            *[
-                MISSING_CELLS,
-                MISSING_CELLS_PERC,
-                DUPLICATE_ROWS,
-                DUPLICATE_ROWS_PERC,
-                N_VARIABLES,
-                N_OBSERVATION,
-                NUMERIC,
-                CATEGORICAL,
-                DATETIME,
-            ]
-        )
-        .toPandas()
-        .to_dict(orient="records")[0]
+    missing_cells = sum(current_dataset.counts.missing(c) for c in reference_columns)
+    number_of_duplicate_rows = duplicate_rows(
+        current_dataset.current,
+        [c for c in reference_columns if c != current_dataset.model.timestamp.name],
+        number_of_observations,
+        duplicate_rows_mode,
     )
 
-    return Statistics(**stats)
+    return Statistics(
+        n_variables=number_of_variables,
+        n_observations=number_of_observations,
+        missing_cells=missing_cells,
+        missing_cells_perc=percentage(
+            missing_cells, number_of_variables * number_of_observations
+        ),
+        duplicate_rows=number_of_duplicate_rows,
+        duplicate_rows_perc=percentage(
+            number_of_duplicate_rows, number_of_observations
+        ),
+        numeric=number_of_numerical,
+        categorical=number_of_categorical,
+        datetime=number_of_datetime,
+    )
@@ -1,26 +1,89 @@
-from typing import List
+import copy
+from typing import Dict, List, Optional
 
 from pyspark.sql import DataFrame
-from pyspark.sql.types import DoubleType, StructField, StructType
 import pyspark.sql.functions as F
-from pyspark.sql.window import Window
+from pyspark.sql.types import DoubleType, StructField, StructType
 
 from models.reference_dataset import ReferenceDataset
+from models.dataset_counts import DatasetCounts
+from utils.guardrails import Guardrails
+from utils.misc import finest_granularity, time_bucket, time_group_column
 from utils.models import ModelOut, ModelType, ColumnDefinition
-from utils.spark import apply_schema_to_dataframe
-from utils.misc import rbit_prefix
+from utils.spark import (
+    apply_schema_to_dataframe,
+    count_with_cast_failures,
+    index_classes,
+)
 
 
 class CurrentDataset:
-    def __init__(self, model: ModelOut, raw_dataframe: DataFrame):
+    def __init__(
+        self,
+        model: ModelOut,
+        raw_dataframe: DataFrame,
+        cast_failures_report: bool = False,
+    ):
         current_schema = self.spark_schema(model)
-        current_dataset = apply_schema_to_dataframe(raw_dataframe, current_schema)
 
         self.model = model
-        self.current = current_dataset.select(
-            *[c for c in current_schema.names if c in current_dataset.columns]
+        self.current = apply_schema_to_dataframe(raw_dataframe, current_schema)
+        # values of every column that could not be cast to the model type, when cast_failures_report
+        self.cast_failures: Optional[Dict[str, int]] = None
+        total = None
+        if cast_failures_report:
+            total, self.cast_failures = count_with_cast_failures(
+                raw_dataframe, current_schema
+            )
+        self.counts = DatasetCounts(self.current, model, total)
+
+    @property
+    def current_count(self) -> int:
+        return self.counts.total
+
+    def sample(self, dataframe: DataFrame) -> "CurrentDataset":
+        """
+        Current dataset of dataframe, a sample of the typed current, with the same model and cast failures. The
+        sample is already typed, so the schema is not applied again.
+        """
+        sample = copy.copy(self)
+        sample.current = dataframe
+        sample.counts = DatasetCounts(dataframe, self.model)
+        return sample
+
+    def partition_by_time_bucket(self) -> Dict[int, Dict[str, int]]:
+        """
+        Repartitions the current by the time bucket of the finest granularity the grouped metrics are aggregated
+        at, sorted by timestamp within the partitions, and caches it. The rows of every bucket are in the same
+        partition, so the aggregations grouped by that time_bucket are planned without shuffling the dataset
+        again, and the filters of single buckets scan the cache instead of the source.
+        Returns the partitions and the rows of every bucket, counted by the job that fills the cache.
+        """
+        bucket = time_bucket(
+            self.model.timestamp.name, finest_granularity(self.model.granularity)
+        )
+        self.current = (
+            self.current.repartition(bucket)
+            .sortWithinPartitions(self.model.timestamp.name)
+            .cache()
         )
-        self.current_count = self.current.count()
+        self.counts.dataframe = self.current
+        return {
+            row[time_group_column]: {
+                "partitions": row["partitions"],
+                "rows": row["rows"],
+            }
+            for row in self.current.select(
+                bucket.alias(time_group_column),
+                F.spark_partition_id().alias("partition"),
+            )
+            .groupBy(time_group_column)
+            .agg(
+                F.countDistinct("partition").alias("partitions"),
+                F.count(F.lit(1)).alias("rows"),
+            )
+            .collect()
+        }
 
     # FIXME this must exclude target when we will have separate current and ground truth
     @staticmethod
@@ -106,71 +169,19 @@ class CurrentDataset:
             + self.model.outputs.output
         )
 
-    def get_string_indexed_dataframe(self, reference: ReferenceDataset):
+    def get_string_indexed_dataframe(
+        self, reference: ReferenceDataset, guardrails: Optional[Guardrails] = None
+    ):
         """
-        Source: https://stackoverflow.com/questions/65911146/how-to-transform-multiple-categorical-columns-to-integers-maintaining-shared-val
-        Current dataset will be indexed with columns from both reference and current in order to have complete data
+        Current dataset will be indexed with columns from both reference and current in order to have complete data,
+        the classes of the reference being shared with its own index
         """
-        predictions_df_current = self.current.select(
-            self.model.outputs.prediction.name
-        ).withColumnRenamed(self.model.outputs.prediction.name, "classes")
-        target_df_current = self.current.select(
-            self.model.target.name
-        ).withColumnRenamed(self.model.target.name, "classes")
-        predictions_df_reference = reference.reference.select(
-            self.model.outputs.prediction.name
-        ).withColumnRenamed(self.model.outputs.prediction.name, "classes")
-        target_df_reference = reference.reference.select(
-            self.model.target.name
-        ).withColumnRenamed(self.model.target.name, "classes")
-        prediction_target_df = (
-            predictions_df_current.union(target_df_current)
-            .union(predictions_df_reference)
-            .union(target_df_reference)
-        ).dropna()
-        classes_index_df = (
-            prediction_target_df.select("classes")
-            .distinct()
-            .withColumn(
-                "classes_index",
-                (
-                    F.row_number().over(
-                        Window.partitionBy(F.lit("A")).orderBy("classes")
-                    )
-                    - 1
-                ).cast(DoubleType()),
-            )
-        )
-        indexed_prediction_df = (
-            self.current.join(
-                classes_index_df,
-                self.current[self.model.outputs.prediction.name]
-                == classes_index_df["classes"],
-                how="inner",
-            )
-            .withColumnRenamed(
-                "classes_index",
-                f"{rbit_prefix}_{self.model.outputs.prediction.name}-idx",
-            )
-            .drop("classes")
+        guardrails = guardrails or Guardrails()
+        columns = [self.model.outputs.prediction.name, self.model.target.name]
+        return index_classes(
+            dataframe=self.current,
+            columns=columns,
+            classes=guardrails.classes(
+                self.current, columns, known=reference.classes(guardrails)
+            ),
         )
-        indexed_target_df = (
-            indexed_prediction_df.join(
-                classes_index_df,
-                indexed_prediction_df[self.model.target.name]
-                == classes_index_df["classes"],
-                how="inner",
-            )
-            .withColumnRenamed(
-                "classes_index", f"{rbit_prefix}_{self.model.target.name}-idx"
-            )
-            .drop("classes")
-        )
-
-        index_label_map = {
-            str(float(row.__getitem__("classes_index"))): str(
-                row.__getitem__("classes")
-            )
-            for row in classes_index_df.collect()
-        }
-        return index_label_map, indexed_target_df
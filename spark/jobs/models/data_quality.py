@@ -7,6 +7,8 @@ class MedianMetrics(BaseModel):
     perc_25: float
     median: float
     perc_75: float
+    # Relative error of approximate percentiles, None when they are exact
+    relative_error: Optional[float] = None
 
     model_config = ConfigDict(ser_json_inf_nan="null")
 
@@ -58,6 +60,8 @@ class NumericalFeatureMetrics(FeatureMetrics):
         feature_name: str,
         global_dict: Dict,
         histogram: Histogram,
+        relative_error: Optional[float] = None,
+        class_median_metrics: Optional[List[ClassMedianMetrics]] = None,
     ) -> "NumericalFeatureMetrics":
         return NumericalFeatureMetrics(
             feature_name=feature_name,
@@ -73,8 +77,9 @@ class NumericalFeatureMetrics(FeatureMetrics):
                 median=global_dict.get("median"),
                 perc_25=global_dict.get("perc_25"),
                 perc_75=global_dict.get("perc_75"),
+                relative_error=relative_error,
             ),
-            class_median_metrics=[],
+            class_median_metrics=class_median_metrics or [],
             histogram=histogram,
         )
 
@@ -96,6 +101,7 @@ class NumericalTargetMetrics(FeatureMetrics):
         feature_name: str,
         global_dict: Dict,
         histogram: Histogram,
+        relative_error: Optional[float] = None,
     ) -> "NumericalTargetMetrics":
         return NumericalTargetMetrics(
             feature_name=feature_name,
@@ -111,6 +117,7 @@ class NumericalTargetMetrics(FeatureMetrics):
                 median=global_dict.get("median"),
                 perc_25=global_dict.get("perc_25"),
                 perc_75=global_dict.get("perc_75"),
+                relative_error=relative_error,
             ),
             histogram=histogram,
         )
@@ -124,16 +131,34 @@ class CategoryFrequency(BaseModel):
     model_config = ConfigDict(ser_json_inf_nan="null")
 
 
+# Categories aggregated out of the most frequent ones
+class OtherCategories(BaseModel):
+    categories: int
+    count: int
+    frequency: float
+
+    model_config = ConfigDict(ser_json_inf_nan="null")
+
+
 class CategoricalFeatureMetrics(FeatureMetrics):
     type: str = "categorical"
     category_frequency: List[CategoryFrequency]
     distinct_value: int
+    # Base64 HLL sketch of the distinct values, when they are approximate
+    distinct_sketch: Optional[str] = None
+    # Estimated number of categories not in the reference
+    new_categories: Optional[int] = None
+    other_categories: Optional[OtherCategories] = None
 
     model_config = ConfigDict(ser_json_inf_nan="null")
 
     @classmethod
     def from_dict(
-        cls, feature_name: str, global_metrics: Dict, categories_metrics: Dict
+        cls,
+        feature_name: str,
+        global_metrics: Dict,
+        categories_metrics: Dict,
+        other_categories: Optional[OtherCategories] = None,
     ) -> "CategoricalFeatureMetrics":
         count: Dict = categories_metrics.get("count")
         freq: Dict = categories_metrics.get("freq")
@@ -144,6 +169,9 @@ class CategoricalFeatureMetrics(FeatureMetrics):
                 percentage=global_metrics.get("missing_values_perc"),
             ),
             distinct_value=global_metrics.get("distinct_values"),
+            distinct_sketch=global_metrics.get("distinct_sketch"),
+            new_categories=global_metrics.get("new_categories"),
+            other_categories=other_categories,
             category_frequency=[
                 CategoryFrequency(
                     name=str(k), count=count.get(k), frequency=freq.get(k)
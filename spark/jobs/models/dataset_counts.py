@@ -0,0 +1,76 @@
+import threading
+from typing import Dict, Optional
+
+from pyspark.sql import Column, DataFrame
+import pyspark.sql.functions as F
+
+from utils.misc import rbit_prefix
+from utils.models import ModelOut
+from utils.spark import chunked_agg, is_not_null
+
+
+class DatasetCounts:
+    """
+    Row counts of a dataset shared by all the metrics: the total rows, the missing values of every column and the
+    clean pairs, rows where both prediction and target are not null.
+    They are all computed lazily by the same aggregation, the first time one of them is needed, and reused by
+    every later consumer. The statistics are computed from this aggregation, so when they run first, as they do
+    without parallel stages, the later consumers find the counts already computed. Stages running concurrently
+    wait for the same aggregation.
+    """
+
+    total_column = f"{rbit_prefix}_total"
+    clean_pairs_column = f"{rbit_prefix}_clean_pairs"
+
+    def __init__(
+        self, dataframe: DataFrame, model: ModelOut, total: Optional[int] = None
+    ):
+        self.dataframe = dataframe
+        self.model = model
+        self.__total = total
+        self.__counts: Optional[Dict[str, int]] = None
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def missing_values(column: str, data_type: str) -> Column:
+        # NaN is missing for all the columns but datetime and boolean ones, as in the statistics
+        if data_type in ("datetime", "date", "timestamp", "bool", "boolean"):
+            return F.count(F.when(F.col(column).isNull(), 1))
+        return F.count(F.when(F.col(column).isNull() | F.isnan(column), 1))
+
+    def __compute(self) -> Dict[str, int]:
+        with self.__lock:
+            if self.__counts is None:
+                prediction = self.model.outputs.prediction.name
+                target = self.model.target.name
+                counts = chunked_agg(
+                    self.dataframe,
+                    [
+                        F.count(F.lit(1)).alias(self.total_column),
+                        F.count(
+                            F.when(is_not_null(prediction) & is_not_null(target), 1)
+                        ).alias(self.clean_pairs_column),
+                    ]
+                    + [
+                        self.missing_values(column, data_type).alias(column)
+                        for column, data_type in self.dataframe.dtypes
+                    ],
+                )
+                self.__counts = {name: int(count) for name, count in counts.items()}
+            return self.__counts
+
+    @property
+    def total(self) -> int:
+        if self.__total is None:
+            self.__total = self.__compute()[self.total_column]
+        return self.__total
+
+    @property
+    def clean_pairs(self) -> int:
+        return self.__compute()[self.clean_pairs_column]
+
+    def missing(self, column: str) -> int:
+        return self.__compute()[column]
+
+    def not_null(self, column: str) -> int:
+        return self.__compute()[self.total_column] - self.missing(column)
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class MetricsWarning(BaseModel):
+    # Section of the metrics the warning applies to, e.g. DATA_QUALITY
+    section: str
+    message: str
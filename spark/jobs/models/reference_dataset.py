@@ -1,29 +1,94 @@
-from typing import List
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
 from pyspark.sql import DataFrame
 from pyspark.sql.types import (
     DoubleType,
     StructField,
     StructType,
 )
-import pyspark.sql.functions as F
-from pyspark.sql.window import Window
 
+from models.dataset_counts import DatasetCounts
+from utils.guardrails import Guardrails
 from utils.models import ModelOut, ModelType, ColumnDefinition
-from utils.spark import apply_schema_to_dataframe
-from utils.misc import rbit_prefix
+from utils.spark import (
+    apply_schema_to_dataframe,
+    count_with_cast_failures,
+    index_classes,
+    numerical_bounds,
+)
 
 
 class ReferenceDataset:
-    def __init__(self, model: ModelOut, raw_dataframe: DataFrame):
+    """
+    A reference dataset with the aggregations of it shared by the metrics of the reference and of the currents
+    compared with it: its counts, the classes indexed by multiclass models and the bounds of the histograms of the
+    numerical features. They are computed the first time they are needed and reused when a job computes both.
+    """
+
+    def __init__(
+        self,
+        model: ModelOut,
+        raw_dataframe: DataFrame,
+        cast_failures_report: bool = False,
+    ):
         reference_schema = self.spark_schema(model)
-        reference_dataset = apply_schema_to_dataframe(raw_dataframe, reference_schema)
 
         self.model = model
-        self.reference = reference_dataset.select(
-            *[c for c in reference_schema.names if c in reference_dataset.columns]
-        )
-        self.reference_count = self.reference.count()
+        self.reference = apply_schema_to_dataframe(raw_dataframe, reference_schema)
+        # values of every column that could not be cast to the model type, when cast_failures_report
+        self.cast_failures: Optional[Dict[str, int]] = None
+        total = None
+        if cast_failures_report:
+            total, self.cast_failures = count_with_cast_failures(
+                raw_dataframe, reference_schema
+            )
+        self.counts = DatasetCounts(self.reference, model, total)
+        # Base64 HLL sketches of the distinct values of the categorical features, persisted with the reference metrics
+        self.distinct_sketches: Dict[str, str] = dict()
+        self.__classes: Optional[List[Any]] = None
+        self.__numerical_bounds: Optional[Dict[str, Tuple[Any, Any]]] = None
+        self.__lock = threading.Lock()
+
+    @property
+    def reference_count(self) -> int:
+        return self.counts.total
+
+    def cache(self):
+        """Caches the parsed reference, for jobs computing the metrics of currents on it too"""
+        self.reference = self.reference.cache()
+        self.counts.dataframe = self.reference
+
+    def use_data_quality(self, data_quality: Optional[str]):
+        """Reuses the distinct_sketches in the json of the data quality of the reference, when it has them"""
+        if data_quality is None:
+            return
+        self.distinct_sketches = {
+            feature["feature_name"]: feature["distinct_sketch"]
+            for feature in orjson.loads(data_quality)["feature_metrics"]
+            if feature.get("distinct_sketch") is not None
+        }
+
+    def classes(self, guardrails: Optional[Guardrails] = None) -> List[Any]:
+        """Sorted distinct classes of the prediction and of the target, within the limits of guardrails"""
+        with self.__lock:
+            if self.__classes is None:
+                self.__classes = (guardrails or Guardrails()).classes(
+                    self.reference,
+                    [self.model.outputs.prediction.name, self.model.target.name],
+                )
+            return self.__classes
+
+    def numerical_bounds(self) -> Dict[str, Tuple[Any, Any]]:
+        """Min and max of the numerical features, the bounds of their histograms"""
+        with self.__lock:
+            if self.__numerical_bounds is None:
+                self.__numerical_bounds = numerical_bounds(
+                    self.reference,
+                    [feature.name for feature in self.get_numerical_features()],
+                )
+            return self.__numerical_bounds
 
     @staticmethod
     def spark_schema(model: ModelOut):
@@ -104,60 +169,9 @@ class ReferenceDataset:
             + self.model.outputs.output
         )
 
-    def get_string_indexed_dataframe(self):
-        """
-        Source: https://stackoverflow.com/questions/65911146/how-to-transform-multiple-categorical-columns-to-integers-maintaining-shared-val
-        """
-        predictions_df = self.reference.select(
-            self.model.outputs.prediction.name
-        ).withColumnRenamed(self.model.outputs.prediction.name, "classes")
-        target_df = self.reference.select(self.model.target.name).withColumnRenamed(
-            self.model.target.name, "classes"
-        )
-        prediction_target_df = predictions_df.union(target_df).dropna()
-        classes_index_df = (
-            prediction_target_df.select("classes")
-            .distinct()
-            .withColumn(
-                "classes_index",
-                (
-                    F.row_number().over(
-                        Window.partitionBy(F.lit("A")).orderBy("classes")
-                    )
-                    - 1
-                ).cast(DoubleType()),
-            )
+    def get_string_indexed_dataframe(self, guardrails: Optional[Guardrails] = None):
+        return index_classes(
+            dataframe=self.reference,
+            columns=[self.model.outputs.prediction.name, self.model.target.name],
+            classes=self.classes(guardrails),
         )
-        indexed_prediction_df = (
-            self.reference.join(
-                classes_index_df,
-                self.reference[self.model.outputs.prediction.name]
-                == classes_index_df["classes"],
-                how="inner",
-            )
-            .withColumnRenamed(
-                "classes_index",
-                f"{rbit_prefix}_{self.model.outputs.prediction.name}-idx",
-            )
-            .drop("classes")
-        )
-        indexed_target_df = (
-            indexed_prediction_df.join(
-                classes_index_df,
-                indexed_prediction_df[self.model.target.name]
-                == classes_index_df["classes"],
-                how="inner",
-            )
-            .withColumnRenamed(
-                "classes_index", f"{rbit_prefix}_{self.model.target.name}-idx"
-            )
-            .drop("classes")
-        )
-
-        index_label_map = {
-            str(float(row.__getitem__("classes_index"))): str(
-                row.__getitem__("classes")
-            )
-            for row in classes_index_df.collect()
-        }
-        return index_label_map, indexed_target_df
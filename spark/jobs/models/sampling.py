@@ -0,0 +1,27 @@
+from typing import Dict
+
+from pydantic import BaseModel, ConfigDict
+
+
+class SampleDesign(BaseModel):
+    # Rows of the dataset the sample was drawn from
+    population_size: int
+    # Inclusion weight of the rows of every stratum, the inverse of the fraction it was sampled with
+    weights: Dict[str, float]
+
+
+class ConfidenceInterval(BaseModel):
+    lower: float
+    upper: float
+
+    model_config = ConfigDict(ser_json_inf_nan="null")
+
+
+class Sampling(BaseModel):
+    population_size: int
+    sample_size: int
+    confidence_level: float
+    # Estimates of the headline model quality metrics on the population, with the rows weighted by their strata
+    estimates: Dict[str, float]
+    # Confidence intervals of the estimates
+    confidence_intervals: Dict[str, ConfidenceInterval]
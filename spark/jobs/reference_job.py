@@ -1,75 +1,92 @@
 import sys
 import os
-import uuid
+from functools import partial
+from typing import Callable, Dict, Optional, Sequence
 
 import orjson
-from pyspark.sql.types import StructField, StructType, StringType
 
 from metrics.statistics import calculate_statistics_reference
 from models.reference_dataset import ReferenceDataset
 from utils.reference_regression import ReferenceMetricsRegressionService
 from utils.reference_binary import ReferenceMetricsService
 from utils.models import JobStatus, ModelOut, ModelType
-from utils.db import update_job_status, write_to_db
+from utils.db import (
+    claim_awaiting_currents,
+    compress_sections,
+    load_checkpoint_warnings,
+    load_checkpoints,
+    metrics_uuid,
+    save_checkpoint,
+    update_job_status,
+    write_metrics,
+)
+from utils.job_config import JobConfig
+from utils.misc import log_cast_failures
+from utils.scheduler import with_checkpoints
+from utils.spark import read_csv_dataset
 
 from pyspark.sql import SparkSession
 
 import logging
 
+from current_job import read_current_dataset, write_current_metrics
 from utils.reference_multiclass import ReferenceMetricsMulticlassService
 
 
-def compute_metrics(reference_dataset, model):
-    complete_record = {}
+def compute_metrics(
+    reference_dataset,
+    model,
+    job_config: Optional[JobConfig] = None,
+    completed_stages: Optional[Dict[str, str]] = None,
+    save_stage: Optional[Callable[[str, str, Optional[str]], None]] = None,
+    completed_warnings: Sequence[str] = (),
+):
+    job_config = job_config or JobConfig()
     match model.model_type:
         case ModelType.BINARY:
-            metrics_service = ReferenceMetricsService(reference=reference_dataset)
-            model_quality = metrics_service.calculate_model_quality()
-            statistics = calculate_statistics_reference(reference_dataset)
-            data_quality = metrics_service.calculate_data_quality()
-            complete_record["MODEL_QUALITY"] = orjson.dumps(model_quality).decode(
-                "utf-8"
-            )
-            complete_record["STATISTICS"] = statistics.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["DATA_QUALITY"] = data_quality.model_dump_json(
-                serialize_as_any=True
+            metrics_service = ReferenceMetricsService(
+                reference=reference_dataset, job_config=job_config
             )
         case ModelType.MULTI_CLASS:
             metrics_service = ReferenceMetricsMulticlassService(
-                reference=reference_dataset
-            )
-            statistics = calculate_statistics_reference(reference_dataset)
-            data_quality = metrics_service.calculate_data_quality()
-            model_quality = metrics_service.calculate_model_quality()
-            complete_record["STATISTICS"] = statistics.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["DATA_QUALITY"] = data_quality.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["MODEL_QUALITY"] = orjson.dumps(model_quality).decode(
-                "utf-8"
+                reference=reference_dataset, job_config=job_config
             )
         case ModelType.REGRESSION:
             metrics_service = ReferenceMetricsRegressionService(
-                reference=reference_dataset
+                reference=reference_dataset, job_config=job_config
             )
-            statistics = calculate_statistics_reference(reference_dataset)
-            data_quality = metrics_service.calculate_data_quality()
-            model_quality = metrics_service.calculate_model_quality()
 
-            complete_record["STATISTICS"] = statistics.model_dump_json(
-                serialize_as_any=True
-            )
-            complete_record["MODEL_QUALITY"] = orjson.dumps(model_quality).decode(
-                "utf-8"
-            )
-            complete_record["DATA_QUALITY"] = data_quality.model_dump_json(
-                serialize_as_any=True
-            )
-    return complete_record
+    # the stages resumed from checkpoints don't hit their limits again, their warnings are saved with them
+    for warnings in completed_warnings:
+        metrics_service.guardrails.restore(warnings)
+
+    def save_stage_with_warnings(name: str, output: str):
+        save_stage(name, output, metrics_service.guardrails.warnings_json())
+
+    stages = {
+        "STATISTICS": lambda: calculate_statistics_reference(
+            reference_dataset, job_config.duplicate_rows_mode
+        ).model_dump_json(serialize_as_any=True),
+        "DATA_QUALITY": lambda: metrics_service.calculate_data_quality().model_dump_json(
+            serialize_as_any=True
+        ),
+        "MODEL_QUALITY": lambda: orjson.dumps(
+            metrics_service.calculate_model_quality()
+        ).decode("utf-8"),
+    }
+
+    record = {
+        name: stage()
+        for name, stage in with_checkpoints(
+            stages,
+            completed_stages,
+            save_stage_with_warnings if save_stage is not None else None,
+        ).items()
+    }
+    warnings = metrics_service.guardrails.warnings_json()
+    if warnings is not None:
+        record["WARNINGS"] = warnings
+    return record
 
 
 def main(
@@ -78,7 +95,13 @@ def main(
     reference_dataset_path: str,
     reference_uuid: str,
     table_name: str,
+    job_config: Optional[JobConfig] = None,
+    current_table_name: Optional[str] = None,
 ):
+    """
+    With current_table_name, the metrics of the currents loaded while the reference was importing are computed
+    too, once the reference ones are written, and written in current_table_name.
+    """
     spark_context = spark_session.sparkContext
 
     spark_context._jsc.hadoopConfiguration().set(
@@ -99,34 +122,119 @@ def main(
             "fs.s3a.connection.ssl.enabled", "false"
         )
 
-    raw_dataframe = spark_session.read.csv(reference_dataset_path, header=True)
-    reference_dataset = ReferenceDataset(model=model, raw_dataframe=raw_dataframe)
+    job_config = job_config or JobConfig()
 
-    complete_record = compute_metrics(reference_dataset, model)
+    raw_dataframe = read_csv_dataset(spark_session, reference_dataset_path)
+    reference_dataset = ReferenceDataset(
+        model=model,
+        raw_dataframe=raw_dataframe,
+        cast_failures_report=job_config.cast_failures_report,
+    )
+    log_cast_failures(reference_dataset.cast_failures, reference_dataset_path)
+    if current_table_name is not None:
+        # the currents awaiting the reference read it again
+        reference_dataset.cache()
 
-    complete_record.update(
-        {"UUID": str(uuid.uuid4()), "REFERENCE_UUID": reference_uuid}
+    complete_record = compute_metrics(
+        reference_dataset,
+        model,
+        job_config,
+        completed_stages=(
+            load_checkpoints(reference_uuid) if job_config.resume_stages else None
+        ),
+        completed_warnings=(
+            load_checkpoint_warnings(reference_uuid) if job_config.resume_stages else ()
+        ),
+        save_stage=(
+            partial(save_checkpoint, reference_uuid)
+            if job_config.checkpoint_stages
+            else None
+        ),
     )
 
-    schema = StructType(
-        [
-            StructField("UUID", StringType(), True),
-            StructField("REFERENCE_UUID", StringType(), True),
-            StructField("MODEL_QUALITY", StringType(), True),
-            StructField("DATA_QUALITY", StringType(), True),
-            StructField("STATISTICS", StringType(), True),
-        ]
+    complete_record.update(
+        {"UUID": metrics_uuid(reference_uuid), "REFERENCE_UUID": reference_uuid}
     )
 
-    write_to_db(spark_session, complete_record, schema, table_name)
+    sections = [
+        "MODEL_QUALITY",
+        "DATA_QUALITY",
+        "STATISTICS",
+    ]
     # FIXME table name should come from parameters
-    update_job_status(reference_uuid, JobStatus.SUCCEEDED, "reference_dataset")
+    write_metrics(
+        compress_sections(
+            {
+                column: complete_record.get(column)
+                for column in ["UUID", "REFERENCE_UUID", "WARNINGS"] + sections
+            },
+            sections,
+            job_config.compressed_metrics_min_bytes,
+        ),
+        table_name,
+        reference_uuid,
+        "reference_dataset",
+    )
+
+    if current_table_name is not None:
+        # the reference metrics are committed: a failure from here on must not mark the reference as failed, the
+        # currents left awaiting it are submitted on their own by the API
+        try:
+            reference_dataset.use_data_quality(complete_record.get("DATA_QUALITY"))
+            compute_awaiting_currents(
+                spark_session, model, reference_dataset, current_table_name, job_config
+            )
+        except Exception as e:
+            logging.exception(e)
+
+
+def compute_awaiting_currents(
+    spark_session: SparkSession,
+    model: ModelOut,
+    reference_dataset: ReferenceDataset,
+    table_name: str,
+    job_config: JobConfig,
+):
+    """
+    Computes the metrics of the currents loaded while the reference was importing, in the same application, on
+    the cached reference and with the aggregations of it already computed for its own metrics. A failed current
+    is reported on its status only.
+    """
+    for current_uuid, current_path in claim_awaiting_currents(str(model.uuid)):
+        try:
+            current_dataset, sample_design = read_current_dataset(
+                spark_session,
+                model,
+                current_path.replace("s3://", "s3a://"),
+                job_config,
+            )
+            write_current_metrics(
+                spark_session,
+                model,
+                current_dataset,
+                sample_design,
+                reference_dataset,
+                current_uuid,
+                table_name,
+                job_config,
+            )
+        except Exception as e:
+            logging.exception(e)
+            try:
+                update_job_status(current_uuid, JobStatus.ERROR, "current_dataset")
+            except Exception as status_error:
+                # the other claimed currents are computed anyway
+                logging.exception(status_error)
 
 
 if __name__ == "__main__":
-    spark_session = SparkSession.builder.appName(
-        "radicalbit_reference_metrics"
-    ).getOrCreate()
+    job_config = JobConfig.from_env()
+
+    spark_builder = SparkSession.builder.appName("radicalbit_reference_metrics")
+    if job_config.parallel_stages:
+        # Concurrent stages of the awaiting currents share the executors fairly instead of queueing FIFO
+        spark_builder = spark_builder.config("spark.scheduler.mode", "FAIR")
+    spark_session = spark_builder.getOrCreate()
 
     # Json of ModelOut is first param
     model = ModelOut.model_validate_json(sys.argv[1])
@@ -136,12 +244,30 @@ if __name__ == "__main__":
     reference_uuid = sys.argv[3]
     # Table name fourth param
     table_name = sys.argv[4]
+    # Table name of the metrics of the currents awaiting the reference is the optional fifth param
+    current_table_name = sys.argv[5] if len(sys.argv) > 5 else None
 
     try:
-        main(spark_session, model, reference_dataset_path, reference_uuid, table_name)
+        main(
+            spark_session,
+            model,
+            reference_dataset_path,
+            reference_uuid,
+            table_name,
+            job_config,
+            current_table_name,
+        )
     except Exception as e:
         logging.exception(e)
         # FIXME table name should come from parameters
         update_job_status(reference_uuid, JobStatus.ERROR, "reference_dataset")
+        # the currents awaiting a failed reference, claimed after its status is updated, can not be compared with it.
+        # Those not claimed here are left to the API, as the currents of a job that did not get here at all
+        if current_table_name is not None:
+            try:
+                for current_uuid, _ in claim_awaiting_currents(str(model.uuid)):
+                    update_job_status(current_uuid, JobStatus.ERROR, "current_dataset")
+            except Exception as awaiting_error:
+                logging.exception(awaiting_error)
     finally:
         spark_session.stop()
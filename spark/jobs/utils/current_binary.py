@@ -1,15 +1,17 @@
-from typing import List
+from typing import Dict, List, Optional
 
 from pyspark.ml.evaluation import (
     BinaryClassificationEvaluator,
     MulticlassClassificationEvaluator,
 )
-from pyspark.mllib.evaluation import MulticlassMetrics
 from pyspark.sql import DataFrame, SparkSession
-from pyspark.sql.types import DoubleType
 import pyspark.sql.functions as F
 
 from metrics.data_quality_calculator import DataQualityCalculator
+from metrics.model_quality_binary_calculator import (
+    BinaryState,
+    ModelQualityBinaryCalculator,
+)
 from metrics.drift_calculator import DriftCalculator
 from models.current_dataset import CurrentDataset
 from models.data_quality import (
@@ -19,7 +21,17 @@ from models.data_quality import (
     BinaryClassDataQuality,
 )
 from models.reference_dataset import ReferenceDataset
-from .misc import create_time_format, rbit_prefix
+from .guardrails import Guardrails
+from .job_config import JobConfig
+from .misc import (
+    coarser_granularities,
+    finest_granularity,
+    format_time_bucket,
+    roll_up,
+    time_bucket,
+    time_group_column,
+    time_series,
+)
 from .models import Granularity
 from .spark import is_not_null
 
@@ -62,10 +74,14 @@ class CurrentMetricsService:
         spark_session: SparkSession,
         current: CurrentDataset,
         reference: ReferenceDataset,
+        job_config: Optional[JobConfig] = None,
     ):
         self.spark_session = spark_session
         self.current = current
         self.reference = reference
+        self.job_config = job_config or JobConfig()
+        self.guardrails = Guardrails(self.job_config)
+        self.__state_by_group: Optional[Dict[Optional[int], BinaryState]] = None
 
     def calculate_data_quality_numerical(self) -> List[NumericalFeatureMetrics]:
         return DataQualityCalculator.calculate_combined_data_quality_numerical(
@@ -74,13 +90,23 @@ class CurrentMetricsService:
             current_count=self.current.current_count,
             reference_dataframe=self.reference.reference,
             spark_session=self.spark_session,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.current.current_count
+            ),
+            class_relative_error=self.job_config.class_relative_error(),
+            reference_bounds=self.reference.numerical_bounds(),
         )
 
     def calculate_data_quality_categorical(self) -> List[CategoricalFeatureMetrics]:
-        return DataQualityCalculator.categorical_metrics(
+        return DataQualityCalculator.calculate_combined_data_quality_categorical(
             model=self.current.model,
-            dataframe=self.current.current,
-            dataframe_count=self.current.current_count,
+            current_dataframe=self.current.current,
+            current_count=self.current.current_count,
+            reference_dataframe=self.reference.reference,
+            approx_distinct_min_cardinality=self.job_config.approx_distinct_min_cardinality,
+            distinct_rsd=self.job_config.distinct_rsd,
+            guardrails=self.guardrails,
+            reference_sketches=self.reference.distinct_sketches,
         )
 
     def calculate_class_metrics(self, column) -> List[ClassMetrics]:
@@ -88,6 +114,7 @@ class CurrentMetricsService:
             class_column=column,
             dataframe=self.current.current,
             dataframe_count=self.current.current_count,
+            guardrails=self.guardrails,
         )
 
         # FIXME this should be avoided if we are sure that we have all classes in the file
@@ -174,69 +201,53 @@ class CurrentMetricsService:
         except Exception:
             return float("nan")
 
+    def __with_time_group(
+        self,
+        dataframe: DataFrame,
+        columns: List[str],
+        granularity: Optional[Granularity] = None,
+    ) -> DataFrame:
+        return dataframe.select(
+            *columns,
+            time_bucket(
+                self.current.model.timestamp.name,
+                granularity or self.current.model.granularity,
+            ).alias(time_group_column),
+        )
+
+    @staticmethod
+    def __list_time_groups(dataset_with_group: DataFrame) -> List[int]:
+        return [
+            row[time_group_column]
+            for row in dataset_with_group.select(time_group_column)
+            .distinct()
+            .orderBy(F.col(time_group_column).asc())
+            .collect()
+        ]
+
     def calculate_multiclass_model_quality_group_by_timestamp(self):
         current_df_clean = self.current.current.filter(
             is_not_null(self.current.model.outputs.prediction.name)
             & is_not_null(self.current.model.target.name)
         )
-
-        if self.current.model.granularity == Granularity.WEEK:
-            dataset_with_group = current_df_clean.select(
-                [
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_sub(
-                                F.next_day(
-                                    F.date_format(
-                                        self.current.model.timestamp.name,
-                                        create_time_format(
-                                            self.current.model.granularity
-                                        ),
-                                    ),
-                                    "sunday",
-                                ),
-                                7,
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
-                ]
-            )
-        else:
-            dataset_with_group = current_df_clean.select(
-                [
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_format(
-                                self.current.model.timestamp.name,
-                                create_time_format(self.current.model.granularity),
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
-                ]
-            )
-
-        list_of_time_group = (
-            dataset_with_group.select("time_group")
-            .distinct()
-            .orderBy(F.col("time_group").asc())
-            .rdd.flatMap(lambda x: x)
-            .collect()
+        dataset_with_group = self.__with_time_group(
+            current_df_clean,
+            [
+                self.current.model.outputs.prediction.name,
+                self.current.model.target.name,
+            ],
         )
+
+        list_of_time_group = self.__list_time_groups(dataset_with_group)
         array_of_groups = [
-            dataset_with_group.where(F.col("time_group") == x)
+            dataset_with_group.where(F.col(time_group_column) == x)
             for x in list_of_time_group
         ]
 
         return {
             label: [
                 {
-                    "timestamp": group,
+                    "timestamp": format_time_bucket(group),
                     "value": self.__evaluate_multi_class_classification(
                         group_dataset, name
                     ),
@@ -251,75 +262,36 @@ class CurrentMetricsService:
             is_not_null(self.current.model.outputs.prediction_proba.name)
             & is_not_null(self.current.model.target.name)
         )
-
-        if self.current.model.granularity == Granularity.WEEK:
-            dataset_with_group = current_df_clean.select(
-                [
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.outputs.prediction_proba.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_sub(
-                                F.next_day(
-                                    F.date_format(
-                                        self.current.model.timestamp.name,
-                                        create_time_format(
-                                            self.current.model.granularity
-                                        ),
-                                    ),
-                                    "sunday",
-                                ),
-                                7,
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
-                ]
-            )
-        else:
-            dataset_with_group = current_df_clean.select(
-                [
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.outputs.prediction_proba.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_format(
-                                self.current.model.timestamp.name,
-                                create_time_format(self.current.model.granularity),
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
-                ]
-            )
-
-        list_of_time_group = (
-            dataset_with_group.select("time_group")
-            .distinct()
-            .orderBy(F.col("time_group").asc())
-            .rdd.flatMap(lambda x: x)
-            .collect()
+        dataset_with_group = self.__with_time_group(
+            current_df_clean,
+            [
+                self.current.model.outputs.prediction.name,
+                self.current.model.outputs.prediction_proba.name,
+                self.current.model.target.name,
+            ],
         )
+
+        list_of_time_group = self.__list_time_groups(dataset_with_group)
         array_of_groups = [
             dataset_with_group.select(
                 [
                     self.current.model.outputs.prediction_proba.name,
                     self.current.model.target.name,
                 ]
-            ).where(F.col("time_group") == x)
-            for x in list_of_time_group
-        ]
-        array_of_groups_with_pred = [
-            dataset_with_group.where(F.col("time_group") == x)
+            ).where(F.col(time_group_column) == x)
             for x in list_of_time_group
         ]
+        # log loss is rolled up from the state of the grouped metrics, aggregated once with them
+        state_by_group = roll_up(
+            self.__finest_state_by_group(),
+            self.current.model.granularity,
+            ModelQualityBinaryCalculator.merge_states,
+        )
 
         res = {
             label: [
                 {
-                    "timestamp": group,
+                    "timestamp": format_time_bucket(group),
                     "value": self.__evaluate_binary_classification(group_dataset, name),
                 }
                 for group, group_dataset in zip(list_of_time_group, array_of_groups)
@@ -330,107 +302,85 @@ class CurrentMetricsService:
         log_loss_res = {
             "log_loss": [
                 {
-                    "timestamp": group,
-                    "value": self.__calculate_log_loss(group_dataset),
+                    "timestamp": format_time_bucket(group),
+                    "value": state_by_group[group].log_loss()
+                    if group in state_by_group
+                    else None,
                 }
-                for group, group_dataset in zip(
-                    list_of_time_group, array_of_groups_with_pred
-                )
+                for group in list_of_time_group
             ]
         }
         res.update(log_loss_res)
         return res
 
     def calculate_confusion_matrix(self) -> dict[str, float]:
-        prediction_and_label = (
-            self.current.current.filter(
-                is_not_null(self.current.model.outputs.prediction.name)
-                & is_not_null(self.current.model.target.name)
+        return (
+            self.current.current.agg(
+                *ModelQualityBinaryCalculator.confusion_matrix_agg(self.current.model)
             )
-            .select(
-                [
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.target.name,
-                ]
-            )
-            .withColumn(
-                self.current.model.target.name, F.col(self.current.model.target.name)
-            )
-            .orderBy(self.current.model.target.name)
+            .collect()[0]
+            .asDict()
         )
 
-        tp = prediction_and_label.filter(
-            (F.col(self.current.model.outputs.prediction.name) == 1)
-            & (F.col(self.current.model.target.name) == 1)
-        ).count()
-        tn = prediction_and_label.filter(
-            (F.col(self.current.model.outputs.prediction.name) == 0)
-            & (F.col(self.current.model.target.name) == 0)
-        ).count()
-        fp = prediction_and_label.filter(
-            (F.col(self.current.model.outputs.prediction.name) == 1)
-            & (F.col(self.current.model.target.name) == 0)
-        ).count()
-        fn = prediction_and_label.filter(
-            (F.col(self.current.model.outputs.prediction.name) == 0)
-            & (F.col(self.current.model.target.name) == 1)
-        ).count()
-
-        return {
-            "true_positive_count": tp,
-            "false_positive_count": fp,
-            "true_negative_count": tn,
-            "false_negative_count": fn,
-        }
-
-    def __calculate_log_loss(self, current_df) -> float:
-        dataset_with_proba = (
-            current_df.filter(
-                is_not_null(self.current.model.outputs.prediction.name)
-                & is_not_null(self.current.model.target.name)
-                & is_not_null(self.current.model.outputs.prediction_proba.name)
-            )
-            .withColumn(
-                f"{rbit_prefix}_prediction_proba_class0",
-                F.when(
-                    F.col(self.current.model.outputs.prediction.name) == 0,
-                    F.col(self.current.model.outputs.prediction_proba.name),
-                ).otherwise(
-                    1 - F.col(self.current.model.outputs.prediction_proba.name)
-                ),
-            )
-            .withColumn(
-                f"{rbit_prefix}_prediction_proba_class1",
-                F.when(
-                    F.col(self.current.model.outputs.prediction.name) == 1,
-                    F.col(self.current.model.outputs.prediction_proba.name),
-                ).otherwise(
-                    1 - F.col(self.current.model.outputs.prediction_proba.name)
+    def __finest_state_by_group(self) -> Dict[Optional[int], BinaryState]:
+        """
+        Mergeable state of the grouped metrics by time bucket of the finest granularity, aggregated the first time
+        it is needed and shared by the grouped log loss and the rollups of the coarser granularities
+        """
+        if self.__state_by_group is None:
+            self.__state_by_group = ModelQualityBinaryCalculator.state_by_group(
+                self.current.model,
+                self.__with_time_group(
+                    self.current.current,
+                    [
+                        column.name
+                        for column in [
+                            self.current.model.target,
+                            self.current.model.outputs.prediction,
+                            self.current.model.outputs.prediction_proba,
+                        ]
+                        if column is not None
+                    ],
+                    finest_granularity(self.current.model.granularity),
                 ),
+                time_group_column,
             )
-            .withColumn(f"{rbit_prefix}_weight_logloss_def", F.lit(1.0))
-            .withColumn(
-                self.current.model.outputs.prediction.name,
-                F.col(self.current.model.outputs.prediction.name).cast(DoubleType()),
-            )
-            .withColumn(
-                self.current.model.target.name,
-                F.col(self.current.model.target.name).cast(DoubleType()),
-            )
+        return self.__state_by_group
+
+    def calculate_grouped_metrics_by_granularity(self) -> Dict[str, Dict]:
+        """
+        Grouped metrics of every granularity coarser than the model one, rolled up from a mergeable state
+        aggregated once at the finest granularity.
+        Their areas under the curves are approximate, with the thresholds at the score_bins of the state instead of
+        the scores of the rows as the grouped metrics of the model granularity, so score_bins is kept with them.
+        """
+        state_by_group = self.__finest_state_by_group()
+        approximation = (
+            {"score_bins": ModelQualityBinaryCalculator.score_bins}
+            if self.current.model.outputs.prediction_proba is not None
+            else dict()
         )
-
-        dataset_proba_vector = dataset_with_proba.select(
-            self.current.model.outputs.prediction.name,
-            self.current.model.target.name,
-            f"{rbit_prefix}_weight_logloss_def",
-            F.array(
-                F.col(f"{rbit_prefix}_prediction_proba_class0"),
-                F.col(f"{rbit_prefix}_prediction_proba_class1"),
-            ).alias(f"{rbit_prefix}_prediction_proba_vector"),
-        ).rdd
-
-        metrics = MulticlassMetrics(dataset_proba_vector)
-        return metrics.logLoss()
+        return {
+            granularity.value: {
+                **time_series(
+                    {
+                        group: ModelQualityBinaryCalculator.grouped_metrics(
+                            self.current.model, state
+                        )
+                        for group, state in roll_up(
+                            state_by_group,
+                            granularity,
+                            ModelQualityBinaryCalculator.merge_states,
+                        ).items()
+                    },
+                    ModelQualityBinaryCalculator.grouped_metric_names(
+                        self.current.model
+                    ),
+                ),
+                **approximation,
+            }
+            for granularity in coarser_granularities(self.current.model.granularity)
+        }
 
     # FIXME use pydantic struct like data quality
     def calculate_model_quality_with_group_by_timestamp(self):
@@ -439,21 +389,29 @@ class CurrentMetricsService:
         metrics["grouped_metrics"] = (
             self.calculate_multiclass_model_quality_group_by_timestamp()
         )
-        metrics["global_metrics"].update(self.calculate_confusion_matrix())
+        # confusion matrix and log loss come from the same aggregation
+        aggregated_metrics = ModelQualityBinaryCalculator.aggregated_metrics(
+            self.current.model, self.current.current
+        )
+        metrics["global_metrics"].update(
+            {
+                metric: aggregated_metrics[metric]
+                for metric in ModelQualityBinaryCalculator.confusion_matrix_metrics
+            }
+        )
         if self.current.model.outputs.prediction_proba is not None:
             metrics["global_metrics"].update(self.__calc_bc_metrics())
-            metrics["global_metrics"]["log_loss"] = self.__calculate_log_loss(
-                self.current.current
-            )
+            metrics["global_metrics"]["log_loss"] = aggregated_metrics["log_loss"]
             binary_class_metrics = (
                 self.calculate_binary_class_model_quality_group_by_timestamp()
             )
             metrics["grouped_metrics"].update(binary_class_metrics)
         return metrics
 
-    def calculate_drift(self):
+    def calculate_drift(self, max_workers: int = 1):
         return DriftCalculator.calculate_drift(
             spark_session=self.spark_session,
             reference_dataset=self.reference,
             current_dataset=self.current,
+            max_workers=max_workers,
         )
@@ -1,13 +1,13 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 
-from pandas import DataFrame
-from pyspark.ml.evaluation import MulticlassClassificationEvaluator
-from pyspark.mllib.evaluation import MulticlassMetrics
 from pyspark.sql import SparkSession
-import pyspark.sql.functions as F
 
 from metrics.data_quality_calculator import DataQualityCalculator
 from metrics.drift_calculator import DriftCalculator
+from metrics.model_quality_multiclass_calculator import (
+    Confusions,
+    ModelQualityMulticlassCalculator,
+)
 from models.current_dataset import CurrentDataset
 from models.data_quality import (
     NumericalFeatureMetrics,
@@ -16,8 +16,17 @@ from models.data_quality import (
     MultiClassDataQuality,
 )
 from models.reference_dataset import ReferenceDataset
-from utils.misc import create_time_format, rbit_prefix
-from utils.models import Granularity
+from utils.guardrails import Guardrails
+from utils.job_config import JobConfig
+from utils.misc import (
+    coarser_granularities,
+    finest_granularity,
+    rbit_prefix,
+    roll_up,
+    time_bucket,
+    time_group_column,
+    time_series,
+)
 
 
 class CurrentMetricsMulticlassService:
@@ -26,31 +35,19 @@ class CurrentMetricsMulticlassService:
         spark_session: SparkSession,
         current: CurrentDataset,
         reference: ReferenceDataset,
+        job_config: Optional[JobConfig] = None,
     ):
         self.spark_session = spark_session
         self.current = current
         self.reference = reference
+        self.job_config = job_config or JobConfig()
+        self.guardrails = Guardrails(self.job_config)
         index_label_map, indexed_current = current.get_string_indexed_dataframe(
-            self.reference
+            self.reference, self.guardrails
         )
         self.index_label_map = index_label_map
         self.indexed_current = indexed_current
-        self.model_quality_multiclass_classificator_global = {
-            "f1": "f1",
-            "accuracy": "accuracy",
-            "weightedPrecision": "weighted_precision",
-            "weightedRecall": "weighted_recall",
-            "weightedTruePositiveRate": "weighted_true_positive_rate",
-            "weightedFalsePositiveRate": "weighted_false_positive_rate",
-            "weightedFMeasure": "weighted_f_measure",
-        }
-        self.model_quality_multiclass_classificator_by_label = {
-            "truePositiveRateByLabel": "true_positive_rate",
-            "falsePositiveRateByLabel": "false_positive_rate",
-            "precisionByLabel": "precision",
-            "recallByLabel": "recall",
-            "fMeasureByLabel": "f_measure",
-        }
+        self.__confusions_by_group: Optional[Dict[Optional[int], Confusions]] = None
 
     def calculate_data_quality_numerical(self) -> List[NumericalFeatureMetrics]:
         return DataQualityCalculator.calculate_combined_data_quality_numerical(
@@ -59,13 +56,23 @@ class CurrentMetricsMulticlassService:
             current_count=self.current.current_count,
             reference_dataframe=self.reference.reference,
             spark_session=self.spark_session,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.current.current_count
+            ),
+            class_relative_error=self.job_config.class_relative_error(),
+            reference_bounds=self.reference.numerical_bounds(),
         )
 
     def calculate_data_quality_categorical(self) -> List[CategoricalFeatureMetrics]:
-        return DataQualityCalculator.categorical_metrics(
+        return DataQualityCalculator.calculate_combined_data_quality_categorical(
             model=self.current.model,
-            dataframe=self.current.current,
-            dataframe_count=self.current.current_count,
+            current_dataframe=self.current.current,
+            current_count=self.current.current_count,
+            reference_dataframe=self.reference.reference,
+            approx_distinct_min_cardinality=self.job_config.approx_distinct_min_cardinality,
+            distinct_rsd=self.job_config.distinct_rsd,
+            guardrails=self.guardrails,
+            reference_sketches=self.reference.distinct_sketches,
         )
 
     def calculate_class_metrics(self, column) -> List[ClassMetrics]:
@@ -73,134 +80,105 @@ class CurrentMetricsMulticlassService:
             class_column=column,
             dataframe=self.current.current,
             dataframe_count=self.current.current_count,
+            guardrails=self.guardrails,
         )
 
-    def calculate_multiclass_model_quality_group_by_timestamp(self):
-        if self.current.model.granularity == Granularity.WEEK:
+    def __calc_confusions_by_time_group(self) -> Dict[Optional[int], Confusions]:
+        # Counts are taken once at the finest granularity, every coarser group is merged from them
+        if self.__confusions_by_group is None:
             dataset_with_group = self.indexed_current.select(
                 [
                     f"{rbit_prefix}_{self.reference.model.outputs.prediction.name}-idx",
                     f"{rbit_prefix}_{self.current.model.target.name}-idx",
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_sub(
-                                F.next_day(
-                                    F.date_format(
-                                        self.current.model.timestamp.name,
-                                        create_time_format(
-                                            self.current.model.granularity
-                                        ),
-                                    ),
-                                    "sunday",
-                                ),
-                                7,
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
+                    time_bucket(
+                        self.current.model.timestamp.name,
+                        finest_granularity(self.current.model.granularity),
+                    ).alias(time_group_column),
                 ]
             )
-        else:
-            dataset_with_group = self.indexed_current.select(
-                [
-                    f"{rbit_prefix}_{self.reference.model.outputs.prediction.name}-idx",
-                    f"{rbit_prefix}_{self.current.model.target.name}-idx",
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_format(
-                                self.current.model.timestamp.name,
-                                create_time_format(self.current.model.granularity),
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
-                ]
+            self.__confusions_by_group = ModelQualityMulticlassCalculator.confusion_counts_by_group(
+                dataset_with_group,
+                prediction_column=f"{rbit_prefix}_{self.current.model.outputs.prediction.name}-idx",
+                target_column=f"{rbit_prefix}_{self.current.model.target.name}-idx",
+                group_column=time_group_column,
             )
+        return self.__confusions_by_group
 
-        list_of_time_group = (
-            dataset_with_group.select("time_group")
-            .distinct()
-            .orderBy(F.col("time_group").asc())
-            .rdd.flatMap(lambda x: x)
-            .collect()
+    @staticmethod
+    def __calc_grouped_label_metrics(
+        confusions_by_group: Dict[int, Confusions], index: str
+    ) -> Dict[str, List[Dict]]:
+        return time_series(
+            {
+                group: ModelQualityMulticlassCalculator.label_metrics(
+                    confusions, float(index)
+                )
+                for group, confusions in confusions_by_group.items()
+            },
+            ModelQualityMulticlassCalculator.by_label_metrics,
+        )
+
+    def __calc_multiclass_by_label_metrics(
+        self, confusions_by_group: Dict[Optional[int], Confusions]
+    ) -> List[Dict]:
+        confusions = ModelQualityMulticlassCalculator.merge_confusions(
+            list(confusions_by_group.values())
+        )
+        confusions_by_time_group = roll_up(
+            confusions_by_group,
+            self.current.model.granularity,
+            ModelQualityMulticlassCalculator.merge_confusions,
         )
-        array_of_groups = [
-            dataset_with_group.where(F.col("time_group") == x)
-            for x in list_of_time_group
-        ]
 
         return [
             {
                 "class_name": label,
-                "metrics": {
-                    metric_label: self.__evaluate_multi_class_classification(
-                        self.indexed_current, metric_name, float(index)
-                    )
-                    for (
-                        metric_name,
-                        metric_label,
-                    ) in self.model_quality_multiclass_classificator_by_label.items()
-                },
-                "grouped_metrics": {
-                    metric_label: [
-                        {
-                            "timestamp": group,
-                            "value": self.__evaluate_multi_class_classification(
-                                group_dataset, metric_name, float(index)
-                            ),
-                        }
-                        for group, group_dataset in zip(
-                            list_of_time_group, array_of_groups
-                        )
-                    ]
-                    for metric_name, metric_label in self.model_quality_multiclass_classificator_by_label.items()
-                },
+                "metrics": ModelQualityMulticlassCalculator.label_metrics(
+                    confusions, float(index)
+                ),
+                "grouped_metrics": self.__calc_grouped_label_metrics(
+                    confusions_by_time_group, index
+                ),
             }
             for index, label in self.index_label_map.items()
         ]
 
-    def __evaluate_multi_class_classification(
-        self, dataset: DataFrame, metric_name: str, class_index: float
-    ) -> float:
-        try:
-            return MulticlassClassificationEvaluator(
-                metricName=metric_name,
-                predictionCol=f"{rbit_prefix}_{self.current.model.outputs.prediction.name}-idx",
-                labelCol=f"{rbit_prefix}_{self.current.model.target.name}-idx",
-                metricLabel=class_index,
-            ).evaluate(dataset)
-        except Exception:
-            return float("nan")
-
-    def __calc_multiclass_global_metrics(self) -> Dict:
-        return {
-            metric_label: self.__evaluate_multi_class_classification(
-                self.indexed_current, metric_name, 0.0
+    def calculate_grouped_metrics_by_granularity(self) -> Dict[str, Dict[str, Dict]]:
+        """
+        Grouped metrics of every class for every granularity coarser than the model one, rolled up from
+        the confusion counts of the finest granularity
+        """
+        grouped_metrics_by_granularity = dict()
+        for granularity in coarser_granularities(self.current.model.granularity):
+            confusions_by_time_group = roll_up(
+                self.__calc_confusions_by_time_group(),
+                granularity,
+                ModelQualityMulticlassCalculator.merge_confusions,
             )
-            for (
-                metric_name,
-                metric_label,
-            ) in self.model_quality_multiclass_classificator_global.items()
-        }
+            grouped_metrics_by_granularity[granularity.value] = {
+                label: self.__calc_grouped_label_metrics(
+                    confusions_by_time_group, index
+                )
+                for index, label in self.index_label_map.items()
+            }
+        return grouped_metrics_by_granularity
 
-    def __calc_confusion_matrix(self):
-        prediction_and_labels = self.indexed_current.select(
-            *[
-                f"{rbit_prefix}_{self.reference.model.outputs.prediction.name}-idx",
-                f"{rbit_prefix}_{self.reference.model.target.name}-idx",
-            ]
-        ).rdd
-        multiclass_metrics_calculator = MulticlassMetrics(prediction_and_labels)
-        return multiclass_metrics_calculator.confusionMatrix().toArray().tolist()
+    def calculate_multiclass_model_quality_group_by_timestamp(self):
+        return self.__calc_multiclass_by_label_metrics(
+            self.__calc_confusions_by_time_group()
+        )
 
     def calculate_model_quality(self) -> Dict:
-        metrics_by_label = self.calculate_multiclass_model_quality_group_by_timestamp()
-        global_metrics = self.__calc_multiclass_global_metrics()
-        global_metrics["confusion_matrix"] = self.__calc_confusion_matrix()
+        # A single (time_group, label, prediction) count feeds every metric
+        confusions_by_group = self.__calc_confusions_by_time_group()
+        confusions = ModelQualityMulticlassCalculator.merge_confusions(
+            list(confusions_by_group.values())
+        )
+        metrics_by_label = self.__calc_multiclass_by_label_metrics(confusions_by_group)
+        global_metrics = ModelQualityMulticlassCalculator.global_metrics(confusions)
+        global_metrics["confusion_matrix"] = (
+            ModelQualityMulticlassCalculator.confusion_matrix(confusions)
+        )
         metrics = {
             "classes": list(self.index_label_map.values()),
             "class_metrics": metrics_by_label,
@@ -224,9 +202,10 @@ class CurrentMetricsMulticlassService:
             feature_metrics=feature_metrics,
         )
 
-    def calculate_drift(self):
+    def calculate_drift(self, max_workers: int = 1):
         return DriftCalculator.calculate_drift(
             spark_session=self.spark_session,
             reference_dataset=self.reference,
             current_dataset=self.current,
+            max_workers=max_workers,
         )
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pyspark.sql import SparkSession
 import pyspark.sql.functions as F
@@ -14,8 +14,17 @@ from models.data_quality import (
 from models.reference_dataset import ReferenceDataset
 from models.regression_model_quality import ModelQualityRegression, RegressionMetricType
 from metrics.model_quality_regression_calculator import ModelQualityRegressionCalculator
-from .misc import create_time_format
-from .models import Granularity
+from .guardrails import Guardrails
+from .job_config import JobConfig
+from .misc import (
+    coarser_granularities,
+    finest_granularity,
+    format_time_bucket,
+    roll_up,
+    time_bucket,
+    time_group_column,
+    time_series,
+)
 from metrics.drift_calculator import DriftCalculator
 
 
@@ -25,10 +34,13 @@ class CurrentMetricsRegressionService:
         spark_session: SparkSession,
         current: CurrentDataset,
         reference: ReferenceDataset,
+        job_config: Optional[JobConfig] = None,
     ):
         self.spark_session = spark_session
         self.current = current
         self.reference = reference
+        self.job_config = job_config or JobConfig()
+        self.guardrails = Guardrails(self.job_config)
 
     def calculate_model_quality(self) -> ModelQualityRegression:
         metrics = dict()
@@ -36,79 +48,88 @@ class CurrentMetricsRegressionService:
             model=self.current.model,
             dataframe=self.current.current,
             dataframe_count=self.current.current_count,
+            dataframe_clean_count=self.current.counts.clean_pairs,
         ).model_dump(serialize_as_any=True)
         metrics["grouped_metrics"] = (
             self.calculate_regression_model_quality_group_by_timestamp()
         )
         metrics["global_metrics"]["residuals"] = (
             ModelQualityRegressionCalculator.residual_metrics(
-                model=self.current.model, dataframe=self.current.current
+                model=self.current.model,
+                dataframe=self.current.current,
+                dataframe_clean_count=self.current.counts.clean_pairs,
+                guardrails=self.guardrails,
             )
         )
         return metrics
 
-    def calculate_regression_model_quality_group_by_timestamp(self):
-        if self.current.model.granularity == Granularity.WEEK:
-            dataset_with_group = self.current.current.select(
-                [
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_sub(
-                                F.next_day(
-                                    F.date_format(
-                                        self.current.model.timestamp.name,
-                                        create_time_format(
-                                            self.current.model.granularity
-                                        ),
-                                    ),
-                                    "sunday",
-                                ),
-                                7,
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
-                ]
-            )
-        else:
-            dataset_with_group = self.current.current.select(
-                [
-                    self.current.model.outputs.prediction.name,
-                    self.current.model.target.name,
-                    F.date_format(
-                        F.to_timestamp(
-                            F.date_format(
-                                self.current.model.timestamp.name,
-                                create_time_format(self.current.model.granularity),
-                            )
-                        ),
-                        "yyyy-MM-dd HH:mm:ss",
-                    ).alias("time_group"),
-                ]
+    def calculate_grouped_metrics_by_granularity(self) -> Dict[str, Dict]:
+        """
+        Grouped metrics of every granularity coarser than the model one, rolled up from a mergeable state
+        aggregated once at the finest granularity
+        """
+        state_by_group = ModelQualityRegressionCalculator.state_by_group(
+            self.current.model,
+            self.current.current.select(
+                self.current.model.outputs.prediction.name,
+                self.current.model.target.name,
+                time_bucket(
+                    self.current.model.timestamp.name,
+                    finest_granularity(self.current.model.granularity),
+                ).alias(time_group_column),
+            ),
+            time_group_column,
+        )
+        return {
+            granularity.value: time_series(
+                {
+                    group: ModelQualityRegressionCalculator.grouped_metrics(
+                        self.current.model, state
+                    )
+                    for group, state in roll_up(
+                        state_by_group,
+                        granularity,
+                        ModelQualityRegressionCalculator.merge_states,
+                    ).items()
+                },
+                [metric_name.value for metric_name in RegressionMetricType],
             )
+            for granularity in coarser_granularities(self.current.model.granularity)
+        }
 
-        list_of_time_group = (
-            dataset_with_group.select("time_group")
-            .distinct()
-            .orderBy(F.col("time_group").asc())
-            .rdd.flatMap(lambda x: x)
-            .collect()
+    def calculate_regression_model_quality_group_by_timestamp(self):
+        dataset_with_group = self.current.current.select(
+            [
+                self.current.model.outputs.prediction.name,
+                self.current.model.target.name,
+                time_bucket(
+                    self.current.model.timestamp.name, self.current.model.granularity
+                ).alias(time_group_column),
+            ]
         )
+
+        # the groups and their sizes come from the same aggregation
+        count_by_group = {
+            row[time_group_column]: row["count"]
+            for row in dataset_with_group.groupBy(time_group_column)
+            .count()
+            .orderBy(F.col(time_group_column).asc())
+            .collect()
+        }
+        list_of_time_group = list(count_by_group)
         array_of_groups = [
-            dataset_with_group.where(F.col("time_group") == x)
+            dataset_with_group.where(F.col(time_group_column) == x)
             for x in list_of_time_group
         ]
 
         return {
             metric_name.value: [
                 {
-                    "timestamp": group,
+                    "timestamp": format_time_bucket(group),
                     "value": ModelQualityRegressionCalculator.eval_model_quality_metric(
                         self.current.model,
                         group_dataset,
-                        group_dataset.count(),
+                        count_by_group[group],
                         metric_name,
                     ),
                 }
@@ -124,13 +145,22 @@ class CurrentMetricsRegressionService:
             current_count=self.current.current_count,
             reference_dataframe=self.reference.reference,
             spark_session=self.spark_session,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.current.current_count
+            ),
+            reference_bounds=self.reference.numerical_bounds(),
         )
 
     def calculate_data_quality_categorical(self) -> List[CategoricalFeatureMetrics]:
-        return DataQualityCalculator.categorical_metrics(
+        return DataQualityCalculator.calculate_combined_data_quality_categorical(
             model=self.current.model,
-            dataframe=self.current.current,
-            dataframe_count=self.current.current_count,
+            current_dataframe=self.current.current,
+            current_count=self.current.current_count,
+            reference_dataframe=self.reference.reference,
+            approx_distinct_min_cardinality=self.job_config.approx_distinct_min_cardinality,
+            distinct_rsd=self.job_config.distinct_rsd,
+            guardrails=self.guardrails,
+            reference_sketches=self.reference.distinct_sketches,
         )
 
     def calculate_target_metrics(self) -> NumericalTargetMetrics:
@@ -138,6 +168,9 @@ class CurrentMetricsRegressionService:
             target_column=self.current.model.target.name,
             dataframe=self.current.current,
             dataframe_count=self.current.current_count,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.current.current_count
+            ),
         )
 
     def calculate_current_target_metrics(self) -> NumericalTargetMetrics:
@@ -147,6 +180,9 @@ class CurrentMetricsRegressionService:
             curr_count=self.current.current_count,
             ref_df=self.reference.reference,
             spark_session=self.spark_session,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.current.current_count
+            ),
         )
 
     def calculate_data_quality(
@@ -168,9 +204,10 @@ class CurrentMetricsRegressionService:
             feature_metrics=feature_metrics,
         )
 
-    def calculate_drift(self):
+    def calculate_drift(self, max_workers: int = 1):
         return DriftCalculator.calculate_drift(
             spark_session=self.spark_session,
             reference_dataset=self.reference,
             current_dataset=self.current,
+            max_workers=max_workers,
         )
@@ -1,11 +1,14 @@
+import csv
+import io
 import os
-from typing import Dict
-
-from pyspark.sql import SparkSession
-from pyspark.sql.types import StructType
+import uuid
+import zlib
+from typing import Dict, List, Optional, Tuple
 
 import psycopg2
 
+from utils.models import JobStatus
+
 # TODO Define connection details in a better way, this comes from env secrets
 db_host = os.getenv("POSTGRES_HOST")
 db_port = os.getenv("POSTGRES_PORT")
@@ -14,19 +17,25 @@ user = os.getenv("POSTGRES_USER")
 password = os.getenv("POSTGRES_PASSWORD")
 postgres_schema = os.getenv("POSTGRES_SCHEMA")
 
-url = f"jdbc:postgresql://{db_host}:{db_port}/{db_name}"
+# Outputs of the completed stages of the running jobs, deleted with the metrics write
+checkpoint_table_name = "metrics_checkpoint"
 
 
-def update_job_status(file_uuid: str, status: str, table_name: str):
-    # Use psycopg2 to update the job status
-    with psycopg2.connect(
+def _connect():
+    """Connection to the database of the metrics, searching the dbo and POSTGRES_SCHEMA schemas"""
+    return psycopg2.connect(
         host=db_host,
         dbname=db_name,
         user=user,
         password=password,
         port=db_port,
         options=f"-c search_path=dbo,{postgres_schema}",
-    ) as conn:
+    )
+
+
+def update_job_status(file_uuid: str, status: str, table_name: str):
+    # Use psycopg2 to update the job status
+    with _connect() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 f"""
@@ -39,14 +48,185 @@ def update_job_status(file_uuid: str, status: str, table_name: str):
             conn.commit()
 
 
-def write_to_db(
-    spark_session: SparkSession, record: Dict, schema: StructType, table_name: str
+def load_checkpoints(dataset_uuid: str) -> Dict[str, str]:
+    """Outputs of the stages completed by previous attempts of the job on the dataset, by stage"""
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT "STAGE", "OUTPUT"
+                FROM {checkpoint_table_name}
+                WHERE "DATASET_UUID" = %s
+                """,
+                (dataset_uuid,),
+            )
+            return dict(cur.fetchall())
+
+
+def load_checkpoint_warnings(dataset_uuid: str) -> List[str]:
+    """Json of the warnings saved with the stages completed by previous attempts of the job on the dataset"""
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT "WARNINGS"
+                FROM {checkpoint_table_name}
+                WHERE "DATASET_UUID" = %s AND "WARNINGS" IS NOT NULL
+                """,
+                (dataset_uuid,),
+            )
+            return [warnings for (warnings,) in cur.fetchall()]
+
+
+def save_checkpoint(
+    dataset_uuid: str, stage: str, output: str, warnings: Optional[str] = None
 ):
-    out_df = spark_session.createDataFrame(data=[record], schema=schema)
-
-    # stringtype is needed for jsonb
-    out_df.write.format("jdbc").option("url", url).option(
-        "stringtype", "unspecified"
-    ).option("driver", "org.postgresql.Driver").option("user", user).option(
-        "password", password
-    ).option("dbtable", f'"{postgres_schema}"."{table_name}"').mode("append").save()
+    """
+    Saves the output of a completed stage, replacing the one of a previous attempt, with the json of the warnings
+    of the job when it completed, that a resumed job would not raise again
+    """
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                INSERT INTO {checkpoint_table_name} ("DATASET_UUID", "STAGE", "OUTPUT", "WARNINGS")
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT ("DATASET_UUID", "STAGE") DO UPDATE SET
+                "OUTPUT" = EXCLUDED."OUTPUT", "WARNINGS" = EXCLUDED."WARNINGS", "CREATED_AT" = now()
+                """,
+                (dataset_uuid, stage, output, warnings),
+            )
+            conn.commit()
+
+
+def claim_awaiting_currents(model_uuid: str) -> List[Tuple[str, str]]:
+    """
+    UUID and path of the currents of the model loaded while its reference was importing, that are left to the
+    job of the reference. They are claimed once: the job of the reference calls this after its status is updated,
+    and the currents are only left to it while the reference is importing, so none is missed or claimed twice.
+    """
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE current_dataset
+                SET "AWAITING_REFERENCE" = false
+                WHERE "MODEL_UUID" = %s AND "AWAITING_REFERENCE"
+                RETURNING "UUID", "PATH"
+                """,
+                (model_uuid,),
+            )
+            awaiting = [(str(uuid), path) for uuid, path in cur.fetchall()]
+            conn.commit()
+            return awaiting
+
+
+def load_reference_data_quality(model_uuid: str) -> Optional[str]:
+    """Json of the DATA_QUALITY of the succeeded reference of the model, decompressed, None without it"""
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT metrics."DATA_QUALITY"::text, metrics."DATA_QUALITY_COMPRESSED"
+                FROM reference_dataset_metrics metrics
+                JOIN reference_dataset reference ON metrics."REFERENCE_UUID" = reference."UUID"
+                WHERE reference."MODEL_UUID" = %s AND reference."STATUS" = %s
+                ORDER BY reference."DATE" DESC
+                LIMIT 1
+                """,
+                (model_uuid, JobStatus.SUCCEEDED),
+            )
+            row = cur.fetchone()
+    if row is None:
+        return None
+    data_quality, compressed = row
+    if compressed is not None:
+        return zlib.decompress(bytes(compressed)).decode("utf-8")
+    return data_quality
+
+
+def metrics_uuid(dataset_uuid: str) -> str:
+    """UUID of the metrics of a dataset, the same on every run of its job"""
+    return str(uuid.uuid5(uuid.UUID(dataset_uuid), "metrics"))
+
+
+def compress_sections(
+    record: Dict[str, Optional[str]], sections: List[str], min_bytes: Optional[int]
+) -> Dict[str, Optional[str]]:
+    """
+    Moves the json sections of the record of at least min_bytes to their _COMPRESSED column, zlib compressed as
+    a bytea literal. Every section gets its _COMPRESSED column, None when it is stored as json, so that writing
+    the record replaces the sections compressed by a previous attempt.
+    """
+    compressed = dict(record)
+    for section in sections:
+        value = record.get(section)
+        if (
+            min_bytes is not None
+            and value is not None
+            and len(value.encode("utf-8")) >= min_bytes
+        ):
+            compressed[section] = None
+            compressed[f"{section}_COMPRESSED"] = (
+                f"\\x{zlib.compress(value.encode('utf-8')).hex()}"
+            )
+        else:
+            compressed[f"{section}_COMPRESSED"] = None
+    return compressed
+
+
+def write_metrics(
+    record: Dict[str, Optional[str]],
+    table_name: str,
+    dataset_uuid: str,
+    dataset_table_name: str,
+):
+    """
+    Writes the metrics record in table_name and sets the dataset status to SUCCEEDED in one transaction, so the
+    metrics are never visible while the dataset is still IMPORTING. The checkpoints of the job are deleted in the
+    same transaction.
+    The row is streamed with COPY to a temporary table and upserted from there on its UUID, so the json documents
+    are not escaped in the statement and a retried job replaces the metrics of the previous attempt.
+    """
+    columns = list(record)
+    row = io.StringIO()
+    csv.writer(row).writerow(record[column] for column in columns)
+    row.seek(0)
+    column_list = ", ".join(f'"{column}"' for column in columns)
+
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                CREATE TEMPORARY TABLE staging_metrics
+                (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP
+                """
+            )
+            cur.copy_expert(
+                f"COPY staging_metrics ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                row,
+            )
+            cur.execute(
+                f"""
+                INSERT INTO {table_name} ({column_list})
+                SELECT {column_list} FROM staging_metrics
+                ON CONFLICT ("UUID") DO UPDATE SET
+                {", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns)}
+                """
+            )
+            cur.execute(
+                f"""
+                UPDATE {dataset_table_name}
+                SET "STATUS" = %s
+                WHERE "UUID" = %s
+                """,
+                (JobStatus.SUCCEEDED, dataset_uuid),
+            )
+            cur.execute(
+                f"""
+                DELETE FROM {checkpoint_table_name}
+                WHERE "DATASET_UUID" = %s
+                """,
+                (dataset_uuid,),
+            )
+            conn.commit()
@@ -0,0 +1,111 @@
+import logging
+import threading
+from typing import Any, List, Optional, Sequence
+
+import orjson
+from pyspark.sql import DataFrame
+
+from models.metrics_warning import MetricsWarning
+from utils.job_config import JobConfig
+from utils.spark import distinct_classes, most_frequent_classes
+
+
+class Guardrails:
+    """
+    Limits of the data the metrics of a job collect to the driver, from its configuration, so that a single high
+    cardinality column cannot exhaust the memory of the driver. A metric over a limit is capped or computed on a
+    sample, and a warning is logged and kept for the WARNINGS of the job output. No limit is set by default, the
+    metrics are capped only by the jobs configured with them.
+    The stages of a job running concurrently share the same guardrails.
+    """
+
+    def __init__(self, job_config: Optional[JobConfig] = None):
+        self.job_config = job_config or JobConfig()
+        self.__warnings: List[MetricsWarning] = []
+        self.__lock = threading.Lock()
+
+    def warn(self, section: str, message: str):
+        """Logs and keeps a warning, once when the same limit is hit again"""
+        warning = MetricsWarning(section=section, message=message)
+        with self.__lock:
+            if warning in self.__warnings:
+                return
+            self.__warnings.append(warning)
+        logging.warning("%s: %s", section, message)
+
+    def restore(self, warnings_json: Optional[str]):
+        """Keeps the warnings of warnings_json, saved by a previous attempt with the stages it completed"""
+        if warnings_json is None:
+            return
+        with self.__lock:
+            for warning in orjson.loads(warnings_json):
+                warning = MetricsWarning.model_validate(warning)
+                if warning not in self.__warnings:
+                    self.__warnings.append(warning)
+
+    @property
+    def warnings(self) -> List[MetricsWarning]:
+        with self.__lock:
+            return list(self.__warnings)
+
+    def warnings_json(self) -> Optional[str]:
+        """Json of the warnings for the WARNINGS of the job output, None without warnings"""
+        warnings = self.warnings
+        if not warnings:
+            return None
+        return orjson.dumps([warning.model_dump() for warning in warnings]).decode(
+            "utf-8"
+        )
+
+    def classes(
+        self, dataframe: DataFrame, columns: List[str], known: Sequence[Any] = ()
+    ) -> List[Any]:
+        """
+        Sorted distinct classes of the columns of dataframe and the known ones. Over max_collected_classes, the
+        known classes and the most frequent of the others are kept, so only max_collected_classes + 1 of them are
+        ever collected.
+        """
+        max_classes = self.job_config.max_collected_classes
+        if max_classes is None:
+            return sorted(set(known).union(distinct_classes(dataframe, columns)))
+
+        # one class more than the limit is enough to tell whether it is exceeded
+        known_classes = set(known)
+        classes = list(known) + [
+            label
+            for label in most_frequent_classes(dataframe, columns, max_classes + 1)
+            if label not in known_classes
+        ]
+        if len(classes) > max_classes:
+            classes = classes[:max_classes]
+            self.warn(
+                "MODEL_QUALITY",
+                f"{', '.join(columns)} have more than {max_classes} classes, only the {max_classes} most frequent "
+                "are indexed and the rows of the others are left out",
+            )
+        return sorted(classes)
+
+    def categories_top_k(self, top_k: Optional[int]) -> Optional[int]:
+        """top_k of the category counts capped to max_collected_categories, None when all of them are collected"""
+        max_categories = self.job_config.max_collected_categories
+        if max_categories is None:
+            return top_k
+        return max_categories if top_k is None else min(top_k, max_categories)
+
+    def sample_rows(
+        self, dataframe: DataFrame, rows: int, section: str, series: str
+    ) -> DataFrame:
+        """
+        dataframe of rows rows to collect, or a sample of at most max_collected_rows of them when it has more.
+        The sample is drawn with the sample_seed of the job, so the same dataset is always sampled the same way.
+        """
+        max_rows = self.job_config.max_collected_rows
+        if max_rows is None or rows <= max_rows:
+            return dataframe
+        self.warn(
+            section,
+            f"{series} are collected from a sample of at most {max_rows} of {rows} rows",
+        )
+        return dataframe.sample(
+            fraction=max_rows / rows, seed=self.job_config.sample_seed
+        ).limit(max_rows)
@@ -0,0 +1,98 @@
+import os
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class DuplicateRowsMode(str, Enum):
+    # dropDuplicates over all the columns
+    EXACT = "EXACT"
+    # distinct xxhash64 of the rows, collisions are negligible below billions of rows
+    HASH = "HASH"
+    # distinct xxhash64 of the rows estimated with a HLL sketch, without shuffling the rows
+    SKETCH = "SKETCH"
+
+
+class JobConfig(BaseModel):
+    """Tunable settings of a metrics job.
+
+    Every field can be overridden with an environment variable named after it
+    with the ``JOB_`` prefix, e.g. ``JOB_PARALLEL_STAGES=true``.
+    """
+
+    # Run statistics, data quality, model quality and drift concurrently
+    parallel_stages: bool = False
+    # Max number of stages submitted at the same time
+    max_parallel_stages: int = 4
+    # Max number of per-feature drift tests submitted at the same time
+    max_parallel_features: int = 4
+    # Compute data quality percentiles with percentile_approx on datasets with at least this many rows,
+    # when not set they are always exact
+    approx_percentiles_min_rows: Optional[int] = None
+    # Relative error of the approximate percentiles
+    percentile_relative_error: float = 0.001
+    # Estimate the distinct values of categorical features with a HLL sketch, counting their categories only below
+    # this cardinality, the ones of the features over it are aggregated; when not set they are always counted
+    approx_distinct_min_cardinality: Optional[int] = None
+    # Relative standard deviation of the estimated distinct values
+    distinct_rsd: float = 0.05
+    # Compute mean and quartiles of the numerical features by class for classification models, with approximate
+    # percentiles of percentile_relative_error
+    class_median_metrics: bool = False
+    # How duplicate rows are counted in statistics
+    duplicate_rows_mode: DuplicateRowsMode = DuplicateRowsMode.EXACT
+    # Count and log the values that could not be cast to the type of their column, while counting the rows
+    cast_failures_report: bool = False
+    # Store the json metrics sections of at least this many bytes zlib compressed, in their _COMPRESSED bytea
+    # column; when not set they are always stored as jsonb
+    compressed_metrics_min_bytes: Optional[int] = None
+    # Save the output of every stage as soon as it completes, until the metrics are written
+    checkpoint_stages: bool = False
+    # Reuse the stage outputs saved by a previous attempt of the job on the same dataset instead of recomputing them
+    resume_stages: bool = False
+    # Repartition the current once by time bucket, sorted by timestamp and cached, so that the metrics grouped by
+    # time bucket reuse its layout instead of shuffling the dataset again
+    partition_by_time_bucket: bool = False
+    # Compute the current metrics on a stratified sample of about this many rows, by time bucket and class, with
+    # confidence intervals of the headline model quality metrics; when not set they are computed on all the rows
+    sample_size: Optional[int] = None
+    # Min rows sampled from every time bucket and class, all of them when it has fewer; the strata under it are
+    # sampled with a higher fraction, and weighted accordingly by the estimates of the sampled metrics
+    sample_min_stratum_rows: int = 100
+    # Seed of the sample, the same dataset is always sampled the same way
+    sample_seed: int = 42
+    # Confidence level of the confidence intervals of the sampled metrics
+    sample_confidence_level: float = 0.95
+    # Max classes of prediction and target collected to index them, over it only the most frequent are indexed and
+    # the rows of the others are left out of the model quality; when not set all the classes are collected
+    max_collected_classes: Optional[int] = None
+    # Max categories of every categorical feature and class column collected with their frequency, over it the
+    # less frequent are aggregated; when not set all of them are collected
+    max_collected_categories: Optional[int] = None
+    # Max rows of the per-row series collected to the driver, as the residuals of regression models, over it they
+    # are collected from a sample; when not set all the rows are collected
+    max_collected_rows: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "JobConfig":
+        return cls(
+            **{
+                name: os.getenv(f"JOB_{name.upper()}")
+                for name in cls.model_fields
+                if os.getenv(f"JOB_{name.upper()}") is not None
+            }
+        )
+
+    def percentile_relative_error_for(self, count: int) -> Optional[float]:
+        """Relative error of the percentiles of a dataset with count rows, None when they are exact"""
+        if (
+            self.approx_percentiles_min_rows is not None
+            and count >= self.approx_percentiles_min_rows
+        ):
+            return self.percentile_relative_error
+        return None
+
+    def class_relative_error(self) -> Optional[float]:
+        """Relative error of the class median metrics, None when they are not computed"""
+        return self.percentile_relative_error if self.class_median_metrics else None
@@ -1,8 +1,22 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from pyspark.sql import Column
+import pyspark.sql.functions as F
+
 from utils.models import Granularity
 
 
+T = TypeVar("T")
+
 rbit_prefix = "rbit_spark"
 
+time_group_column = "time_group"
+
+SECONDS_IN_DAY = 86400
+SECONDS_IN_HOUR = 3600
+
 
 def split_dict(dictionary):
     cleaned_dict = dict()
@@ -12,13 +26,118 @@ def split_dict(dictionary):
     return cleaned_dict
 
 
-def create_time_format(granularity: Granularity):
+def log_cast_failures(cast_failures: Optional[Dict[str, int]], dataset_path: str):
+    """Logs the columns of a dataset with values that could not be cast to their model type"""
+    failures = {
+        column: count for column, count in (cast_failures or dict()).items() if count
+    }
+    if failures:
+        logging.warning(
+            "Values of %s that could not be cast, by column: %s", dataset_path, failures
+        )
+
+
+def log_time_partitions(time_partitions: Dict[int, Dict[str, int]]):
+    """Logs the partitions and the rows of every time bucket of a dataset partitioned by time bucket"""
+    logging.info(
+        "Partitions and rows by time bucket: %s",
+        {
+            # rows without timestamp have no bucket
+            format_time_bucket(bucket) if bucket is not None else None: partitions
+            for bucket, partitions in time_partitions.items()
+        },
+    )
+
+
+def time_bucket(timestamp_column: str, granularity: Granularity) -> Column:
+    """
+    Long key of the time bucket of timestamp_column: the seconds from epoch of the start of the bucket, taking
+    the wall clock of the session time zone as UTC. Weeks start on sunday.
+    Being computed only with date arithmetic, the key is cheap to group and filter on, and it is turned into a
+    string by format_time_bucket only when writing the output.
+    """
+    timestamp = F.col(timestamp_column)
+    day = F.unix_date(F.to_date(timestamp)).cast("long")
+    match granularity:
+        case Granularity.HOUR:
+            return day * SECONDS_IN_DAY + F.hour(timestamp) * SECONDS_IN_HOUR
+        case Granularity.DAY:
+            return day * SECONDS_IN_DAY
+        case Granularity.WEEK:
+            return (day - F.dayofweek(timestamp) + 1) * SECONDS_IN_DAY
+        case Granularity.MONTH:
+            return (
+                F.unix_date(F.trunc(F.to_date(timestamp), "month")).cast("long")
+                * SECONDS_IN_DAY
+            )
+
+
+def format_time_bucket(bucket: int) -> str:
+    return datetime.fromtimestamp(bucket, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Granularities whose grouped metrics are also rolled up, from the finest to the coarsest
+rollup_granularities = [Granularity.DAY, Granularity.WEEK, Granularity.MONTH]
+
+
+def finest_granularity(granularity: Granularity) -> Granularity:
+    """
+    Granularity of the per-bucket state that every rollup of granularity is derived from.
+    Weeks and months are not nested in each other, so coarse models are aggregated by day.
+    """
+    return Granularity.HOUR if granularity == Granularity.HOUR else Granularity.DAY
+
+
+def coarser_granularities(granularity: Granularity) -> List[Granularity]:
+    if granularity == Granularity.HOUR:
+        return rollup_granularities
+    return rollup_granularities[rollup_granularities.index(granularity) + 1 :]
+
+
+def roll_up_time_bucket(bucket: int, granularity: Granularity) -> int:
+    """Key of the bucket of a coarser granularity containing the time_bucket key bucket"""
+    start = datetime.fromtimestamp(bucket, tz=timezone.utc).replace(minute=0, second=0)
     match granularity:
         case Granularity.HOUR:
-            return "yyyy-MM-dd HH"
+            pass
         case Granularity.DAY:
-            return "yyyy-MM-dd"
+            start = start.replace(hour=0)
         case Granularity.WEEK:
-            return "yyyy-MM-dd"
+            start = start.replace(hour=0) - timedelta(days=(start.weekday() + 1) % 7)
         case Granularity.MONTH:
-            return "yyyy-MM"
+            start = start.replace(day=1, hour=0)
+    return int(start.timestamp())
+
+
+def roll_up(
+    state_by_bucket: Dict[int, T],
+    granularity: Granularity,
+    merge: Callable[[List[T]], T],
+) -> Dict[int, T]:
+    """
+    Merges the states of the buckets falling in the same bucket of a coarser granularity.
+    The state of rows without timestamp, under the None key, is left out.
+    """
+    states_by_rollup = dict()
+    for bucket in sorted(bucket for bucket in state_by_bucket if bucket is not None):
+        states_by_rollup.setdefault(
+            roll_up_time_bucket(bucket, granularity), []
+        ).append(state_by_bucket[bucket])
+    return {bucket: merge(states) for bucket, states in states_by_rollup.items()}
+
+
+def time_series(
+    values_by_bucket: Dict[int, Dict[str, float]], names: List[str]
+) -> Dict[str, List[Dict]]:
+    """Grouped metrics as written in the output: for every name, its values in time order"""
+    buckets = sorted(values_by_bucket)
+    return {
+        name: [
+            {
+                "timestamp": format_time_bucket(bucket),
+                "value": values_by_bucket[bucket][name],
+            }
+            for bucket in buckets
+        ]
+        for name in names
+    }
@@ -76,6 +76,14 @@ class ColumnDefinition(BaseModel):
         return self.field_type == FieldTypes.datetime
 
 
+class PartitionFilter(BaseModel):
+    # Partition column of a partitioned dataset directory, e.g. date for .../date=2024-06-16/part-0.csv
+    column: str
+    # Inclusive bounds of the partition values to read, when not set the range is open
+    start: Optional[str] = None
+    end: Optional[str] = None
+
+
 class OutputType(BaseModel):
     prediction: ColumnDefinition
     prediction_proba: Optional[ColumnDefinition] = None
@@ -95,6 +103,8 @@ class ModelOut(BaseModel):
     timestamp: ColumnDefinition
     frameworks: Optional[str]
     algorithm: Optional[str]
+    # Number of most frequent categories listed in data quality, the others are aggregated
+    category_top_k: Optional[int] = None
     created_at: str
     updated_at: str
 
@@ -1,15 +1,13 @@
-from typing import List
+from typing import List, Optional
 
 from pyspark.sql import DataFrame
 from pyspark.ml.evaluation import (
     BinaryClassificationEvaluator,
     MulticlassClassificationEvaluator,
 )
-from pyspark.mllib.evaluation import MulticlassMetrics
-from pyspark.sql.types import DoubleType
-import pyspark.sql.functions as F
 
 from metrics.data_quality_calculator import DataQualityCalculator
+from metrics.model_quality_binary_calculator import ModelQualityBinaryCalculator
 from models.data_quality import (
     NumericalFeatureMetrics,
     CategoricalFeatureMetrics,
@@ -17,8 +15,9 @@ from models.data_quality import (
     BinaryClassDataQuality,
 )
 from models.reference_dataset import ReferenceDataset
+from .guardrails import Guardrails
+from .job_config import JobConfig
 from .spark import is_not_null
-from .misc import rbit_prefix
 
 
 class ReferenceMetricsService:
@@ -43,8 +42,12 @@ class ReferenceMetricsService:
         "fMeasureByLabel": "f_measure",
     }
 
-    def __init__(self, reference: ReferenceDataset):
+    def __init__(
+        self, reference: ReferenceDataset, job_config: Optional[JobConfig] = None
+    ):
         self.reference = reference
+        self.job_config = job_config or JobConfig()
+        self.guardrails = Guardrails(self.job_config)
 
     def __evaluate_binary_classification(
         self, dataset: DataFrame, metric_name: str
@@ -102,111 +105,42 @@ class ReferenceMetricsService:
     # FIXME use pydantic struct like data quality
     def calculate_model_quality(self) -> dict[str, float]:
         metrics = self.__calc_mc_metrics()
-        metrics.update(self.calculate_confusion_matrix())
+        # confusion matrix and log loss come from the same aggregation
+        aggregated_metrics = ModelQualityBinaryCalculator.aggregated_metrics(
+            self.reference.model, self.reference.reference
+        )
+        metrics.update(
+            {
+                metric: aggregated_metrics[metric]
+                for metric in ModelQualityBinaryCalculator.confusion_matrix_metrics
+            }
+        )
         if self.reference.model.outputs.prediction_proba is not None:
             metrics.update(self.__calc_bc_metrics())
-            metrics.update(self.__calculate_log_loss())
+            metrics["log_loss"] = aggregated_metrics["log_loss"]
 
         return metrics
 
     # FIXME use pydantic struct like data quality
     def calculate_confusion_matrix(self) -> dict[str, float]:
-        prediction_and_label = (
-            self.reference.reference.filter(
-                is_not_null(self.reference.model.outputs.prediction.name)
-                & is_not_null(self.reference.model.target.name)
-            )
-            .select(
-                [
-                    self.reference.model.outputs.prediction.name,
-                    self.reference.model.target.name,
-                ]
-            )
-            .withColumn(
-                self.reference.model.target.name,
-                F.col(self.reference.model.target.name),
+        return (
+            self.reference.reference.agg(
+                *ModelQualityBinaryCalculator.confusion_matrix_agg(self.reference.model)
             )
-            .orderBy(self.reference.model.target.name)
+            .collect()[0]
+            .asDict()
         )
 
-        tp = prediction_and_label.filter(
-            (F.col(self.reference.model.outputs.prediction.name) == 1)
-            & (F.col(self.reference.model.target.name) == 1)
-        ).count()
-        tn = prediction_and_label.filter(
-            (F.col(self.reference.model.outputs.prediction.name) == 0)
-            & (F.col(self.reference.model.target.name) == 0)
-        ).count()
-        fp = prediction_and_label.filter(
-            (F.col(self.reference.model.outputs.prediction.name) == 1)
-            & (F.col(self.reference.model.target.name) == 0)
-        ).count()
-        fn = prediction_and_label.filter(
-            (F.col(self.reference.model.outputs.prediction.name) == 0)
-            & (F.col(self.reference.model.target.name) == 1)
-        ).count()
-
-        return {
-            "true_positive_count": tp,
-            "false_positive_count": fp,
-            "true_negative_count": tn,
-            "false_negative_count": fn,
-        }
-
-    def __calculate_log_loss(self) -> dict[str, float]:
-        dataset_with_proba = (
-            self.reference.reference.filter(
-                is_not_null(self.reference.model.outputs.prediction.name)
-                & is_not_null(self.reference.model.target.name)
-                & is_not_null(self.reference.model.outputs.prediction_proba.name)
-            )
-            .withColumn(
-                f"{rbit_prefix}_prediction_proba_class0",
-                F.when(
-                    F.col(self.reference.model.outputs.prediction.name) == 0,
-                    F.col(self.reference.model.outputs.prediction_proba.name),
-                ).otherwise(
-                    1 - F.col(self.reference.model.outputs.prediction_proba.name)
-                ),
-            )
-            .withColumn(
-                f"{rbit_prefix}_prediction_proba_class1",
-                F.when(
-                    F.col(self.reference.model.outputs.prediction.name) == 1,
-                    F.col(self.reference.model.outputs.prediction_proba.name),
-                ).otherwise(
-                    1 - F.col(self.reference.model.outputs.prediction_proba.name)
-                ),
-            )
-            .withColumn(f"{rbit_prefix}_weight_logloss_def", F.lit(1.0))
-            .withColumn(
-                self.reference.model.outputs.prediction.name,
-                F.col(self.reference.model.outputs.prediction.name).cast(DoubleType()),
-            )
-            .withColumn(
-                self.reference.model.target.name,
-                F.col(self.reference.model.target.name).cast(DoubleType()),
-            )
-        )
-
-        dataset_proba_vector = dataset_with_proba.select(
-            self.reference.model.outputs.prediction.name,
-            self.reference.model.target.name,
-            f"{rbit_prefix}_weight_logloss_def",
-            F.array(
-                F.col(f"{rbit_prefix}_prediction_proba_class0"),
-                F.col(f"{rbit_prefix}_prediction_proba_class1"),
-            ).alias(f"{rbit_prefix}_prediction_proba_vector"),
-        ).rdd
-
-        metrics = MulticlassMetrics(dataset_proba_vector)
-        return {"log_loss": metrics.logLoss()}
-
     def calculate_data_quality_numerical(self) -> List[NumericalFeatureMetrics]:
         return DataQualityCalculator.numerical_metrics(
             model=self.reference.model,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.reference.reference_count
+            ),
+            class_relative_error=self.job_config.class_relative_error(),
+            bounds=self.reference.numerical_bounds(),
         )
 
     def calculate_data_quality_categorical(self) -> List[CategoricalFeatureMetrics]:
@@ -214,6 +148,9 @@ class ReferenceMetricsService:
             model=self.reference.model,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            approx_distinct_min_cardinality=self.job_config.approx_distinct_min_cardinality,
+            distinct_rsd=self.job_config.distinct_rsd,
+            guardrails=self.guardrails,
         )
 
     def calculate_class_metrics(self, column) -> List[ClassMetrics]:
@@ -221,6 +158,7 @@ class ReferenceMetricsService:
             class_column=column,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            guardrails=self.guardrails,
         )
 
         # FIXME this should be avoided if we are sure that we have all classes in the file
@@ -1,11 +1,10 @@
-from typing import List, Dict
-
-from pyspark.ml.evaluation import MulticlassClassificationEvaluator
-from pyspark.mllib.evaluation import MulticlassMetrics
-from pyspark.sql import DataFrame
-import pyspark.sql.functions as f
+from typing import List, Dict, Optional
 
 from metrics.data_quality_calculator import DataQualityCalculator
+from metrics.model_quality_multiclass_calculator import (
+    Confusions,
+    ModelQualityMulticlassCalculator,
+)
 from models.reference_dataset import ReferenceDataset
 from models.data_quality import (
     NumericalFeatureMetrics,
@@ -13,116 +12,51 @@ from models.data_quality import (
     ClassMetrics,
     MultiClassDataQuality,
 )
+from utils.guardrails import Guardrails
+from utils.job_config import JobConfig
 from utils.misc import rbit_prefix
 
 
 class ReferenceMetricsMulticlassService:
-    def __init__(self, reference: ReferenceDataset):
+    def __init__(
+        self, reference: ReferenceDataset, job_config: Optional[JobConfig] = None
+    ):
         self.reference = reference
-        index_label_map, indexed_reference = reference.get_string_indexed_dataframe()
+        self.job_config = job_config or JobConfig()
+        self.guardrails = Guardrails(self.job_config)
+        index_label_map, indexed_reference = reference.get_string_indexed_dataframe(
+            self.guardrails
+        )
         self.index_label_map = index_label_map
         self.indexed_reference = indexed_reference
-        self.model_quality_multiclass_classificator_global = {
-            "f1": "f1",
-            "accuracy": "accuracy",
-            "weightedPrecision": "weighted_precision",
-            "weightedRecall": "weighted_recall",
-            "weightedTruePositiveRate": "weighted_true_positive_rate",
-            "weightedFalsePositiveRate": "weighted_false_positive_rate",
-            "weightedFMeasure": "weighted_f_measure",
-        }
-        self.model_quality_multiclass_classificator_by_label = {
-            "truePositiveRateByLabel": "true_positive_rate",
-            "falsePositiveRateByLabel": "false_positive_rate",
-            "precisionByLabel": "precision",
-            "recallByLabel": "recall",
-            "fMeasureByLabel": "f_measure",
-        }
 
-    def __evaluate_multi_class_classification(
-        self, dataset: DataFrame, metric_name: str, class_index: float
-    ) -> float:
-        try:
-            return MulticlassClassificationEvaluator(
-                metricName=metric_name,
-                predictionCol=f"{rbit_prefix}_{self.reference.model.outputs.prediction.name}-idx",
-                labelCol=f"{rbit_prefix}_{self.reference.model.target.name}-idx",
-                metricLabel=class_index,
-            ).evaluate(dataset)
-        except Exception:
-            return float("nan")
+    def __calc_confusions(self) -> Confusions:
+        return ModelQualityMulticlassCalculator.confusion_counts_by_group(
+            self.indexed_reference,
+            prediction_column=f"{rbit_prefix}_{self.reference.model.outputs.prediction.name}-idx",
+            target_column=f"{rbit_prefix}_{self.reference.model.target.name}-idx",
+        ).get(None, dict())
 
     # FIXME use pydantic struct like data quality
-    def __calc_multiclass_by_label_metrics(self) -> List[Dict]:
+    def __calc_multiclass_by_label_metrics(self, confusions: Confusions) -> List[Dict]:
         return [
             {
                 "class_name": label,
-                "metrics": {
-                    metric_label: self.__evaluate_multi_class_classification(
-                        self.indexed_reference.filter(
-                            ~(
-                                f.col(
-                                    self.reference.model.outputs.prediction.name
-                                ).isNull()
-                                | f.isnan(
-                                    f.col(self.reference.model.outputs.prediction.name)
-                                )
-                            )
-                            & ~(
-                                f.col(self.reference.model.target.name).isNull()
-                                | f.isnan(f.col(self.reference.model.target.name))
-                            )
-                        ),
-                        metric_name,
-                        float(index),
-                    )
-                    for (
-                        metric_name,
-                        metric_label,
-                    ) in self.model_quality_multiclass_classificator_by_label.items()
-                },
+                "metrics": ModelQualityMulticlassCalculator.label_metrics(
+                    confusions, float(index)
+                ),
             }
             for index, label in self.index_label_map.items()
         ]
 
-    def __calc_multiclass_global_metrics(self) -> Dict:
-        return {
-            metric_label: self.__evaluate_multi_class_classification(
-                self.indexed_reference, metric_name, 0.0
-            )
-            for (
-                metric_name,
-                metric_label,
-            ) in self.model_quality_multiclass_classificator_global.items()
-        }
-
-    def __calc_confusion_matrix(self):
-        prediction_and_labels = (
-            self.indexed_reference.filter(
-                ~(
-                    f.col(self.reference.model.outputs.prediction.name).isNull()
-                    | f.isnan(f.col(self.reference.model.outputs.prediction.name))
-                )
-                & ~(
-                    f.col(self.reference.model.target.name).isNull()
-                    | f.isnan(f.col(self.reference.model.target.name))
-                )
-            )
-            .select(
-                *[
-                    f"{rbit_prefix}_{self.reference.model.outputs.prediction.name}-idx",
-                    f"{rbit_prefix}_{self.reference.model.target.name}-idx",
-                ]
-            )
-            .rdd
-        )
-        multiclass_metrics_calculator = MulticlassMetrics(prediction_and_labels)
-        return multiclass_metrics_calculator.confusionMatrix().toArray().tolist()
-
     def calculate_model_quality(self) -> Dict:
-        metrics_by_label = self.__calc_multiclass_by_label_metrics()
-        global_metrics = self.__calc_multiclass_global_metrics()
-        global_metrics["confusion_matrix"] = self.__calc_confusion_matrix()
+        # A single (label, prediction) count feeds every metric
+        confusions = self.__calc_confusions()
+        metrics_by_label = self.__calc_multiclass_by_label_metrics(confusions)
+        global_metrics = ModelQualityMulticlassCalculator.global_metrics(confusions)
+        global_metrics["confusion_matrix"] = (
+            ModelQualityMulticlassCalculator.confusion_matrix(confusions)
+        )
         metrics = {
             "classes": list(self.index_label_map.values()),
             "class_metrics": metrics_by_label,
@@ -136,6 +70,11 @@ class ReferenceMetricsMulticlassService:
             model=self.reference.model,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.reference.reference_count
+            ),
+            class_relative_error=self.job_config.class_relative_error(),
+            bounds=self.reference.numerical_bounds(),
         )
 
     def calculate_data_quality_categorical(self) -> List[CategoricalFeatureMetrics]:
@@ -143,6 +82,9 @@ class ReferenceMetricsMulticlassService:
             model=self.reference.model,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            approx_distinct_min_cardinality=self.job_config.approx_distinct_min_cardinality,
+            distinct_rsd=self.job_config.distinct_rsd,
+            guardrails=self.guardrails,
         )
 
     def calculate_class_metrics(self, column) -> List[ClassMetrics]:
@@ -150,6 +92,7 @@ class ReferenceMetricsMulticlassService:
             class_column=column,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            guardrails=self.guardrails,
         )
 
     def calculate_data_quality(self) -> MultiClassDataQuality:
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from models.regression_model_quality import ModelQualityRegression
 from models.reference_dataset import ReferenceDataset
 from metrics.model_quality_regression_calculator import ModelQualityRegressionCalculator
@@ -9,22 +9,31 @@ from models.data_quality import (
     RegressionDataQuality,
 )
 from metrics.data_quality_calculator import DataQualityCalculator
+from utils.guardrails import Guardrails
+from utils.job_config import JobConfig
 
 
 class ReferenceMetricsRegressionService:
-    def __init__(self, reference: ReferenceDataset):
+    def __init__(
+        self, reference: ReferenceDataset, job_config: Optional[JobConfig] = None
+    ):
         self.reference = reference
+        self.job_config = job_config or JobConfig()
+        self.guardrails = Guardrails(self.job_config)
 
     def calculate_model_quality(self) -> ModelQualityRegression:
         metrics = ModelQualityRegressionCalculator.numerical_metrics(
             model=self.reference.model,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            dataframe_clean_count=self.reference.counts.clean_pairs,
         ).dict()
 
         metrics["residuals"] = ModelQualityRegressionCalculator.residual_metrics(
             model=self.reference.model,
             dataframe=self.reference.reference,
+            dataframe_clean_count=self.reference.counts.clean_pairs,
+            guardrails=self.guardrails,
         )
 
         return metrics
@@ -34,6 +43,10 @@ class ReferenceMetricsRegressionService:
             model=self.reference.model,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.reference.reference_count
+            ),
+            bounds=self.reference.numerical_bounds(),
         )
 
     def calculate_data_quality_categorical(self) -> List[CategoricalFeatureMetrics]:
@@ -41,6 +54,9 @@ class ReferenceMetricsRegressionService:
             model=self.reference.model,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            approx_distinct_min_cardinality=self.job_config.approx_distinct_min_cardinality,
+            distinct_rsd=self.job_config.distinct_rsd,
+            guardrails=self.guardrails,
         )
 
     def calculate_target_metrics(self) -> NumericalTargetMetrics:
@@ -48,6 +64,9 @@ class ReferenceMetricsRegressionService:
             target_column=self.reference.model.target.name,
             dataframe=self.reference.reference,
             dataframe_count=self.reference.reference_count,
+            relative_error=self.job_config.percentile_relative_error_for(
+                self.reference.reference_count
+            ),
         )
 
     def calculate_data_quality(self) -> RegressionDataQuality:
@@ -0,0 +1,242 @@
+from itertools import chain
+import math
+from statistics import NormalDist
+from typing import Optional, Tuple
+
+from pyspark.sql import Column, DataFrame, Window
+import pyspark.sql.functions as F
+
+from models.current_dataset import CurrentDataset
+from models.sampling import ConfidenceInterval, SampleDesign, Sampling
+from utils.misc import time_bucket
+from utils.models import ModelOut, ModelType
+from utils.spark import is_not_null
+
+
+def stratum(model: ModelOut) -> Column:
+    """Stratum of every row: its time bucket and, for classification models, its class"""
+    columns = [time_bucket(model.timestamp.name, model.granularity)]
+    if model.model_type != ModelType.REGRESSION:
+        columns.append(F.col(model.target.name))
+    return F.concat_ws(
+        "|", *[F.coalesce(column.cast("string"), F.lit("null")) for column in columns]
+    )
+
+
+def stratified_sample(
+    current_dataset: CurrentDataset,
+    sample_size: int,
+    seed: int,
+    min_stratum_rows: int = 0,
+) -> Optional[Tuple[CurrentDataset, SampleDesign]]:
+    """
+    Stratified sample of at least about sample_size rows of the current dataset, with its design, None when the
+    dataset is not larger than the sample.
+    Every stratum is sampled with the fraction sample_size of all the rows, raised so that it keeps about
+    min_stratum_rows rows, or all of them when it has fewer: rare time buckets and minority classes are
+    oversampled, so the metrics by time bucket and class have enough rows. The rows of the oversampled strata are
+    over-represented, so the estimates of the metrics on the population are weighted by the inclusion weights of
+    the design. The sample is cached, so all the calculators see the same rows.
+    """
+    model = current_dataset.model
+    strata_counts = {
+        row["stratum"]: row["count"]
+        for row in current_dataset.current.groupBy(stratum(model).alias("stratum"))
+        .count()
+        .collect()
+    }
+    population_size = sum(strata_counts.values())
+    if population_size <= sample_size:
+        return None
+    fraction = sample_size / population_size
+    fractions = {
+        name: min(1.0, max(fraction, min_stratum_rows / count))
+        for name, count in strata_counts.items()
+    }
+    sample = current_dataset.current.sampleBy(stratum(model), fractions, seed).cache()
+    return current_dataset.sample(sample), SampleDesign(
+        population_size=population_size,
+        weights={name: 1 / fraction for name, fraction in fractions.items()},
+    )
+
+
+def normal_interval(
+    estimate: float,
+    standard_error: float,
+    confidence_level: float,
+    bounds: Tuple[float, float] = (-math.inf, math.inf),
+) -> ConfidenceInterval:
+    z = NormalDist().inv_cdf((1 + confidence_level) / 2)
+    return ConfidenceInterval(
+        lower=max(bounds[0], estimate - z * standard_error),
+        upper=min(bounds[1], estimate + z * standard_error),
+    )
+
+
+def auc_standard_error(auc: float, positives: int, negatives: int) -> float:
+    """Hanley and McNeil standard error of the area under the ROC curve"""
+    q1 = auc / (2 - auc)
+    q2 = 2 * auc**2 / (1 + auc)
+    return math.sqrt(
+        (
+            auc * (1 - auc)
+            + (positives - 1) * (q1 - auc**2)
+            + (negatives - 1) * (q2 - auc**2)
+        )
+        / (positives * negatives)
+    )
+
+
+def weighted_auc(
+    dataframe: DataFrame, score: str, target: str, weight: Column
+) -> Optional[float]:
+    """
+    Area under the ROC curve of the clean rows of dataframe with the rows weighted by weight: the weighted share
+    of the pairs of a positive and a negative where the positive has the higher score, ties counting half.
+    The scores are grouped first, so only the distinct scores of the sample are ordered.
+    """
+    by_score = (
+        dataframe.filter(is_not_null(score) & is_not_null(target))
+        .groupBy(score)
+        .agg(
+            F.sum(F.when(F.col(target) == 1, weight).otherwise(0.0)).alias("positives"),
+            F.sum(F.when(F.col(target) == 0, weight).otherwise(0.0)).alias("negatives"),
+        )
+    )
+    lower_negatives = F.coalesce(
+        F.sum("negatives").over(
+            Window.orderBy(score).rowsBetween(Window.unboundedPreceding, -1)
+        ),
+        F.lit(0.0),
+    )
+    row = (
+        by_score.withColumn("lower_negatives", lower_negatives)
+        .agg(
+            F.sum(
+                F.col("positives") * (F.col("lower_negatives") + F.col("negatives") / 2)
+            ).alias("pairs"),
+            F.sum("positives").alias("positives"),
+            F.sum("negatives").alias("negatives"),
+        )
+        .collect()[0]
+    )
+    if not row["positives"] or not row["negatives"]:
+        return None
+    return row["pairs"] / (row["positives"] * row["negatives"])
+
+
+def sampling(
+    current_sample: CurrentDataset,
+    sample_design: SampleDesign,
+    confidence_level: float,
+) -> Sampling:
+    """
+    Sizes of the sample, estimates of the headline model quality metrics on the population and their analytic
+    confidence intervals: accuracy of classification models, area under ROC of binary models with probabilities
+    and MAE of regression ones.
+    Every row is weighted by the inclusion weight of its stratum, so the estimates are not biased by the
+    oversampled strata. The standard errors are those of the Kish effective sample size of the weights, with the
+    finite population correction of sampling without replacement.
+    """
+    model = current_sample.model
+    prediction = F.col(model.outputs.prediction.name)
+    target = F.col(model.target.name)
+    clean = is_not_null(model.outputs.prediction.name) & is_not_null(model.target.name)
+    binary_with_proba = (
+        model.model_type == ModelType.BINARY
+        and model.outputs.prediction_proba is not None
+    )
+    weight = F.create_map(
+        *chain.from_iterable(
+            (F.lit(name), F.lit(value)) for name, value in sample_design.weights.items()
+        )
+    )[stratum(model)]
+
+    def weighted_sum(value: Column, condition: Column = F.lit(True)) -> Column:
+        return F.sum(F.when(clean & condition, weight * value))
+
+    aggregations = [
+        weighted_sum(F.lit(1.0)).alias("weights"),
+        weighted_sum(weight).alias("squared_weights"),
+    ]
+    if model.model_type == ModelType.REGRESSION:
+        error = F.abs(target - prediction)
+        aggregations += [
+            weighted_sum(error).alias("errors"),
+            weighted_sum(error * error).alias("squared_errors"),
+        ]
+    else:
+        aggregations.append(
+            weighted_sum(F.lit(1.0), prediction == target).alias("correct")
+        )
+        if binary_with_proba:
+            aggregations += [
+                weighted_sum(F.lit(1.0), target == 1).alias("positives"),
+                weighted_sum(weight, target == 1).alias("squared_positives"),
+                weighted_sum(F.lit(1.0), target == 0).alias("negatives"),
+                weighted_sum(weight, target == 0).alias("squared_negatives"),
+            ]
+    sums = current_sample.current.agg(*aggregations).collect()[0]
+
+    sample_size = current_sample.current_count
+    fpc = math.sqrt(1 - sample_size / sample_design.population_size)
+
+    def effective_size(
+        weights: Optional[float], squared_weights: Optional[float]
+    ) -> float:
+        return weights**2 / squared_weights if weights else 0.0
+
+    clean_pairs = effective_size(sums["weights"], sums["squared_weights"])
+    estimates = {}
+    confidence_intervals = {}
+    if clean_pairs > 1:
+        if model.model_type == ModelType.REGRESSION:
+            mae = sums["errors"] / sums["weights"]
+            error_std = math.sqrt(
+                max(sums["squared_errors"] / sums["weights"] - mae**2, 0.0)
+            )
+            estimates["mae"] = mae
+            confidence_intervals["mae"] = normal_interval(
+                mae,
+                error_std / math.sqrt(clean_pairs) * fpc,
+                confidence_level,
+                (0.0, math.inf),
+            )
+        else:
+            accuracy = sums["correct"] / sums["weights"]
+            estimates["accuracy"] = accuracy
+            confidence_intervals["accuracy"] = normal_interval(
+                accuracy,
+                math.sqrt(accuracy * (1 - accuracy) / clean_pairs) * fpc,
+                confidence_level,
+                (0.0, 1.0),
+            )
+    if binary_with_proba:
+        positives = effective_size(sums["positives"], sums["squared_positives"])
+        negatives = effective_size(sums["negatives"], sums["squared_negatives"])
+        auc = (
+            weighted_auc(
+                current_sample.current,
+                model.outputs.prediction_proba.name,
+                model.target.name,
+                weight,
+            )
+            if positives > 1 and negatives > 1
+            else None
+        )
+        if auc is not None:
+            estimates["area_under_roc"] = auc
+            confidence_intervals["area_under_roc"] = normal_interval(
+                auc,
+                auc_standard_error(auc, positives, negatives) * fpc,
+                confidence_level,
+                (0.0, 1.0),
+            )
+
+    return Sampling(
+        population_size=sample_design.population_size,
+        sample_size=sample_size,
+        confidence_level=confidence_level,
+        estimates=estimates,
+        confidence_intervals=confidence_intervals,
+    )
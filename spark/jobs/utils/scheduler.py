@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Optional, TypeVar
+
+from pyspark.sql import SparkSession
+
+T = TypeVar("T")
+
+
+def run_in_pools(
+    spark_session: SparkSession,
+    tasks: Dict[str, Callable[[], T]],
+    max_workers: int,
+    pool: Optional[str] = None,
+) -> Dict[str, T]:
+    """
+    Runs independent tasks from a driver thread pool, so that the Spark jobs they submit can share the cluster.
+
+    Each task is tagged with a scheduler pool (the given one or its own key), which is honoured when the session
+    runs with spark.scheduler.mode=FAIR. With max_workers <= 1 the tasks run sequentially on the calling thread.
+    Results are returned with the same keys and order of the tasks, the first raised exception is propagated.
+    """
+    if max_workers <= 1 or len(tasks) <= 1:
+        return {name: task() for name, task in tasks.items()}
+
+    spark_context = spark_session.sparkContext
+
+    def run_in_pool(name: str, task: Callable[[], T]) -> T:
+        spark_context.setLocalProperty("spark.scheduler.pool", pool or name)
+        try:
+            return task()
+        finally:
+            spark_context.setLocalProperty("spark.scheduler.pool", None)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as executor:
+        futures = {
+            name: executor.submit(run_in_pool, name, task)
+            for name, task in tasks.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def with_checkpoints(
+    tasks: Dict[str, Callable[[], T]],
+    completed: Optional[Dict[str, T]] = None,
+    save: Optional[Callable[[str, T], None]] = None,
+) -> Dict[str, Callable[[], T]]:
+    """
+    Wraps the tasks so that they can be resumed after a failure of the job.
+
+    Tasks with a result in completed, saved by a previous attempt, return it without running again. The other
+    ones pass their result to save as soon as they complete, before the remaining tasks finish.
+    """
+    completed = completed or {}
+
+    def run_and_save(name: str, task: Callable[[], T]) -> T:
+        result = task()
+        if save is not None:
+            save(name, result)
+        return result
+
+    return {
+        name: (
+            partial(completed.get, name)
+            if name in completed
+            else partial(run_and_save, name, task)
+        )
+        for name, task in tasks.items()
+    }
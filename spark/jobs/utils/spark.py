@@ -1,10 +1,91 @@
+from functools import reduce
+from itertools import chain
+from math import ceil, isinf, isnan
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pyspark.sql import Column, DataFrame, SparkSession
 import pyspark.sql.functions as F
+from pyspark.sql.types import StructType
+
+from utils.misc import rbit_prefix
+from utils.models import PartitionFilter
+
+
+# Max number of aggregate expressions evaluated by a single aggregation: wider aggregations take long to
+# optimize and their generated code exceeds the 64KB JVM method limit, falling back to interpreted evaluation
+MAX_AGGREGATIONS_PER_CHUNK = 512
+
+# Characters of a Hadoop glob, the same the API looks for to size a bound path as a glob
+GLOB_CHARACTERS = "*?[{"
+
+
+def glob_base_path(path: str) -> Optional[str]:
+    """Directory of path before its first component with a glob pattern, None when path has no pattern"""
+    components = path.split("/")
+    for index, component in enumerate(components):
+        if any(character in component for character in GLOB_CHARACTERS):
+            return "/".join(components[:index])
+    return None
+
+
+def read_csv_dataset(
+    spark_session: SparkSession,
+    path: str,
+    partition_filter: Optional[PartitionFilter] = None,
+) -> DataFrame:
+    """
+    Reads a csv dataset from a single file, a directory of part files or a glob of them. Partition columns of
+    directories named column=value are discovered, also below the base directory of a glob, and the part files
+    are split across the tasks of the read.
+    With partition_filter, the filter is pushed down to the scan and only the partitions in its range are read.
+    """
+    reader = spark_session.read.option("header", True)
+    base_path = glob_base_path(path)
+    if base_path is not None:
+        reader = reader.option("basePath", base_path)
+    dataframe = reader.csv(path)
+    if partition_filter is not None:
+        partition_column = F.col(partition_filter.column)
+        if partition_filter.start is not None:
+            dataframe = dataframe.filter(partition_column >= partition_filter.start)
+        if partition_filter.end is not None:
+            dataframe = dataframe.filter(partition_column <= partition_filter.end)
+    return dataframe
+
 
+def apply_schema_to_dataframe(df: DataFrame, schema: StructType) -> DataFrame:
+    """
+    Columns of schema, in its order, cast to their types in a single select. Other columns of df are dropped.
+    """
+    return df.select(
+        *[F.col(field.name).cast(field.dataType).alias(field.name) for field in schema]
+    )
 
-def apply_schema_to_dataframe(df, schema):
-    for field in schema.fields:
-        df = df.withColumn(field.name, F.col(field.name).cast(field.dataType))
-    return df
+
+def count_with_cast_failures(
+    df: DataFrame, schema: StructType
+) -> Tuple[int, Dict[str, int]]:
+    """
+    Number of rows of df and, for every column of schema, number of values that are not null in df but become
+    null when cast to their type by apply_schema_to_dataframe. Both are computed in the same aggregation.
+    """
+    row = df.agg(
+        F.count(F.lit(1)).alias(f"{rbit_prefix}_count"),
+        *[
+            F.count(
+                F.when(
+                    F.col(field.name).isNotNull()
+                    & F.col(field.name).cast(field.dataType).isNull(),
+                    1,
+                )
+            ).alias(field.name)
+            for field in schema
+        ],
+    ).collect()[0]
+    return row[f"{rbit_prefix}_count"], {
+        field.name: row[field.name] for field in schema
+    }
 
 
 def check_not_null(x):
@@ -13,3 +94,254 @@ def check_not_null(x):
 
 def is_not_null(x):
     return F.col(x).isNotNull() & ~F.isnan(x)
+
+
+def distinct_classes(dataframe: DataFrame, columns: List[str]) -> List[Any]:
+    """Sorted distinct not null values of the class columns of dataframe, collected by a single job"""
+    return collect_column(
+        reduce(
+            DataFrame.union,
+            [dataframe.select(F.col(column).alias("classes")) for column in columns],
+        )
+        .dropna()
+        .distinct()
+        .orderBy("classes")
+    ).tolist()
+
+
+def most_frequent_classes(
+    dataframe: DataFrame, columns: List[str], limit: int
+) -> List[Any]:
+    """
+    The at most limit most frequent not null values of the class columns of dataframe, counted over all of them,
+    from the most frequent. Only limit rows are collected, whatever the number of classes.
+    """
+    return collect_column(
+        reduce(
+            DataFrame.union,
+            [dataframe.select(F.col(column).alias("classes")) for column in columns],
+        )
+        .dropna()
+        .groupBy("classes")
+        .count()
+        .orderBy(F.desc("count"), F.asc("classes"))
+        .limit(limit),
+        "classes",
+    ).tolist()
+
+
+def index_classes(
+    dataframe: DataFrame,
+    columns: List[str],
+    classes: Optional[List[Any]] = None,
+) -> Tuple[Dict[str, str], DataFrame]:
+    """
+    Indexes the class columns of a dataframe with a shared index over the sorted distinct classes.
+
+    The classes (by default the distinct_classes of the given columns of dataframe) are applied with a literal
+    map shipped with the tasks, so no join or single-partition window is needed. Each column gets a
+    {rbit_prefix}_{column}-idx double column, rows with a class missing from the index (e.g. null) are dropped.
+    The indexed dataframe is cached because it is evaluated many times.
+
+    Returns the map from index (as string of float) to class label and the indexed dataframe.
+    """
+    if classes is None:
+        classes = distinct_classes(dataframe, columns)
+
+    classes_index = F.create_map(
+        *chain.from_iterable(
+            (F.lit(label), F.lit(float(index))) for index, label in enumerate(classes)
+        )
+    )
+    indexed_dataframe = (
+        dataframe.withColumns(
+            {
+                f"{rbit_prefix}_{column}-idx": classes_index[F.col(column)]
+                for column in columns
+            }
+        )
+        .filter(
+            reduce(
+                lambda x, y: x & y,
+                [
+                    F.col(f"{rbit_prefix}_{column}-idx").isNotNull()
+                    for column in columns
+                ],
+            )
+        )
+        .cache()
+    )
+
+    index_label_map = {
+        str(float(index)): str(label) for index, label in enumerate(classes)
+    }
+    return index_label_map, indexed_dataframe
+
+
+def aggregation_chunks(
+    aggregations: List[Column], max_chunk_size: int = MAX_AGGREGATIONS_PER_CHUNK
+) -> List[List[Column]]:
+    """Splits aggregations, in order, in the fewest chunks of at most max_chunk_size, all of about the same size"""
+    n_chunks = max(ceil(len(aggregations) / max_chunk_size), 1)
+    chunk_size = max(ceil(len(aggregations) / n_chunks), 1)
+    return [
+        aggregations[i : i + chunk_size]
+        for i in range(0, len(aggregations), chunk_size)
+    ]
+
+
+def chunked_agg(
+    dataframe: DataFrame,
+    aggregations: List[Column],
+    max_chunk_size: int = MAX_AGGREGATIONS_PER_CHUNK,
+) -> Dict[str, Any]:
+    """
+    Result of dataframe.agg(*aggregations) as a dict from alias to value, converted as by toPandas.
+
+    Up to max_chunk_size aggregations are evaluated in a single job. Wider ones, as the metrics of models with
+    thousands of features, are split by aggregation_chunks and each chunk is evaluated over the dataframe,
+    which is cached in the meantime so that it is read only once.
+    """
+    chunks = aggregation_chunks(aggregations, max_chunk_size)
+    if len(chunks) <= 1:
+        return dataframe.agg(*aggregations).toPandas().iloc[0].to_dict()
+
+    cache = not dataframe.is_cached
+    if cache:
+        dataframe.cache()
+    try:
+        result = dict()
+        for chunk in chunks:
+            result.update(dataframe.agg(*chunk).toPandas().iloc[0].to_dict())
+        return result
+    finally:
+        if cache:
+            dataframe.unpersist()
+
+
+def collect_columns(
+    dataframe: DataFrame, columns: Optional[List[str]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Columns of dataframe (all of them by default) collected to the driver as NumPy arrays aligned by row, null
+    values of numerical columns becoming NaN.
+    They are transferred in columnar batches by a single toPandas, with Arrow when
+    spark.sql.execution.arrow.pyspark.enabled is set, instead of being pickled Row by Row by Python workers as by
+    rdd.flatMap(lambda x: x).collect(). Lists for the json metrics are taken with tolist().
+    """
+    columns = columns or dataframe.columns
+    pandas_dataframe = dataframe.select(*columns).toPandas()
+    return {column: pandas_dataframe[column].to_numpy() for column in columns}
+
+
+def collect_column(dataframe: DataFrame, column: Optional[str] = None) -> np.ndarray:
+    """Column of dataframe (the first one by default) collected to the driver by collect_columns"""
+    column = column or dataframe.columns[0]
+    return collect_columns(dataframe, [column])[column]
+
+
+def python_value(value: Any) -> Any:
+    """Value of an aggregation converted by toPandas as a Python scalar, None when it is null or NaN"""
+    if value is None or (isinstance(value, float) and isnan(value)):
+        return None
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def numerical_bounds(
+    dataframe: DataFrame, columns: List[str]
+) -> Dict[str, Tuple[Any, Any]]:
+    """Min and max of the not null values of every numerical column, None without values, in one aggregation"""
+    bounds = chunked_agg(
+        dataframe,
+        [F.min(check_not_null(column)).alias(f"{column}-min") for column in columns]
+        + [F.max(check_not_null(column)).alias(f"{column}-max") for column in columns],
+    )
+    return {
+        column: (
+            python_value(bounds[f"{column}-min"]),
+            python_value(bounds[f"{column}-max"]),
+        )
+        for column in columns
+    }
+
+
+def merge_bounds(*bounds: Dict[str, Tuple[Any, Any]]) -> Dict[str, Tuple[Any, Any]]:
+    """Bounds of the union of the datasets the numerical_bounds were computed on"""
+    return {
+        column: (
+            min(
+                (
+                    column_bounds[column][0]
+                    for column_bounds in bounds
+                    if column_bounds[column][0] is not None
+                ),
+                default=None,
+            ),
+            max(
+                (
+                    column_bounds[column][1]
+                    for column_bounds in bounds
+                    if column_bounds[column][1] is not None
+                ),
+                default=None,
+            ),
+        )
+        for column in bounds[0]
+    }
+
+
+def histograms(
+    dataframe: DataFrame,
+    columns: List[str],
+    buckets: int = 10,
+    bounds: Optional[Dict[str, Tuple[Any, Any]]] = None,
+) -> Dict[str, Tuple[List[Any], List[int]]]:
+    """
+    Histogram of every numerical column as computed by RDD.histogram(buckets): buckets evenly spaced between the
+    min and the max of the not null values, all open to the right but the last one, and their counts. A column
+    whose values do not vary has a single bucket.
+    The numerical_bounds of all the columns, unless already known, are computed by one aggregation and their
+    counts by another, evaluated by the JVM instead of sending every value to a Python worker.
+    """
+    bounds = bounds or numerical_bounds(dataframe, columns)
+    splits = dict()
+    count_aggregations = []
+    for column in columns:
+        minv, maxv = bounds[column]
+        if minv is None:
+            raise ValueError(f"can not generate buckets of {column} without values")
+        if minv == maxv or buckets == 1:
+            splits[column] = [minv, maxv]
+            count_aggregations.append(
+                F.count(check_not_null(column)).alias(f"{column}-0")
+            )
+            continue
+        inc = (maxv - minv) / buckets
+        if isinf(inc):
+            raise ValueError(
+                f"can not generate buckets of {column} with infinite values"
+            )
+        # integer increments are kept integer as by RDD.histogram
+        if int(inc) * buckets == maxv - minv:
+            inc = int(inc)
+        splits[column] = [i * inc + minv for i in range(buckets)] + [maxv]
+        # the max falls in the last bucket, that is closed; least skips nulls, so they are excluded first
+        bucket = F.when(
+            is_not_null(column),
+            F.least(
+                F.floor((F.col(column) - F.lit(minv)) / F.lit(inc)),
+                F.lit(buckets - 1),
+            ),
+        )
+        count_aggregations += [
+            F.count(F.when(bucket == i, 1)).alias(f"{column}-{i}")
+            for i in range(buckets)
+        ]
+    counts = chunked_agg(dataframe, count_aggregations)
+    return {
+        column: (
+            column_splits,
+            [int(counts[f"{column}-{i}"]) for i in range(len(column_splits) - 1)],
+        )
+        for column, column_splits in splits.items()
+    }
@@ -1300,3 +1300,108 @@ def test_model_quality_nulls(spark_fixture, dataset_with_nulls):
         ignore_order=True,
         significant_digits=6,
     )
+
+
+@pytest.mark.parametrize(
+    "dataset_fixture,granularity,expected",
+    [
+        ("dataset_for_day", Granularity.DAY, res.test_calculation_for_day_mq_res),
+        ("dataset_for_week", Granularity.WEEK, res.test_calculation_for_week_mq_res),
+        ("dataset_for_month", Granularity.MONTH, res.test_calculation_for_month_mq_res),
+    ],
+)
+def test_grouped_metrics_by_granularity(
+    request, spark_fixture, dataset_fixture, granularity, expected
+):
+    output = OutputType(
+        prediction=ColumnDefinition(
+            name="prediction",
+            type=SupportedTypes.float,
+            field_type=FieldTypes.numerical,
+        ),
+        prediction_proba=ColumnDefinition(
+            name="prediction_proba",
+            type=SupportedTypes.float,
+            field_type=FieldTypes.numerical,
+        ),
+        output=[
+            ColumnDefinition(
+                name="prediction",
+                type=SupportedTypes.float,
+                field_type=FieldTypes.numerical,
+            ),
+            ColumnDefinition(
+                name="prediction_proba",
+                type=SupportedTypes.float,
+                field_type=FieldTypes.numerical,
+            ),
+        ],
+    )
+    target = ColumnDefinition(
+        name="target", type=SupportedTypes.float, field_type=FieldTypes.numerical
+    )
+    timestamp = ColumnDefinition(
+        name="datetime", type=SupportedTypes.datetime, field_type=FieldTypes.datetime
+    )
+    features = [
+        ColumnDefinition(
+            name="cat1", type=SupportedTypes.string, field_type=FieldTypes.categorical
+        ),
+        ColumnDefinition(
+            name="cat2", type=SupportedTypes.string, field_type=FieldTypes.categorical
+        ),
+        ColumnDefinition(
+            name="num1", type=SupportedTypes.float, field_type=FieldTypes.numerical
+        ),
+        ColumnDefinition(
+            name="num2", type=SupportedTypes.float, field_type=FieldTypes.numerical
+        ),
+    ]
+    # An hourly model rolls its grouped metrics up to the coarser granularities
+    model = ModelOut(
+        uuid=uuid.uuid4(),
+        name="model",
+        description="description",
+        model_type=ModelType.BINARY,
+        data_type=DataType.TABULAR,
+        timestamp=timestamp,
+        granularity=Granularity.HOUR,
+        outputs=output,
+        target=target,
+        features=features,
+        frameworks="framework",
+        algorithm="algorithm",
+        created_at=str(datetime.datetime.now()),
+        updated_at=str(datetime.datetime.now()),
+    )
+
+    raw_current_dataset, raw_reference_dataset = request.getfixturevalue(
+        dataset_fixture
+    )
+    current_dataset = CurrentDataset(model=model, raw_dataframe=raw_current_dataset)
+    reference_dataset = ReferenceDataset(
+        model=model, raw_dataframe=raw_reference_dataset
+    )
+
+    metrics_service = CurrentMetricsService(
+        spark_session=spark_fixture,
+        current=current_dataset,
+        reference=reference_dataset,
+    )
+
+    grouped_metrics_by_granularity = (
+        metrics_service.calculate_grouped_metrics_by_granularity()
+    )
+
+    assert list(grouped_metrics_by_granularity) == ["DAY", "WEEK", "MONTH"]
+    grouped_metrics = grouped_metrics_by_granularity[granularity.value]
+    # the areas under the curves are approximate
+    assert grouped_metrics.pop("score_bins") == 1000
+    # Same grouped metrics of a model with the coarser granularity
+    assert not deepdiff.DeepDiff(
+        grouped_metrics,
+        expected["grouped_metrics"],
+        ignore_order=True,
+        significant_digits=6,
+        ignore_nan_inequality=True,
+    )
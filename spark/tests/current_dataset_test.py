@@ -0,0 +1,280 @@
+import datetime
+import uuid
+
+from pyspark.sql.types import DoubleType, TimestampType
+import pyspark.sql.functions as F
+
+from metrics.statistics import calculate_statistics_current
+from models.current_dataset import CurrentDataset
+from models.reference_dataset import ReferenceDataset
+from utils.models import (
+    ColumnDefinition,
+    DataType,
+    FieldTypes,
+    Granularity,
+    ModelOut,
+    ModelType,
+    OutputType,
+    PartitionFilter,
+    SupportedTypes,
+)
+from utils.misc import time_bucket, time_group_column
+from utils.spark import read_csv_dataset
+
+
+def model():
+    return ModelOut(
+        uuid=uuid.uuid4(),
+        name="model",
+        description="description",
+        model_type=ModelType.BINARY,
+        data_type=DataType.TABULAR,
+        timestamp=ColumnDefinition(
+            name="datetime",
+            type=SupportedTypes.datetime,
+            field_type=FieldTypes.datetime,
+        ),
+        granularity=Granularity.HOUR,
+        outputs=OutputType(
+            prediction=ColumnDefinition(
+                name="prediction",
+                type=SupportedTypes.int,
+                field_type=FieldTypes.numerical,
+            ),
+            output=[
+                ColumnDefinition(
+                    name="prediction",
+                    type=SupportedTypes.int,
+                    field_type=FieldTypes.numerical,
+                )
+            ],
+        ),
+        target=ColumnDefinition(
+            name="target", type=SupportedTypes.int, field_type=FieldTypes.numerical
+        ),
+        features=[
+            ColumnDefinition(
+                name="num", type=SupportedTypes.float, field_type=FieldTypes.numerical
+            )
+        ],
+        frameworks="framework",
+        algorithm="algorithm",
+        created_at=str(datetime.datetime.now()),
+        updated_at=str(datetime.datetime.now()),
+    )
+
+
+def test_current_dataset_schema(spark_fixture):
+    raw_dataframe = spark_fixture.createDataFrame(
+        [
+            ("1.5", "1", "0", "2024-06-16 00:01:00", "extra"),
+            ("one", "0", "0", "2024-06-16 00:02:00", "extra"),
+            (None, "1", "yes", "not a date", "extra"),
+        ],
+        "num string, target string, prediction string, datetime string, other string",
+    )
+
+    current_dataset = CurrentDataset(model=model(), raw_dataframe=raw_dataframe)
+
+    assert current_dataset.current.columns == [
+        "num",
+        "target",
+        "datetime",
+        "prediction",
+    ]
+    assert current_dataset.current.schema["num"].dataType == DoubleType()
+    assert current_dataset.current.schema["target"].dataType == DoubleType()
+    assert current_dataset.current.schema["datetime"].dataType == TimestampType()
+    assert current_dataset.current_count == 3
+    assert current_dataset.cast_failures is None
+
+    current_dataset = CurrentDataset(
+        model=model(), raw_dataframe=raw_dataframe, cast_failures_report=True
+    )
+
+    assert current_dataset.current_count == 3
+    assert current_dataset.cast_failures == {
+        "num": 1,
+        "target": 0,
+        "datetime": 1,
+        "prediction": 1,
+    }
+
+
+def test_current_dataset_counts(spark_fixture):
+    raw_dataframe = spark_fixture.createDataFrame(
+        [
+            ("1.5", "1", "0", "2024-06-16 00:01:00"),
+            ("NaN", "0", None, "2024-06-16 00:02:00"),
+            (None, None, "1", None),
+        ],
+        "num string, target string, prediction string, datetime string",
+    )
+    current_dataset = CurrentDataset(model=model(), raw_dataframe=raw_dataframe)
+
+    spark_context = spark_fixture.sparkContext
+    spark_context.setJobGroup("dataset_counts", "dataset counts")
+    try:
+        assert current_dataset.current_count == 3
+        jobs = sorted(spark_context.statusTracker().getJobIdsForGroup("dataset_counts"))
+
+        assert current_dataset.counts.clean_pairs == 1
+        assert current_dataset.counts.not_null("num") == 1
+        assert current_dataset.counts.missing("num") == 2
+        assert current_dataset.counts.not_null("datetime") == 2
+        assert current_dataset.counts.not_null("prediction") == 2
+        assert current_dataset.current_count == 3
+        # later counts reuse the first aggregation
+        assert (
+            sorted(spark_context.statusTracker().getJobIdsForGroup("dataset_counts"))
+            == jobs
+        )
+    finally:
+        spark_context.setLocalProperty("spark.jobGroup.id", None)
+
+
+def test_statistics_counts(spark_fixture):
+    raw_dataframe = spark_fixture.createDataFrame(
+        [
+            ("1.5", "1", "0", "2024-06-16 00:01:00"),
+            ("NaN", "0", None, "2024-06-16 00:02:00"),
+            (None, None, "1", None),
+        ],
+        "num string, target string, prediction string, datetime string",
+    )
+    current_dataset = CurrentDataset(model=model(), raw_dataframe=raw_dataframe)
+
+    statistics = calculate_statistics_current(current_dataset)
+
+    assert statistics.n_observations == 3
+    assert statistics.missing_cells == 5
+    spark_context = spark_fixture.sparkContext
+    spark_context.setJobGroup("statistics_counts", "statistics counts")
+    try:
+        # the counts come from the aggregation of the statistics
+        assert current_dataset.counts.clean_pairs == 1
+        assert current_dataset.current_count == 3
+        assert (
+            spark_context.statusTracker().getJobIdsForGroup("statistics_counts") == []
+        )
+    finally:
+        spark_context.setLocalProperty("spark.jobGroup.id", None)
+
+
+def test_read_partitioned_current(spark_fixture, tmp_path):
+    for date in ["2024-06-15", "2024-06-16", "2024-06-17"]:
+        partition = tmp_path / f"date={date}"
+        partition.mkdir()
+        for hour in range(2):
+            (partition / f"part-{hour}.csv").write_text(
+                "num,target,prediction,datetime\n"
+                f"1.5,1,0,{date} 0{hour}:01:00\n"
+                f"2.5,0,0,{date} 0{hour}:02:00\n"
+            )
+
+    raw_dataframe = read_csv_dataset(spark_fixture, str(tmp_path))
+    assert raw_dataframe.count() == 12
+
+    raw_dataframe = read_csv_dataset(
+        spark_fixture,
+        f"{tmp_path}/date=*/part-*.csv",
+        PartitionFilter(column="date", start="2024-06-16"),
+    )
+    assert "PartitionFilters: [isnotnull(date" in (
+        raw_dataframe._jdf.queryExecution().executedPlan().toString()
+    )
+
+    current_dataset = CurrentDataset(model=model(), raw_dataframe=raw_dataframe)
+
+    assert current_dataset.current.columns == [
+        "num",
+        "target",
+        "datetime",
+        "prediction",
+    ]
+    assert current_dataset.current_count == 8
+    assert current_dataset.current.agg({"datetime": "min"}).collect()[0][
+        0
+    ] == datetime.datetime(2024, 6, 16, 0, 1)
+
+
+def test_partition_by_time_bucket(spark_fixture):
+    raw_dataframe = spark_fixture.createDataFrame(
+        [
+            (
+                str(x / 10),
+                str(x % 2),
+                str(x % 3 % 2),
+                f"2024-06-16 {x % 5:02d}:{x % 60:02d}:00",
+            )
+            for x in range(200)
+        ]
+        + [("1.0", "1", "1", None)],
+        "num string, target string, prediction string, datetime string",
+    )
+    current_dataset = CurrentDataset(model=model(), raw_dataframe=raw_dataframe)
+
+    time_partitions = current_dataset.partition_by_time_bucket()
+
+    assert current_dataset.current.is_cached
+    assert current_dataset.current_count == 201
+    assert len(time_partitions) == 6
+    assert all(bucket["partitions"] == 1 for bucket in time_partitions.values())
+    assert time_partitions[None] == {"partitions": 1, "rows": 1}
+    assert sum(bucket["rows"] for bucket in time_partitions.values()) == 201
+
+    # grouping by the time bucket reuses the partitioning of the cached dataset
+    grouped = (
+        current_dataset.current.select(
+            "num", time_bucket("datetime", Granularity.HOUR).alias(time_group_column)
+        )
+        .groupBy(time_group_column)
+        .agg(F.sum("num"))
+    )
+    grouped.collect()
+    assert (
+        "ENSURE_REQUIREMENTS"
+        not in grouped._jdf.queryExecution().executedPlan().toString()
+    )
+
+
+def test_shared_reference_aggregations(spark_fixture):
+    raw_reference = spark_fixture.createDataFrame(
+        [
+            ("1.5", "1", "0", "2024-06-16 00:01:00"),
+            ("-2.0", "0", "1", "2024-06-16 00:02:00"),
+            ("NaN", None, "1", None),
+        ],
+        "num string, target string, prediction string, datetime string",
+    )
+    raw_current = spark_fixture.createDataFrame(
+        [("3.0", "2", "1", "2024-06-17 00:01:00")],
+        "num string, target string, prediction string, datetime string",
+    )
+    reference_dataset = ReferenceDataset(model=model(), raw_dataframe=raw_reference)
+    current_dataset = CurrentDataset(model=model(), raw_dataframe=raw_current)
+
+    spark_context = spark_fixture.sparkContext
+    spark_context.setJobGroup("shared_aggregations", "shared aggregations")
+    try:
+        assert reference_dataset.classes() == [0, 1]
+        assert reference_dataset.numerical_bounds() == {"num": (-2.0, 1.5)}
+        jobs = sorted(
+            spark_context.statusTracker().getJobIdsForGroup("shared_aggregations")
+        )
+
+        index_label_map, _ = reference_dataset.get_string_indexed_dataframe()
+        assert index_label_map == {"0.0": "0.0", "1.0": "1.0"}
+        assert reference_dataset.numerical_bounds() == {"num": (-2.0, 1.5)}
+        # the index of the reference reuses its classes
+        assert (
+            sorted(
+                spark_context.statusTracker().getJobIdsForGroup("shared_aggregations")
+            )
+            == jobs
+        )
+    finally:
+        spark_context.setLocalProperty("spark.jobGroup.id", None)
+
+    index_label_map, _ = current_dataset.get_string_indexed_dataframe(reference_dataset)
+    assert index_label_map == {"0.0": "0.0", "1.0": "1.0", "2.0": "2.0"}
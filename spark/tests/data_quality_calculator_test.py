@@ -0,0 +1,318 @@
+import datetime
+import uuid
+
+import pytest
+
+from metrics.data_quality_calculator import DataQualityCalculator
+from models.data_quality import ClassMedianMetrics, MedianMetrics, OtherCategories
+from utils.models import (
+    ColumnDefinition,
+    DataType,
+    FieldTypes,
+    Granularity,
+    ModelOut,
+    ModelType,
+    OutputType,
+    SupportedTypes,
+)
+from utils.spark import (
+    aggregation_chunks,
+    chunked_agg,
+    collect_column,
+    collect_columns,
+    histograms,
+    merge_bounds,
+    numerical_bounds,
+)
+
+
+@pytest.fixture()
+def categories_dataframe(spark_fixture):
+    yield spark_fixture.createDataFrame(
+        [("a", 1.0)] * 4
+        + [("b", 2.0)] * 3
+        + [("c", 2.0)] * 2
+        + [("d", 10.0), (None, float("nan")), (None, None)],
+        "merchant string, prediction double",
+    )
+
+
+def categories_model(category_top_k=None):
+    return ModelOut(
+        uuid=uuid.uuid4(),
+        name="categories model",
+        description="description",
+        model_type=ModelType.BINARY,
+        data_type=DataType.TABULAR,
+        timestamp=ColumnDefinition(
+            name="datetime",
+            type=SupportedTypes.datetime,
+            field_type=FieldTypes.datetime,
+        ),
+        granularity=Granularity.HOUR,
+        outputs=OutputType(
+            prediction=ColumnDefinition(
+                name="prediction",
+                type=SupportedTypes.float,
+                field_type=FieldTypes.numerical,
+            ),
+            output=[
+                ColumnDefinition(
+                    name="prediction",
+                    type=SupportedTypes.float,
+                    field_type=FieldTypes.numerical,
+                )
+            ],
+        ),
+        target=ColumnDefinition(
+            name="target", type=SupportedTypes.float, field_type=FieldTypes.numerical
+        ),
+        features=[
+            ColumnDefinition(
+                name="merchant",
+                type=SupportedTypes.string,
+                field_type=FieldTypes.categorical,
+            )
+        ],
+        frameworks="framework",
+        algorithm="algorithm",
+        category_top_k=category_top_k,
+        created_at=str(datetime.datetime.now()),
+        updated_at=str(datetime.datetime.now()),
+    )
+
+
+def test_category_counts(categories_dataframe):
+    assert DataQualityCalculator.category_counts(
+        categories_dataframe, ["merchant", "prediction"]
+    ) == {
+        "merchant": {"a": (4, 1), "b": (3, 1), "c": (2, 1), "d": (1, 1)},
+        "prediction": {"1.0": (4, 1), "2.0": (5, 1), "10.0": (1, 1)},
+    }
+    assert DataQualityCalculator.category_counts(
+        categories_dataframe, ["merchant", "prediction"], top_k=2
+    ) == {
+        "merchant": {"a": (4, 1), "b": (3, 1), None: (3, 2)},
+        "prediction": {"2.0": (5, 1), "1.0": (4, 1), None: (1, 1)},
+    }
+
+
+def test_category_counts_labels(spark_fixture):
+    dataframe = spark_fixture.createDataFrame(
+        [(1e-05, 0.1, 1, "True"), (1e20, 2.0, 2, "False"), (1.0, 0.1, 2, "True")],
+        "ratio double, score float, level int, flag string",
+    )
+
+    # labels are formatted as they were collected to pandas
+    assert DataQualityCalculator.category_counts(
+        dataframe, ["ratio", "score", "level", "flag"]
+    ) == {
+        "ratio": {"1e-05": (1, 1), "1e+20": (1, 1), "1.0": (1, 1)},
+        "score": {"0.1": (2, 1), "2.0": (1, 1)},
+        "level": {"1": (1, 1), "2": (2, 1)},
+        "flag": {"True": (2, 1), "False": (1, 1)},
+    }
+
+
+def test_categorical_metrics_top_k(categories_dataframe):
+    [metrics] = DataQualityCalculator.categorical_metrics(
+        model=categories_model(category_top_k=2),
+        dataframe=categories_dataframe,
+        dataframe_count=12,
+    )
+
+    assert metrics.distinct_value == 4
+    assert [
+        (category.name, category.count) for category in metrics.category_frequency
+    ] == [("a", 4), ("b", 3)]
+    assert metrics.other_categories == OtherCategories(
+        categories=2, count=3, frequency=0.25
+    )
+
+    [metrics] = DataQualityCalculator.categorical_metrics(
+        model=categories_model(),
+        dataframe=categories_dataframe,
+        dataframe_count=12,
+    )
+
+    assert metrics.distinct_value == 4
+    assert [
+        (category.name, category.count) for category in metrics.category_frequency
+    ] == [("a", 4), ("b", 3), ("c", 2), ("d", 1)]
+    assert metrics.other_categories is None
+
+
+def test_categorical_metrics_approx_distinct(categories_dataframe, monkeypatch):
+    [metrics] = DataQualityCalculator.categorical_metrics(
+        model=categories_model(),
+        dataframe=categories_dataframe,
+        dataframe_count=12,
+        approx_distinct_min_cardinality=5,
+    )
+
+    # below the cardinality the categories are counted
+    assert metrics.distinct_value == 4
+    assert len(metrics.category_frequency) == 4
+    assert metrics.distinct_sketch
+
+    def category_counts(*args):
+        raise AssertionError("the categories are counted")
+
+    monkeypatch.setattr(
+        DataQualityCalculator, "category_counts", staticmethod(category_counts)
+    )
+    [metrics] = DataQualityCalculator.categorical_metrics(
+        model=categories_model(),
+        dataframe=categories_dataframe,
+        dataframe_count=12,
+        approx_distinct_min_cardinality=4,
+    )
+
+    # at the cardinality they are only estimated, as other categories
+    assert metrics.distinct_value == 4
+    assert metrics.category_frequency == []
+    assert metrics.other_categories == OtherCategories(
+        categories=4, count=10, frequency=10 / 12
+    )
+
+
+def test_class_metrics(categories_dataframe):
+    assert [
+        (metrics.name, metrics.count)
+        for metrics in DataQualityCalculator.class_metrics(
+            "prediction", categories_dataframe, 12
+        )
+    ] == [("1.0", 4), ("2.0", 5), ("10.0", 1)]
+
+
+def test_class_median_metrics(spark_fixture):
+    dataframe = spark_fixture.createDataFrame(
+        [(1.0, float(x)) for x in range(1, 101)]
+        + [(0.0, 5.0), (0.0, None), (0.0, float("nan"))]
+        + [(2.0, None), (None, 1000.0)],
+        "target double, num double",
+    )
+
+    class_median_metrics = DataQualityCalculator.class_median_metrics(
+        "target", ["num"], dataframe, 0.001
+    )
+
+    assert [metrics.name for metrics in class_median_metrics["num"]] == [
+        "0.0",
+        "1.0",
+        "2.0",
+    ]
+    class_0, class_1, class_2 = class_median_metrics["num"]
+    assert class_0 == ClassMedianMetrics(
+        name="0.0",
+        mean=5.0,
+        median_metrics=MedianMetrics(
+            perc_25=5.0, median=5.0, perc_75=5.0, relative_error=0.001
+        ),
+    )
+    assert class_1 == ClassMedianMetrics(
+        name="1.0",
+        mean=50.5,
+        median_metrics=MedianMetrics(
+            perc_25=25.0, median=50.0, perc_75=75.0, relative_error=0.001
+        ),
+    )
+    assert class_2.mean != class_2.mean
+    assert class_2.median_metrics.median != class_2.median_metrics.median
+
+
+def test_numerical_metrics_class_median_metrics(categories_dataframe):
+    dataframe = categories_dataframe.withColumnRenamed("prediction", "target")
+    model = categories_model()
+    model.features = [
+        ColumnDefinition(
+            name="target", type=SupportedTypes.float, field_type=FieldTypes.numerical
+        )
+    ]
+
+    [metrics] = DataQualityCalculator.numerical_metrics(
+        model=model, dataframe=dataframe, dataframe_count=12
+    )
+    assert metrics.class_median_metrics == []
+
+    [metrics] = DataQualityCalculator.numerical_metrics(
+        model=model, dataframe=dataframe, dataframe_count=12, class_relative_error=0.01
+    )
+    assert [
+        (metrics.name, metrics.mean, metrics.median_metrics.median)
+        for metrics in metrics.class_median_metrics
+    ] == [("1.0", 1.0, 1.0), ("2.0", 2.0, 2.0), ("10.0", 10.0, 10.0)]
+
+
+def test_aggregation_chunks():
+    assert [len(chunk) for chunk in aggregation_chunks(list(range(10)), 4)] == [
+        4,
+        4,
+        2,
+    ]
+    assert [len(chunk) for chunk in aggregation_chunks(list(range(9)), 4)] == [
+        3,
+        3,
+        3,
+    ]
+    assert aggregation_chunks(list(range(3)), 4) == [[0, 1, 2]]
+
+
+def test_chunked_agg(spark_fixture):
+    dataframe = spark_fixture.createDataFrame(
+        [(float(x), float(x % 7), None if x % 5 else 1.0) for x in range(100)],
+        "a double, b double, c double",
+    )
+    aggregations = DataQualityCalculator.numerical_aggregations(
+        ["a", "b", "c"], 100, None
+    )
+
+    chunked = chunked_agg(dataframe, aggregations, max_chunk_size=4)
+
+    assert list(chunked) == list(chunked_agg(dataframe, aggregations))
+    assert chunked == pytest.approx(chunked_agg(dataframe, aggregations))
+    assert not dataframe.is_cached
+
+
+def test_collect_columns(spark_fixture):
+    dataframe = spark_fixture.createDataFrame(
+        [(x, float(x) / 2 if x % 3 else None, str(x)) for x in range(10)],
+        "id long, half double, label string",
+    )
+
+    columns = collect_columns(dataframe.orderBy("id"), ["id", "half", "label"])
+
+    assert columns["id"].tolist() == list(range(10))
+    assert columns["half"][1] == 0.5
+    assert columns["half"][3] != columns["half"][3]
+    assert columns["label"].tolist() == [str(x) for x in range(10)]
+    assert collect_column(dataframe.orderBy("id")).tolist() == list(range(10))
+
+
+def test_histograms(spark_fixture):
+    dataframe = spark_fixture.createDataFrame(
+        [
+            (float(x), x % 7, 1.0, float(x) if x % 4 else float("nan"))
+            for x in range(-20, 101)
+        ]
+        + [(None, None, None, None)],
+        "a double, b long, c double, d double",
+    )
+
+    result = histograms(dataframe, ["a", "b", "c", "d"])
+
+    for column in ["a", "b", "c", "d"]:
+        assert result[column] == dataframe.select(column).rdd.flatMap(
+            lambda x: x
+        ).histogram(10)
+    assert result["c"] == ([1.0, 1.0], [121])
+    bounds = numerical_bounds(dataframe, ["a", "b", "c", "d"])
+    assert bounds["a"] == (-20.0, 100.0)
+    assert histograms(dataframe, ["a", "b", "c", "d"], bounds=bounds) == result
+
+
+def test_merge_bounds():
+    assert merge_bounds(
+        {"a": (1.0, 2.0), "b": (None, None), "c": (None, None)},
+        {"a": (-1.0, 1.5), "b": (3, 4), "c": (None, None)},
+    ) == {"a": (-1.0, 2.0), "b": (3, 4), "c": (None, None)}
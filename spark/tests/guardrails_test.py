@@ -0,0 +1,235 @@
+import datetime
+import uuid
+
+import orjson
+import pytest
+
+from metrics.data_quality_calculator import DataQualityCalculator
+from metrics.model_quality_regression_calculator import (
+    ModelQualityRegressionCalculator,
+)
+from models.data_quality import OtherCategories
+from models.metrics_warning import MetricsWarning
+from utils.guardrails import Guardrails
+from utils.job_config import JobConfig
+from utils.models import (
+    ColumnDefinition,
+    DataType,
+    FieldTypes,
+    Granularity,
+    ModelOut,
+    ModelType,
+    OutputType,
+    SupportedTypes,
+)
+from utils.spark import most_frequent_classes
+
+
+@pytest.fixture()
+def classes_dataframe(spark_fixture):
+    yield spark_fixture.createDataFrame(
+        [("a", "a", 1.0)] * 5
+        + [("b", "c", 2.0)] * 3
+        + [("c", "d", 3.0), ("d", None, 4.0)],
+        "prediction string, target string, num double",
+    )
+
+
+def model(model_type=ModelType.MULTI_CLASS, category_top_k=None):
+    return ModelOut(
+        uuid=uuid.uuid4(),
+        name="guarded model",
+        description="description",
+        model_type=model_type,
+        data_type=DataType.TABULAR,
+        timestamp=ColumnDefinition(
+            name="datetime",
+            type=SupportedTypes.datetime,
+            field_type=FieldTypes.datetime,
+        ),
+        granularity=Granularity.HOUR,
+        outputs=OutputType(
+            prediction=ColumnDefinition(
+                name="prediction",
+                type=SupportedTypes.string,
+                field_type=FieldTypes.categorical,
+            ),
+            output=[
+                ColumnDefinition(
+                    name="prediction",
+                    type=SupportedTypes.string,
+                    field_type=FieldTypes.categorical,
+                )
+            ],
+        ),
+        target=ColumnDefinition(
+            name="target", type=SupportedTypes.string, field_type=FieldTypes.categorical
+        ),
+        features=[
+            ColumnDefinition(
+                name="prediction",
+                type=SupportedTypes.string,
+                field_type=FieldTypes.categorical,
+            )
+        ],
+        frameworks="framework",
+        algorithm="algorithm",
+        category_top_k=category_top_k,
+        created_at=str(datetime.datetime.now()),
+        updated_at=str(datetime.datetime.now()),
+    )
+
+
+def test_most_frequent_classes(classes_dataframe):
+    assert most_frequent_classes(classes_dataframe, ["prediction", "target"], 3) == [
+        "a",
+        "c",
+        "b",
+    ]
+    assert most_frequent_classes(classes_dataframe, ["prediction", "target"], 10) == [
+        "a",
+        "c",
+        "b",
+        "d",
+    ]
+
+
+def test_classes(classes_dataframe):
+    guardrails = Guardrails(JobConfig(max_collected_classes=4))
+    assert guardrails.classes(classes_dataframe, ["prediction", "target"]) == [
+        "a",
+        "b",
+        "c",
+        "d",
+    ]
+    assert guardrails.warnings == []
+    assert guardrails.warnings_json() is None
+
+    guardrails = Guardrails(JobConfig(max_collected_classes=2))
+    assert guardrails.classes(classes_dataframe, ["prediction", "target"]) == [
+        "a",
+        "c",
+    ]
+    # the known classes are kept first
+    assert guardrails.classes(
+        classes_dataframe, ["prediction", "target"], known=["d"]
+    ) == ["a", "d"]
+    # the same limit hit twice is a single warning
+    assert [warning.section for warning in guardrails.warnings] == ["MODEL_QUALITY"]
+    assert orjson.loads(guardrails.warnings_json())[0] == {
+        "section": "MODEL_QUALITY",
+        "message": "prediction, target have more than 2 classes, only the 2 most frequent are indexed "
+        "and the rows of the others are left out",
+    }
+
+    guardrails = Guardrails(JobConfig(max_collected_classes=None))
+    assert guardrails.classes(
+        classes_dataframe, ["prediction", "target"], known=["e"]
+    ) == ["a", "b", "c", "d", "e"]
+
+
+def test_restore():
+    guardrails = Guardrails()
+    guardrails.warn("DATA_QUALITY", "capped")
+    guardrails.restore(None)
+    guardrails.restore(
+        orjson.dumps(
+            [
+                {"section": "DATA_QUALITY", "message": "capped"},
+                {"section": "MODEL_QUALITY", "message": "sampled"},
+            ]
+        ).decode("utf-8")
+    )
+
+    assert guardrails.warnings == [
+        MetricsWarning(section="DATA_QUALITY", message="capped"),
+        MetricsWarning(section="MODEL_QUALITY", message="sampled"),
+    ]
+
+
+def test_categorical_metrics_capped(classes_dataframe):
+    guardrails = Guardrails(JobConfig(max_collected_categories=2))
+    [metrics] = DataQualityCalculator.categorical_metrics(
+        model=model(),
+        dataframe=classes_dataframe,
+        dataframe_count=10,
+        guardrails=guardrails,
+    )
+
+    assert metrics.distinct_value == 4
+    assert [
+        (category.name, category.count) for category in metrics.category_frequency
+    ] == [("a", 5), ("b", 3)]
+    assert metrics.other_categories == OtherCategories(
+        categories=2, count=2, frequency=0.2
+    )
+    assert guardrails.warnings == [
+        MetricsWarning(
+            section="DATA_QUALITY",
+            message="prediction has more than 2 categories, only the 2 most frequent are listed and the "
+            "others are aggregated",
+        )
+    ]
+
+    # the category_top_k of the model within the limit is not a warning
+    guardrails = Guardrails(JobConfig(max_collected_categories=2))
+    DataQualityCalculator.categorical_metrics(
+        model=model(category_top_k=1),
+        dataframe=classes_dataframe,
+        dataframe_count=10,
+        guardrails=guardrails,
+    )
+    assert guardrails.warnings == []
+
+
+def test_class_metrics_capped(classes_dataframe):
+    guardrails = Guardrails(JobConfig(max_collected_categories=2))
+
+    assert [
+        (metrics.name, metrics.count)
+        for metrics in DataQualityCalculator.class_metrics(
+            "prediction", classes_dataframe, 10, guardrails
+        )
+    ] == [("a", 5), ("b", 3)]
+    assert [warning.section for warning in guardrails.warnings] == ["DATA_QUALITY"]
+
+
+def test_residual_metrics_sampled(spark_fixture):
+    dataframe = spark_fixture.createDataFrame(
+        [(float(x), float(x) + (x % 7) - 3.0) for x in range(1000)],
+        "prediction double, target double",
+    )
+    regression_model = model(model_type=ModelType.REGRESSION)
+    regression_model.outputs.prediction = ColumnDefinition(
+        name="prediction", type=SupportedTypes.float, field_type=FieldTypes.numerical
+    )
+    regression_model.target = ColumnDefinition(
+        name="target", type=SupportedTypes.float, field_type=FieldTypes.numerical
+    )
+    complete = ModelQualityRegressionCalculator.residual_metrics(
+        regression_model, dataframe
+    )
+
+    guardrails = Guardrails(JobConfig(max_collected_rows=100))
+    residuals = ModelQualityRegressionCalculator.residual_metrics(
+        regression_model,
+        dataframe,
+        dataframe_clean_count=1000,
+        guardrails=guardrails,
+    )
+
+    assert 0 < len(residuals["standardized_residuals"]) <= 100
+    assert len(residuals["predictions"]) == len(residuals["targets"])
+    # the other metrics are still computed on all the rows
+    assert residuals["ks"] == complete["ks"]
+    assert residuals["histogram"] == complete["histogram"]
+    assert [warning.section for warning in guardrails.warnings] == ["MODEL_QUALITY"]
+    assert (
+        ModelQualityRegressionCalculator.residual_metrics(
+            regression_model,
+            dataframe,
+            dataframe_clean_count=1000,
+            guardrails=Guardrails(JobConfig(max_collected_rows=100)),
+        )["predictions"]
+        == residuals["predictions"]
+    )
@@ -1,12 +1,16 @@
 import datetime
+import json
 import uuid
 import pytest
 import deepdiff
+import pyspark.sql.functions as F
 
 from current_job import compute_metrics as cur_compute_metrics
 from reference_job import compute_metrics as ref_compute_metrics
+from metrics.data_quality_calculator import DataQualityCalculator
 from models.current_dataset import CurrentDataset
 from models.reference_dataset import ReferenceDataset
+from utils.job_config import JobConfig
 from utils.models import (
     ColumnDefinition,
     DataType,
@@ -448,3 +452,285 @@ def test_bc_joined(
         ignore_order=True,
         ignore_type_subclasses=True,
     )
+
+
+def test_bc_joined_parallel_stages(
+    spark_fixture,
+    bc_current_dataset_joined,
+    bc_reference_dataset_joined,
+    bc_model_joined,
+):
+    cur_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+        job_config=JobConfig(
+            parallel_stages=True, max_parallel_stages=4, max_parallel_features=4
+        ),
+    )
+
+    assert not deepdiff.DeepDiff(
+        cur_record,
+        res.test_bc_joined_current_res,
+        ignore_order=True,
+        ignore_type_subclasses=True,
+    )
+
+
+def test_bc_joined_partition_by_time_bucket(
+    spark_fixture,
+    bc_current_dataset_joined,
+    bc_reference_dataset_joined,
+    bc_model_joined,
+):
+    bc_current_dataset_joined.partition_by_time_bucket()
+    cur_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+    )
+
+    # sums are accumulated in another order over the repartitioned dataset
+    for section, value in res.test_bc_joined_current_res.items():
+        assert not deepdiff.DeepDiff(
+            json.loads(cur_record[section]),
+            json.loads(value),
+            ignore_order=True,
+            significant_digits=6,
+        )
+
+
+def test_bc_joined_resume_stages(
+    spark_fixture,
+    bc_current_dataset_joined,
+    bc_reference_dataset_joined,
+    bc_model_joined,
+):
+    saved = {}
+    cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+        save_stage=lambda stage, output, warnings: saved.__setitem__(stage, output),
+    )
+    assert list(saved) == ["STATISTICS", "DATA_QUALITY", "MODEL_QUALITY", "DRIFT"]
+
+    resumed_saved = {}
+    cur_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+        completed_stages={
+            "MODEL_QUALITY": saved["MODEL_QUALITY"],
+            "DRIFT": saved["DRIFT"],
+        },
+        save_stage=lambda stage, output, warnings: resumed_saved.__setitem__(
+            stage, output
+        ),
+    )
+
+    assert list(resumed_saved) == ["STATISTICS", "DATA_QUALITY"]
+    assert cur_record["MODEL_QUALITY"] is saved["MODEL_QUALITY"]
+    assert not deepdiff.DeepDiff(
+        cur_record,
+        res.test_bc_joined_current_res,
+        ignore_order=True,
+        ignore_type_subclasses=True,
+    )
+
+
+def test_bc_joined_resume_stages_warnings(
+    spark_fixture,
+    bc_current_dataset_joined,
+    bc_reference_dataset_joined,
+    bc_model_joined,
+):
+    job_config = JobConfig(max_collected_categories=1)
+    saved = {}
+    cur_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+        job_config=job_config,
+        save_stage=lambda stage, output, warnings: saved.__setitem__(
+            stage, (output, warnings)
+        ),
+    )
+    assert "DATA_QUALITY" in [
+        warning["section"] for warning in json.loads(cur_record["WARNINGS"])
+    ]
+
+    # the data quality is not computed again, so its categories are not capped again
+    data_quality, data_quality_warnings = saved["DATA_QUALITY"]
+    resumed_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+        job_config=job_config,
+        completed_stages={"DATA_QUALITY": data_quality},
+        completed_warnings=[data_quality_warnings],
+    )
+
+    assert json.loads(resumed_record["WARNINGS"]) == json.loads(cur_record["WARNINGS"])
+
+
+def test_reg_abalone_approx_percentiles(
+    reg_reference_dataset_abalone,
+    reg_model_abalone,
+):
+    exact_record = ref_compute_metrics(
+        reg_reference_dataset_abalone,
+        reg_model_abalone,
+        job_config=JobConfig(
+            approx_percentiles_min_rows=reg_reference_dataset_abalone.reference_count
+            + 1
+        ),
+    )
+    approx_record = ref_compute_metrics(
+        reg_reference_dataset_abalone,
+        reg_model_abalone,
+        job_config=JobConfig(
+            approx_percentiles_min_rows=0, percentile_relative_error=0.01
+        ),
+    )
+
+    assert exact_record == res.test_reg_abalone_reference_res
+    exact = json.loads(exact_record["DATA_QUALITY"])
+    approx = json.loads(approx_record["DATA_QUALITY"])
+    for exact_metrics, approx_metrics in zip(
+        [exact["target_metrics"]]
+        + [m for m in exact["feature_metrics"] if m["type"] == "numerical"],
+        [approx["target_metrics"]]
+        + [m for m in approx["feature_metrics"] if m["type"] == "numerical"],
+    ):
+        median_metrics = approx_metrics.pop("median_metrics")
+        assert median_metrics["relative_error"] == 0.01
+        assert (
+            approx_metrics["min"]
+            <= median_metrics["perc_25"]
+            <= median_metrics["median"]
+            <= median_metrics["perc_75"]
+            <= approx_metrics["max"]
+        )
+        # percentile_approx bounds the error on the rank of the value by relative_error
+        column = F.col(approx_metrics["feature_name"]).cast("double")
+        for name, percentage in [("perc_25", 0.25), ("median", 0.5), ("perc_75", 0.75)]:
+            lower, upper = reg_reference_dataset_abalone.reference.agg(
+                F.percentile(column, max(percentage - 0.01, 0.0)),
+                F.percentile(column, min(percentage + 0.01, 1.0)),
+            ).collect()[0]
+            assert lower <= median_metrics[name] <= upper
+        exact_metrics.pop("median_metrics")
+        assert approx_metrics == exact_metrics
+
+
+def test_bc_joined_approx_distinct_values(
+    spark_fixture,
+    bc_current_dataset_joined,
+    bc_reference_dataset_joined,
+    bc_model_joined,
+):
+    exact_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+    )
+    exact = [
+        feature
+        for feature in json.loads(exact_record["DATA_QUALITY"])["feature_metrics"]
+        if feature["type"] == "categorical"
+    ]
+
+    def approx_features(approx_distinct_min_cardinality):
+        approx_record = cur_compute_metrics(
+            spark_fixture,
+            bc_current_dataset_joined,
+            bc_reference_dataset_joined,
+            bc_model_joined,
+            job_config=JobConfig(
+                approx_distinct_min_cardinality=approx_distinct_min_cardinality
+            ),
+        )
+        return [
+            feature
+            for feature in json.loads(approx_record["DATA_QUALITY"])["feature_metrics"]
+            if feature["type"] == "categorical"
+        ]
+
+    # below the cardinality the categories are counted
+    approx = approx_features(1000)
+    assert len(approx) == len(exact)
+    for exact_feature, approx_feature in zip(exact, approx):
+        assert approx_feature["distinct_sketch"]
+        # all the categories of the current are in the reference
+        assert approx_feature == {
+            **exact_feature,
+            "distinct_sketch": approx_feature["distinct_sketch"],
+            "new_categories": 0,
+        }
+
+    # over it they are only estimated, as other categories
+    approx = approx_features(1)
+    assert len(approx) == len(exact)
+    for exact_feature, approx_feature in zip(exact, approx):
+        count = sum(
+            category["count"] for category in exact_feature["category_frequency"]
+        )
+        assert approx_feature["distinct_value"] == exact_feature["distinct_value"]
+        assert approx_feature["category_frequency"] == []
+        assert (
+            approx_feature["other_categories"]["categories"]
+            == exact_feature["distinct_value"]
+        )
+        assert approx_feature["other_categories"]["count"] == count
+        assert approx_feature["new_categories"] == 0
+
+
+def test_bc_joined_persisted_reference_sketches(
+    spark_fixture,
+    bc_current_dataset_joined,
+    bc_reference_dataset_joined,
+    bc_model_joined,
+    monkeypatch,
+):
+    job_config = JobConfig(approx_distinct_min_cardinality=1)
+    sketched_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+        job_config=job_config,
+    )
+    reference_record = ref_compute_metrics(
+        bc_reference_dataset_joined, bc_model_joined, job_config
+    )
+
+    bc_reference_dataset_joined.use_data_quality(reference_record["DATA_QUALITY"])
+    assert set(bc_reference_dataset_joined.distinct_sketches) == {
+        feature.name for feature in bc_model_joined.get_categorical_features()
+    }
+
+    def distinct_sketches(*args):
+        raise AssertionError("the reference is sketched again")
+
+    monkeypatch.setattr(
+        DataQualityCalculator, "distinct_sketches", staticmethod(distinct_sketches)
+    )
+    merged_record = cur_compute_metrics(
+        spark_fixture,
+        bc_current_dataset_joined,
+        bc_reference_dataset_joined,
+        bc_model_joined,
+        job_config=job_config,
+    )
+
+    assert json.loads(merged_record["DATA_QUALITY"]) == json.loads(
+        sketched_record["DATA_QUALITY"]
+    )
@@ -599,3 +599,90 @@ def test_calculation_dataset_indexing(spark_fixture, dataset_indexing):
         ignore_order=True,
         significant_digits=6,
     )
+
+
+def test_grouped_metrics_by_granularity(spark_fixture, dataset_for_hour):
+    output = OutputType(
+        prediction=ColumnDefinition(
+            name="prediction",
+            type=SupportedTypes.string,
+            field_type=FieldTypes.categorical,
+        ),
+        prediction_proba=None,
+        output=[
+            ColumnDefinition(
+                name="prediction",
+                type=SupportedTypes.string,
+                field_type=FieldTypes.categorical,
+            )
+        ],
+    )
+    target = ColumnDefinition(
+        name="target", type=SupportedTypes.string, field_type=FieldTypes.categorical
+    )
+    timestamp = ColumnDefinition(
+        name="datetime", type=SupportedTypes.datetime, field_type=FieldTypes.datetime
+    )
+    features = [
+        ColumnDefinition(
+            name="cat1", type=SupportedTypes.string, field_type=FieldTypes.categorical
+        ),
+        ColumnDefinition(
+            name="cat2", type=SupportedTypes.string, field_type=FieldTypes.categorical
+        ),
+        ColumnDefinition(
+            name="num1", type=SupportedTypes.float, field_type=FieldTypes.numerical
+        ),
+        ColumnDefinition(
+            name="num2", type=SupportedTypes.float, field_type=FieldTypes.numerical
+        ),
+    ]
+    model = ModelOut(
+        uuid=uuid.uuid4(),
+        name="model",
+        description="description",
+        model_type=ModelType.MULTI_CLASS,
+        data_type=DataType.TABULAR,
+        timestamp=timestamp,
+        granularity=Granularity.HOUR,
+        outputs=output,
+        target=target,
+        features=features,
+        frameworks="framework",
+        algorithm="algorithm",
+        created_at=str(datetime.datetime.now()),
+        updated_at=str(datetime.datetime.now()),
+    )
+    daily_model = model.model_copy(update={"granularity": Granularity.DAY})
+
+    current_dataframe, reference_dataframe = dataset_for_hour
+    metrics_service = CurrentMetricsMulticlassService(
+        spark_session=spark_fixture,
+        current=CurrentDataset(model=model, raw_dataframe=current_dataframe),
+        reference=ReferenceDataset(model=model, raw_dataframe=reference_dataframe),
+    )
+    daily_metrics_service = CurrentMetricsMulticlassService(
+        spark_session=spark_fixture,
+        current=CurrentDataset(model=daily_model, raw_dataframe=current_dataframe),
+        reference=ReferenceDataset(
+            model=daily_model, raw_dataframe=reference_dataframe
+        ),
+    )
+
+    grouped_metrics_by_granularity = (
+        metrics_service.calculate_grouped_metrics_by_granularity()
+    )
+    daily_model_quality = daily_metrics_service.calculate_model_quality()
+
+    assert list(grouped_metrics_by_granularity) == ["DAY", "WEEK", "MONTH"]
+    # Same grouped metrics of the daily model
+    assert not deepdiff.DeepDiff(
+        grouped_metrics_by_granularity["DAY"],
+        {
+            class_metrics["class_name"]: class_metrics["grouped_metrics"]
+            for class_metrics in daily_model_quality["class_metrics"]
+        },
+        ignore_order=True,
+        significant_digits=6,
+        ignore_nan_inequality=True,
+    )
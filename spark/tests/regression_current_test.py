@@ -325,3 +325,33 @@ def test_model_quality_abalone(
         ignore_order=True,
         ignore_type_subclasses=True,
     )
+
+
+def test_grouped_metrics_by_granularity(
+    spark_fixture, current_bike_dataframe, reference_dataset, model
+):
+    # A daily model rolls its grouped metrics up to the coarser granularities
+    daily_model = model.model_copy(update={"granularity": Granularity.DAY})
+    metrics_service = CurrentMetricsRegressionService(
+        spark_session=spark_fixture,
+        current=CurrentDataset(
+            raw_dataframe=current_bike_dataframe,
+            model=daily_model,
+        ),
+        reference=reference_dataset,
+    )
+
+    grouped_metrics_by_granularity = (
+        metrics_service.calculate_grouped_metrics_by_granularity()
+    )
+
+    assert list(grouped_metrics_by_granularity) == ["WEEK", "MONTH"]
+    # Same grouped metrics of the monthly model
+    assert not deepdiff.DeepDiff(
+        grouped_metrics_by_granularity["MONTH"],
+        res.test_model_quality_res["grouped_metrics"],
+        ignore_order=True,
+        ignore_type_subclasses=True,
+        significant_digits=5,
+        number_format_notation="e",
+    )
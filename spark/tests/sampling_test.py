@@ -0,0 +1,155 @@
+import datetime
+import random
+import uuid
+
+import pytest
+import pyspark.sql.functions as F
+
+from jobs.models.current_dataset import CurrentDataset
+from jobs.utils.models import (
+    ColumnDefinition,
+    DataType,
+    FieldTypes,
+    Granularity,
+    ModelOut,
+    ModelType,
+    OutputType,
+    SupportedTypes,
+)
+from jobs.utils.sampling import auc_standard_error, sampling, stratified_sample
+
+
+@pytest.fixture()
+def current_dataset(spark_fixture):
+    rows = []
+    generator = random.Random(7)
+    for i in range(20000):
+        target = 1.0 if i % 10 < 3 else 0.0
+        correct = generator.random() < 0.9
+        prediction = target if correct else 1.0 - target
+        rows.append(
+            (
+                f"2024-06-{1 + i % 4:02d} {i % 24:02d}:00:00",
+                str(generator.random()),
+                str(prediction),
+                str(prediction * 0.8 + 0.1),
+                str(target),
+            )
+        )
+    raw_dataframe = spark_fixture.createDataFrame(
+        rows,
+        "datetime string, num1 string, prediction string, prediction_proba string, target string",
+    )
+    output = ColumnDefinition(
+        name="prediction", type=SupportedTypes.int, field_type=FieldTypes.numerical
+    )
+    proba = ColumnDefinition(
+        name="prediction_proba",
+        type=SupportedTypes.float,
+        field_type=FieldTypes.numerical,
+    )
+    model = ModelOut(
+        uuid=uuid.uuid4(),
+        name="sampled model",
+        description="description",
+        model_type=ModelType.BINARY,
+        data_type=DataType.TABULAR,
+        timestamp=ColumnDefinition(
+            name="datetime",
+            type=SupportedTypes.datetime,
+            field_type=FieldTypes.datetime,
+        ),
+        granularity=Granularity.DAY,
+        outputs=OutputType(
+            prediction=output, prediction_proba=proba, output=[output, proba]
+        ),
+        target=ColumnDefinition(
+            name="target", type=SupportedTypes.int, field_type=FieldTypes.numerical
+        ),
+        features=[
+            ColumnDefinition(
+                name="num1",
+                type=SupportedTypes.float,
+                field_type=FieldTypes.numerical,
+            )
+        ],
+        frameworks="framework",
+        algorithm="algorithm",
+        created_at=str(datetime.datetime.now()),
+        updated_at=str(datetime.datetime.now()),
+    )
+    yield CurrentDataset(model=model, raw_dataframe=raw_dataframe)
+
+
+def test_stratified_sample(current_dataset):
+    assert stratified_sample(current_dataset, 20000, 42) is None
+
+    sample, sample_design = stratified_sample(current_dataset, 2000, 42)
+
+    assert sample_design.population_size == 20000
+    assert set(sample_design.weights.values()) == {10.0}
+    assert 1700 < sample.current_count < 2300
+    positives = sample.current.filter("target = 1").count()
+    assert positives / sample.current_count == pytest.approx(0.3, abs=0.03)
+    # every time bucket keeps its rows
+    assert (
+        sample.current.select("datetime").distinct().count()
+        == current_dataset.current.select("datetime").distinct().count()
+    )
+    # the same seed draws the same sample
+    assert (
+        stratified_sample(current_dataset, 2000, 42)[0].current_count
+        == sample.current_count
+    )
+    # the sample is already typed
+    assert sample.current.schema == current_dataset.current.schema
+
+
+def test_stratified_sample_min_stratum_rows(current_dataset):
+    sample, sample_design = stratified_sample(
+        current_dataset, 2000, 42, min_stratum_rows=300
+    )
+
+    # the 1000 or 2000 positives of every day are sampled with a fraction of 0.3 or 0.15, the negatives with 0.1
+    assert sorted(set(sample_design.weights.values())) == pytest.approx(
+        [10 / 3, 20 / 3, 10.0]
+    )
+    assert (
+        sample.current.filter("target = 1")
+        .groupBy(F.to_date("datetime"))
+        .count()
+        .agg(F.min("count"))
+        .collect()[0][0]
+        > 250
+    )
+    assert sample.current.filter("target = 1").count() / sample.current_count > 0.4
+
+    # the estimates weight the oversampled positives back
+    record = sampling(sample, sample_design, 0.95)
+    assert record.estimates["accuracy"] == pytest.approx(0.9, abs=0.02)
+    assert record.confidence_intervals["accuracy"].lower < 0.9
+
+
+def test_sampling(current_dataset):
+    sample, sample_design = stratified_sample(current_dataset, 2000, 42)
+
+    record = sampling(sample, sample_design, 0.95)
+
+    assert record.population_size == 20000
+    assert record.sample_size == sample.current_count
+    assert set(record.estimates) == {"accuracy", "area_under_roc"}
+    assert set(record.confidence_intervals) == {"accuracy", "area_under_roc"}
+    accuracy = record.confidence_intervals["accuracy"]
+    # 1.96 * sqrt(0.9 * 0.1 / n) with the finite population correction
+    assert accuracy.upper - accuracy.lower == pytest.approx(0.025, abs=0.003)
+    assert accuracy.lower < record.estimates["accuracy"] < accuracy.upper
+    assert record.estimates["accuracy"] == pytest.approx(0.9, abs=0.02)
+    # the probabilities only take two values, one for every prediction
+    auc = record.confidence_intervals["area_under_roc"]
+    assert record.estimates["area_under_roc"] == pytest.approx(0.9, abs=0.02)
+    assert 0.0 <= auc.lower < record.estimates["area_under_roc"] < auc.upper <= 1.0
+
+
+def test_auc_standard_error():
+    assert auc_standard_error(0.5, 100, 100) == pytest.approx(0.0409, abs=1e-4)
+    assert auc_standard_error(0.9, 100, 100) < auc_standard_error(0.9, 10, 10)
@@ -0,0 +1,20 @@
+import pytest
+
+from metrics.statistics import duplicate_rows
+from utils.job_config import DuplicateRowsMode
+
+
+@pytest.fixture()
+def rows_dataframe(spark_fixture):
+    yield spark_fixture.createDataFrame(
+        [("a", 1.0, "x")] * 3
+        + [("a", None, "x")] * 2
+        + [(None, 1.0, "x"), ("a", 1.0, None), ("b", 2.0, "y")],
+        "cat string, num double, other string",
+    )
+
+
+@pytest.mark.parametrize("mode", list(DuplicateRowsMode))
+def test_duplicate_rows(rows_dataframe, mode):
+    assert duplicate_rows(rows_dataframe, ["cat", "num", "other"], 8, mode) == 3
+    assert duplicate_rows(rows_dataframe, ["cat", "other"], 8, mode) == 4